@@ -0,0 +1,162 @@
+import copy
+import json
+from json.encoder import encode_basestring
+
+# Character stats and the ERC-721 metadata trait type each one is stored under, in the
+# order character_metadata writes them
+TRAITS = {
+    "level": "level",
+    "experience": "experience",
+    "hit_point": "hit point",
+    "strength": "strength",
+    "dexterity": "dexterity",
+    "constitution": "constitution",
+    "intelligence": "intelligence",
+    "wisdom": "wisdom",
+    "charisma": "charisma",
+}
+STATS = tuple(TRAITS)
+_STAT_FOR_TRAIT = {trait: stat for stat, trait in TRAITS.items()}
+# Top-level metadata fields with a slot of their own
+TEXT_FIELDS = ("name", "description", "image", "adventure_log")
+TRACKED = TEXT_FIELDS + STATS
+_TRACKED = frozenset(TRACKED)
+_MISSING = object()
+# Built once: json.dumps with non-default options creates a new encoder on every call
+_CANONICAL = json.JSONEncoder(sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+# Canonical JSON of each stat's attribute up to its value
+_ATTRIBUTE_PREFIX = {stat: '{"trait_type":' + encode_basestring(trait) + ',"value":' for stat, trait in TRAITS.items()}
+
+
+# Canonical JSON of a metadata document (sorted keys, no whitespace, UTF-8): equal documents
+# give equal bytes, and so the same content CID
+def canonical_json(metadata: dict) -> bytes:
+    return _CANONICAL.encode(metadata).encode()
+
+
+# One character's metadata as named fields instead of the positional "attributes" list.
+# Setting a field to a different value records it as dirty, so callers can tell whether
+# anything changed since the last mark_clean(). Metadata this game writes round-trips
+# unchanged; unknown keys and traits are kept and written back.
+class CharacterState:
+    __slots__ = TRACKED + ("extra", "extra_traits", "_dirty", "_json")
+
+    def __init__(self, name: str | None = None, description: str | None = None, image: str | None = None,
+                 adventure_log: str | None = None, extra: dict | None = None,
+                 extra_traits: list[dict] | None = None, **stats):
+        object.__setattr__(self, "_dirty", set())
+        object.__setattr__(self, "_json", None)
+        object.__setattr__(self, "extra", extra if extra is not None else {})
+        object.__setattr__(self, "extra_traits", extra_traits if extra_traits is not None else [])
+        for field, value in (("name", name), ("description", description), ("image", image),
+                             ("adventure_log", adventure_log)):
+            object.__setattr__(self, field, value)
+        for stat in STATS:
+            object.__setattr__(self, stat, stats.pop(stat, None))
+        if stats:
+            raise TypeError(f"unknown character stats: {', '.join(stats)}")
+
+    def __setattr__(self, field: str, value):
+        if field in _TRACKED:
+            if getattr(self, field, _MISSING) == value:
+                return
+            self._dirty.add(field)
+            object.__setattr__(self, "_json", None)
+        object.__setattr__(self, field, value)
+
+    @classmethod
+    def from_metadata(cls, metadata: dict) -> "CharacterState":
+        stats, extra_traits = {}, []
+        for attribute in metadata.get("attributes", []):
+            stat = _STAT_FOR_TRAIT.get(attribute.get("trait_type"))
+            if stat is None or stat in stats or attribute.keys() != {"trait_type", "value"}:
+                extra_traits.append(dict(attribute))
+            else:
+                stats[stat] = attribute["value"]
+        extra = {key: value for key, value in metadata.items() if key not in TEXT_FIELDS and key != "attributes"}
+        return cls(
+            metadata.get("name"), metadata.get("description"), metadata.get("image"),
+            metadata.get("adventure_log"), extra, extra_traits, **stats
+        )
+
+    def to_metadata(self) -> dict:
+        metadata = {field: getattr(self, field) for field in ("name", "description", "image")
+                    if getattr(self, field) is not None}
+        metadata["attributes"] = [
+            {"trait_type": trait, "value": getattr(self, stat)}
+            for stat, trait in TRAITS.items() if getattr(self, stat) is not None
+        ] + [dict(attribute) for attribute in self.extra_traits]
+        if self.adventure_log is not None:
+            metadata["adventure_log"] = self.adventure_log
+        metadata.update(self.extra)
+        return metadata
+
+    # canonical_json() of the metadata, kept until a field changes
+    def to_json(self) -> bytes:
+        if self._json is None:
+            document = self._plain_json()
+            if document is None:
+                document = _CANONICAL.encode(self.to_metadata())
+            object.__setattr__(self, "_json", document.encode())
+        return self._json
+
+    # Same bytes as the encoder for the usual shape (text fields, integer stats, nothing
+    # extra), written directly; None for anything else
+    def _plain_json(self) -> str | None:
+        if self.extra or self.extra_traits:
+            return None
+        attributes = []
+        for stat in STATS:
+            value = getattr(self, stat)
+            if value is None:
+                continue
+            if type(value) is not int:
+                return None
+            attributes.append(_ATTRIBUTE_PREFIX[stat] + str(value) + "}")
+        # Keys in sorted order: adventure_log, attributes, description, image, name
+        parts = []
+        for field in ("adventure_log", "attributes", "description", "image", "name"):
+            if field == "attributes":
+                parts.append('"attributes":[' + ",".join(attributes) + "]")
+                continue
+            value = getattr(self, field)
+            if value is None:
+                continue
+            if type(value) is not str:
+                return None
+            parts.append(f'"{field}":' + encode_basestring(value))
+        return "{" + ",".join(parts) + "}"
+
+    # (trait type, value) of every attribute, stats first
+    def traits(self) -> list[tuple[str, object]]:
+        return [(attribute["trait_type"], attribute.get("value")) for attribute in self.to_metadata()["attributes"]]
+
+    @property
+    def alive(self) -> bool:
+        return self.hit_point is None or self.hit_point > 0
+
+    # Fields changed since the last mark_clean()
+    @property
+    def dirty(self) -> frozenset[str]:
+        return frozenset(self._dirty)
+
+    def mark_clean(self):
+        self._dirty.clear()
+
+    # Independent copy, e.g. a snapshot to pin while play goes on
+    def copy(self) -> "CharacterState":
+        clone = object.__new__(CharacterState)
+        for field in TRACKED:
+            object.__setattr__(clone, field, getattr(self, field))
+        object.__setattr__(clone, "extra", copy.deepcopy(self.extra))
+        object.__setattr__(clone, "extra_traits", [dict(attribute) for attribute in self.extra_traits])
+        object.__setattr__(clone, "_dirty", set(self._dirty))
+        object.__setattr__(clone, "_json", self._json)
+        return clone
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CharacterState) and self.to_json() == other.to_json()
+
+    def __repr__(self):
+        stats = ", ".join(f"{stat}={getattr(self, stat)}" for stat in STATS if getattr(self, stat) is not None)
+        return f"CharacterState({self.name!r}, {stats})"
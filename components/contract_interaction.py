@@ -1,14 +1,12 @@
-import os
-from pathlib import Path
-from dotenv import load_dotenv
-from moccasin.config import get_config
-from moccasin.named_contract import NamedContract
-from moccasin.moccasin_account import MoccasinAccount
-from .ipfs_connection import get_ipfs_json
-
-# Load environment variables (adjust according to actual path)
-root_dir = Path(__file__).parent
-load_dotenv(root_dir / ".env")
+import threading
+from typing import NamedTuple
+from .env import load_env
+from .ipfs_connection import get_ipfs_jsons
+from .rpc import AbiFunction, ContractReverted, rpc_for_network
+from .tx_submitter import TX_WAIT_TIMEOUT, TxHandle, submitter_for_network
+from eth_utils import keccak
+
+load_env()
 
 ABI = [
   {
@@ -33,7 +31,12 @@ ABI = [
       }
     ],
     "name": "create_character",
-    "outputs": [],
+    "outputs": [
+      {
+        "name": "",
+        "type": "uint256"
+      }
+    ],
     "stateMutability": "nonpayable",
     "type": "function"
   },
@@ -89,6 +92,22 @@ ABI = [
     "stateMutability": "nonpayable",
     "type": "function"
   },
+  {
+    "inputs": [
+      {
+        "name": "token_ids",
+        "type": "uint256[]"
+      },
+      {
+        "name": "xp_gained",
+        "type": "uint256[]"
+      }
+    ],
+    "name": "gain_experience_batch",
+    "outputs": [],
+    "stateMutability": "nonpayable",
+    "type": "function"
+  },
   {
     "inputs": [
       {
@@ -116,6 +135,76 @@ ABI = [
     "stateMutability": "view",
     "type": "function"
   },
+  {
+    "inputs": [
+      {
+        "name": "owner",
+        "type": "address"
+      },
+      {
+        "name": "offset",
+        "type": "uint256"
+      },
+      {
+        "name": "limit",
+        "type": "uint256"
+      }
+    ],
+    "name": "query_roster",
+    "outputs": [
+      {
+        "name": "",
+        "type": "uint256[]"
+      },
+      {
+        "name": "",
+        "type": "string[]"
+      },
+      {
+        "components": [
+          {
+            "name": "level",
+            "type": "uint256"
+          },
+          {
+            "name": "experience",
+            "type": "uint256"
+          }
+        ],
+        "name": "",
+        "type": "tuple[]"
+      }
+    ],
+    "stateMutability": "view",
+    "type": "function"
+  },
+  {
+    "inputs": [
+      {
+        "name": "token_ids",
+        "type": "uint256[]"
+      }
+    ],
+    "name": "query_statuses",
+    "outputs": [
+      {
+        "components": [
+          {
+            "name": "level",
+            "type": "uint256"
+          },
+          {
+            "name": "experience",
+            "type": "uint256"
+          }
+        ],
+        "name": "",
+        "type": "tuple[]"
+      }
+    ],
+    "stateMutability": "view",
+    "type": "function"
+  },
   {
     "inputs": [
       {
@@ -226,85 +315,252 @@ ABI = [
   }
 ]
 
-# Obtain the deployed smart contract via Moccasin
-def get_contract():
+ROSTER_FUNCTIONS = (
+    "balanceOf", "ownerOf", "tokenOfOwnerByIndex", "tokenURI", "query_character", "query_roster", "query_statuses"
+)
+# Matches MAX_PAGE_SIZE in src/Character.vy
+ROSTER_PAGE_SIZE = 50
+# Matches MAX_BATCH_SIZE in src/Character.vy
+XP_BATCH_SIZE = 100
+
+# One owned character as read from chain
+class RosterEntry(NamedTuple):
+    token_id: int
+    token_uri: str
+    level: int
+    experience: int
+
+
+TRANSFER_TOPIC = "0x" + keccak(text="Transfer(address,address,uint256)").hex()
+
+# Token ID of the character minted in a create_character receipt
+def minted_token_id(receipt: dict) -> int | None:
+    for log in receipt["logs"]:
+        topics = log["topics"]
+        if topics and topics[0].lower() == TRANSFER_TOPIC and int(topics[1], 16) == 0:
+            return int(topics[3], 16)
+    return None
+
+
+CHARACTER_ADDRESS = "0x7C4b6ad0828dAE64c1678D624f94FAc3C2912db2"
+
+
+# Process-wide handle on the deployed Character contract
+class CharacterClient:
+    def __init__(self, network, address: str = CHARACTER_ADDRESS):
+        self.network = network
+        self.address = address
+        self.default_wallet = network.get_default_account()
+        self.contract = network.manifest_named_contract(
+            contract_name="Character",
+            abi=ABI,
+            address=address
+        )
+        self.rpc = rpc_for_network(network)
+        self._abi = {name: AbiFunction(ABI, name) for name in ROSTER_FUNCTIONS}
+        self.submitter = submitter_for_network(network, self.rpc, self.default_wallet, self.contract, ABI)
+        # Local event index answering roster reads (see components/indexer.py), if enabled
+        self.indexer = None
+
+    # Stop the background work (event index, receipt polling), giving transactions in
+    # flight up to `timeout` seconds to confirm
+    def close(self, timeout: float = 0):
+        if self.indexer is not None:
+            self.indexer.close()
+        self.submitter.close(timeout)
+
+    # Whether this handle is still valid for the given network and address
+    def matches(self, network, address: str) -> bool:
+        return self.network is network and self.address == address
+
+    # Read the wallet's token IDs, token URIs and on-chain status, one query_roster page per
+    # entry of a single batch; wallets up to ROSTER_PAGE_SIZE characters load in one round trip.
+    # Answered from the event index instead once it has caught up with the chain.
+    def load_roster(self) -> list[RosterEntry]:
+        owner = self._owner()
+        if self.indexer is not None and self.indexer.ready:
+            try:
+                return self.indexer.roster(owner)
+            except Exception as e:
+                print(f"Character index unavailable, reading the chain: {e}")
+        try:
+            balance, first_page = self.rpc.batch_eth_call(self.address, [
+                (self._abi["balanceOf"], (owner,)),
+                (self._abi["query_roster"], (owner, 0, ROSTER_PAGE_SIZE)),
+            ])
+        except ContractReverted:
+            # Deployments without the bulk views
+            return self._load_roster_per_token(owner)
+        pages = [first_page] + self.rpc.batch_eth_call(self.address, [
+            (self._abi["query_roster"], (owner, offset, ROSTER_PAGE_SIZE))
+            for offset in range(ROSTER_PAGE_SIZE, balance, ROSTER_PAGE_SIZE)
+        ])
+        return [
+            RosterEntry(token_id, token_URI, level, experience)
+            for token_ids, token_URIs, statuses in pages
+            for token_id, token_URI, (level, experience) in zip(token_ids, token_URIs, statuses)
+        ]
+
+    # Same as load_roster using per-token views, in three batched round trips
+    def _load_roster_per_token(self, owner: str) -> list[RosterEntry]:
+        balance = self.rpc.eth_call(self.address, self._abi["balanceOf"], owner)
+        token_ids = self.rpc.batch_eth_call(
+            self.address,
+            [(self._abi["tokenOfOwnerByIndex"], (owner, i)) for i in range(balance)]
+        )
+        rows = self.rpc.batch_eth_call(
+            self.address,
+            [(self._abi["tokenURI"], (token_id,)) for token_id in token_ids]
+            + [(self._abi["query_character"], (token_id,)) for token_id in token_ids]
+        )
+        token_URIs, statuses = rows[:balance], rows[balance:]
+        return [
+            RosterEntry(token_id, token_URI, level, experience)
+            for token_id, token_URI, (level, experience) in zip(token_ids, token_URIs, statuses)
+        ]
+
+    # Query the (level, experience) of several characters in one call
+    def query_levels(self, token_ids: list[int]) -> list[tuple[int, int]]:
+        statuses = []
+        for start in range(0, len(token_ids), ROSTER_PAGE_SIZE):
+            statuses += self.rpc.eth_call(
+                self.address, self._abi["query_statuses"], token_ids[start:start + ROSTER_PAGE_SIZE]
+            )
+        return statuses
+
+    def _owner(self) -> str:
+        return str(getattr(self.default_wallet, "address", self.default_wallet))
+
+    # Query all character of address on chain
+    def query_characters(self):
+        try:
+            roster = self.load_roster()
+            print(f"Wallet {self.default_wallet} owns {len(roster)} tokens.\n")
+            token_URIs = [entry.token_uri for entry in roster]
+            token_IDs = [entry.token_id for entry in roster]
+            json_datas = get_ipfs_jsons(token_URIs)
+            return json_datas, token_URIs, token_IDs
+        except Exception as e:
+            print(f"Query character failed: {e}\n")
+
+    # Query character level, as (level, experience)
+    def query_level(self, token_id: int):
+        try:
+            character_status = self.rpc.eth_call(self.address, self._abi["query_character"], token_id)
+            return character_status
+        except Exception as e:
+            print(f"Query character failed: {e}\n")
+            return None
+
+    # Gain xp on chain; returns without waiting for the receipt
+    def gain_xp(self, token_id: int, gained_xp: int) -> TxHandle:
+        print(f"Attempting to add {gained_xp} XP to token {token_id}...\n")
+        handle = self.submitter.submit("gain_experience", token_id, gained_xp)
+        handle.add_done_callback(
+            lambda h: h.ok and print(f"Token {token_id} has successfully gained {gained_xp} XP.\n")
+        )
+        return handle
+
+    # Gain xp for several characters; awards is a list of (token_id, xp).
+    # One transaction per XP_BATCH_SIZE awards.
+    def gain_xp_batch(self, awards: list[tuple[int, int]]) -> list[TxHandle]:
+        return [
+            self.submitter.submit(
+                "gain_experience_batch",
+                [token_id for token_id, _ in awards[start:start + XP_BATCH_SIZE]],
+                [gained_xp for _, gained_xp in awards[start:start + XP_BATCH_SIZE]]
+            )
+            for start in range(0, len(awards), XP_BATCH_SIZE)
+        ]
+
+    # Update character metadata
+    def change_character(self, token_id: int, token_URI: str) -> TxHandle:
+        return self.submitter.submit("change_character", token_id, token_URI)
+
+    # Kill character
+    def burn_character(self, token_id: int) -> TxHandle:
+        return self.submitter.submit("kill_character", token_id)
+
+    # Token URI of a single character
+    def token_uri(self, token_id: int) -> str:
+        return self.rpc.eth_call(self.address, self._abi["tokenURI"], token_id)
+
+    # Address owning a character
+    def owner_of(self, token_id: int) -> str:
+        return self.rpc.eth_call(self.address, self._abi["ownerOf"], token_id)
+
+    # Mint character and wait for it, returning the new token ID (None on failure)
+    def mint_character(self, character: dict, tokenURI: str):
+        print("mint_character_tokenURI:", tokenURI, "\n")
+        handle = self.submitter.submit(
+            "create_character",
+            self._owner(),  # Wallet address
+            tokenURI
+        ).wait(TX_WAIT_TIMEOUT)
+        if not handle.ok:
+            if not handle.done():
+                print(f"Mint not confirmed after {TX_WAIT_TIMEOUT}s: {handle.tx_hash}\n")
+            return None
+        token_id = handle.result if handle.receipt is None else minted_token_id(handle.receipt)
+        print(f"Character minted successfully! Token ID: {token_id}\n")
+        return token_id
+
+_client: CharacterClient | None = None
+_client_lock = threading.Lock()
+
+# Get the shared contract client, rebuilding it only when the network or address changes
+def get_client(address: str = CHARACTER_ADDRESS) -> CharacterClient:
+    global _client
+    # Imported on first use: moccasin pulls in boa and the whole EVM
+    from moccasin.config import get_config
+    from .indexer import indexer_for_client
 
     network = get_config().get_active_network()
-    default_wallet = network.get_default_account()
-    contract: NamedContract = network.manifest_named_contract(
-        contract_name="Character",
-        abi=ABI,
-        address="0x7C4b6ad0828dAE64c1678D624f94FAc3C2912db2"
-    )
-    return contract, default_wallet
+    with _client_lock:
+        if _client is None or not _client.matches(network, address):
+            if _client is not None:
+                _client.close(TX_WAIT_TIMEOUT)
+            _client = CharacterClient(network, address)
+            _client.indexer = indexer_for_client(_client)
+        return _client
+
+# Obtain the deployed smart contract via Moccasin
+def get_contract():
+    client = get_client()
+    return client.contract, client.default_wallet
 
 # Query all character of address on chain 
 def query_characters():
-    contract, default_wallet = get_contract()
-    try:
-        balance = contract.balanceOf(default_wallet)
-        print(f"Wallet {default_wallet} owns {balance} tokens.\n")
-        json_datas = []
-        token_URIs = []
-        token_IDs = []
-        for i in range(balance):
-            # get tokenID
-            token_id = contract.tokenOfOwnerByIndex(default_wallet, i)
-            print("tokenId:", token_id, "\n")
-            token_URI = contract.tokenURI(token_id)
-            json_data = get_ipfs_json(token_URI)
-            json_datas.append(json_data)
-            token_URIs.append(token_URI)
-            token_IDs.append(token_id)
-        return json_datas, token_URIs, token_IDs
-    except Exception as e:
-        print(f"Query character failed: {e}\n")
+    return get_client().query_characters()
 
 # Query character level
 def query_level(token_id: int):
-    contract, default_wallet = get_contract()
-    try:
-        character_status = contract.query_character(token_id)
-        return character_status
-    except Exception as e:
-        print(f"Query character failed: {e}\n")
-        return None
+    return get_client().query_level(token_id)
 
 # Gain xp on chain
-def gain_xp(token_id: int, gained_xp: int):
-    contract, default_wallet = get_contract()
-    try:
-        print(f"Attempting to add {gained_xp} XP to token {token_id}...\n")
-        contract.gain_experience(token_id, gained_xp)
-        print(f"Token {token_id} has successfully gained {gained_xp} XP.\n")
-    except Exception as e:
-        print(f"Failed to update XP for token {token_id}: {e}\n")
+def gain_xp(token_id: int, gained_xp: int) -> TxHandle:
+    return get_client().gain_xp(token_id, gained_xp)
+
+# Gain xp for several characters on chain in one transaction
+def gain_xp_batch(awards: list[tuple[int, int]]) -> list[TxHandle]:
+    return get_client().gain_xp_batch(awards)
 
 # Update character metadata
-def change_character(token_id: int, token_URI: str):
-    contract, default_wallet = get_contract()
-    try:
-        contract.change_character(token_id, token_URI)
-    except Exception as e:
-        print(f"Failed to change token for {token_id}: {e}\n")
+def change_character(token_id: int, token_URI: str) -> TxHandle:
+    return get_client().change_character(token_id, token_URI)
 
 # Kill character
-def burn_character(token_id: int):
-    contract, default_wallet = get_contract()
-    try:
-        contract.kill_character(token_id)
-    except Exception as e:
-        print(f"Failed to burn character for token: {e}\n")
+def burn_character(token_id: int) -> TxHandle:
+    return get_client().burn_character(token_id)
+
+# Token URI of a single character
+def query_token_uri(token_id: int) -> str:
+    return get_client().token_uri(token_id)
+
+# Owner of a character
+def query_owner(token_id: int) -> str:
+    return get_client().owner_of(token_id)
 
 # Mint character
 def mint_character(character: dict, tokenURI: str):
-    contract, default_wallet = get_contract()
-    try:
-        print("mint_character_tokenURI:", tokenURI, "\n")
-        txn = contract.create_character(
-            default_wallet,  # Wallet address
-            tokenURI
-        )
-        print(f"Character minted successfully! Transaction hash: {txn}\n")
-    except Exception as e:
-        print(f"Transaction failed: {e}\n")
+    return get_client().mint_character(character, tokenURI)
@@ -1,30 +1,35 @@
+import base64
 import random
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
-from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NamedTuple
+from .env import load_env
+from .llm_clients import get_openai_client
+from .ipfs_connection import character_metadata, get_pinata, upload_ipfs
+from .contract_interaction import mint_character
+from .tracing import get_tracer
 
 
-root_dir = Path(__file__).parent.parent
-load_dotenv(root_dir / ".env")
-client = OpenAI(
-    api_key=os.environ.get("OPENAI_API_KEY"),  # This is the default and can be omitted
-)
+load_env()
 
+IMAGE_MODEL = "dall-e-2"
+IMAGE_SIZE = "512x512"
+# Characters in creation at once in batch mode: image generations, and pin + mint pipelines
+CREATE_MAX_PARALLEL = 4
 
-# Generate new character for user
-def generate_character() -> dict:
-    name = input("Please enter the character's name: ")
-    description = input("Please enter your character's background description: ")
-    response = client.images.generate(
-        model="dall-e-2",
-        prompt=f"A D&D fantasy character: {description}",
-        n=1,
-        size="512x512"
-    )
-    image_url = response.data[0].url
-
-    attributes = {
+
+class CharacterRequest(NamedTuple):
+    name: str
+    description: str
+
+
+class CreatedCharacter(NamedTuple):
+    token_id: int
+    token_uri: str
+    metadata: dict
+
+
+def roll_attributes() -> dict:
+    return {
         "strength": random.randint(5, 20),
         "dexterity": random.randint(5, 20),
         "constitution": random.randint(5, 20),
@@ -33,10 +38,70 @@ def generate_character() -> dict:
         "charisma": random.randint(5, 20)
     }
 
-    character_data = {
-        "name": name,
-        "image": image_url,
-        "description": description,
+
+# Character portrait as PNG bytes, so it can be pinned instead of linking a temporary URL
+def generate_image(description: str) -> bytes:
+    with get_tracer().span("llm.image") as span:
+        response = get_openai_client().images.generate(
+            model=IMAGE_MODEL,
+            prompt=f"A D&D fantasy character: {description}",
+            n=1,
+            size=IMAGE_SIZE,
+            response_format="b64_json"
+        )
+        image = base64.b64decode(response.data[0].b64_json)
+        span.count("bytes_received", len(image))
+    return image
+
+
+# Ask the user for a new character
+def ask_character() -> CharacterRequest:
+    name = input("Please enter the character's name: ")
+    description = input("Please enter your character's background description: ")
+    return CharacterRequest(name, description)
+
+
+# Pin the image, then the metadata pointing at it, then mint as soon as the metadata CID is known
+def _publish(request: CharacterRequest, attributes: dict, image: Future) -> CreatedCharacter | None:
+    image_cid = get_pinata().pin_file(image.result(), f"{request.name}.png", "image/png")
+    character = {
+        "name": request.name,
+        "description": request.description,
+        "image": f"ipfs://{image_cid}",
         "attributes": attributes
     }
-    return character_data
+    token_uri = upload_ipfs(character)
+    if token_uri is None:
+        return None
+    token_id = mint_character(character, token_uri)
+    if token_id is None:
+        return None
+    return CreatedCharacter(token_id, token_uri, character_metadata(character))
+
+
+# Create and mint many characters (e.g. an NPC roster). Image generation, the slowest
+# step, starts for every character up front and runs `max_parallel` at a time; each
+# character is pinned and minted as soon as its own image is ready. Results are in the
+# order of `requests`, None for characters that failed.
+def mint_new_characters(requests: list[CharacterRequest], max_parallel: int = CREATE_MAX_PARALLEL) -> list[CreatedCharacter | None]:
+    workers = max(1, min(max_parallel, len(requests)))
+    with ThreadPoolExecutor(max_workers=workers) as images, ThreadPoolExecutor(max_workers=workers) as publishing:
+        pipelines = []
+        for request in requests:
+            image = images.submit(generate_image, request.description)
+            # Rolled while the image is being generated
+            pipelines.append(publishing.submit(_publish, request, roll_attributes(), image))
+
+        created = []
+        for request, pipeline in zip(requests, pipelines):
+            try:
+                created.append(pipeline.result())
+            except Exception as e:
+                print(f"Error creating character {request.name}:", e)
+                created.append(None)
+        return created
+
+
+# Create and mint one character
+def mint_new_character(request: CharacterRequest) -> CreatedCharacter | None:
+    return mint_new_characters([request])[0]
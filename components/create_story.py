@@ -1,192 +1,299 @@
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+import asyncio
+import threading
+import uuid
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
-from langchain.schema import SystemMessage, HumanMessage
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableLambda, RunnablePassthrough
-from langchain_core.prompts import PromptTemplate
-from .ipfs_connection import update_ipfs_metadata,delete_ipfs
-from .contract_interaction import gain_xp,change_character,query_level,burn_character
-import re
-import json
-from langchain_core.chat_history import (
-    BaseChatMessageHistory,
-    InMemoryChatMessageHistory,
-)
-
-store = {}
-
-# Get summary from history message
-def save_adventure_summary(session_id: str):
-    global character_status, character_tokenURI, character_tokenId
-    if session_id in store:
-        # Get conversation history messages list, skipping the first message (typically the system prompt)
-        history = store[session_id].messages  
-        history_summary = "\n".join([msg.content for msg in history[1:]])
-
-        prompt = (
-            """
-            Summarize the following conversation into a very short and concise adventure log, 
-            only describing the actions taken and key events, and DO NOT include any details 
-            about experience points or health values:\n\n"
-            """+ history_summary
-        )
-        llm = ChatOpenAI(temperature=0.3)
-        summary = llm.invoke(prompt) # LLM generate summary
-        character_status["adventure_log"] = summary.content
-        try:
-            cid = update_ipfs_metadata(character_status)
-            character_tokenURI = cid
-            change_character(character_tokenId,character_tokenURI)  
-            
-            print("Adventure summary uploaded to IPFS!")
-        except Exception as e:
-            print("Failed to update adventure summary:", e)
-    else:
-        print("No conversation history found for session:", session_id)
-        
-       
-# Extract the XP&HP change values from response
-def parse_gpt_response(gpt_text: str) -> dict:
-    result = {"xp_gained": 0, "hp_change": 0}
-    
-    json_match = re.search(r'\{.*?\}', gpt_text.strip().replace("\n", " "), re.DOTALL)
-    if json_match:
-        try:
-            data = json.loads(json_match.group(0))
-            result["xp_gained"] = int(data.get("xp_gained", 0))
-            result["hp_change"] = int(data.get("hp_change", 0))
-            return result
-        except Exception as e:
-            print("parse error:",e)
-    return result
+from langchain_core.runnables import RunnableGenerator
+from langchain_core.prompts import MessagesPlaceholder
+from .character_state import CharacterState
+from .state_sync import CharacterSync, SYNC_INTERVAL
+from .history import SummarizingChatMessageHistory, summarize_adventure
+from .llm_clients import get_chat_model
+from .token_usage import TurnUsage, UsageTotals, count_tokens, turn_usage
+from .tracing import TraceSummary, get_tracer, turn_context
+from .turn_output import NarrativeFilter, TurnOutcome, turn_outcome
+from langchain_core.chat_history import BaseChatMessageHistory
 
-# Process GPT Response and Update State  
-def analyze_and_process_response(response):
-    
-    global character_status, character_tokenURI, character_tokenId
-    changes = parse_gpt_response(response)
-    
-    xp_gained = changes["xp_gained"]
-    hp_change = changes["hp_change"]
-
-    if hp_change != 0:
-        character_status["attributes"][2]["value"] = character_status["attributes"][2]["value"] + hp_change
-        if character_status["attributes"][2]["value"]<=0:   # character die
-            burn_character(character_tokenId)
-            
-            
-
-    cleaned_response = re.sub(r'\{.*?\}$', '', response, flags=re.DOTALL).strip()
-
-    try:
-        if hp_change!=0 or xp_gained!=0:    
-            if xp_gained!=0: 
-                gain_xp(character_tokenId,xp_gained)  # update xp on chain
-                character_level,character_experience = query_level(character_tokenId) # query level&experience on chain
-                character_status["attributes"][0]["value"] = character_level    
-                character_status["attributes"][1]["value"] = character_experience   
-            
-            
-            cid = update_ipfs_metadata(character_status)  # update ipfs 
-            delete_ipfs(character_tokenURI.rstrip("/").split("/")[-1]) # delete previous character
-            character_tokenURI = cid
-            change_character(character_tokenId,character_tokenURI)  # change character's metadata
+# Dungeon Master rules. Identical for every player and turn, so together with the history
+# after it, it forms a stable prompt prefix the provider can serve from its prompt cache.
+DUNGEON_MASTER_PROMPT = """
+        You are the AI Dungeon Master, guiding a player through a dynamic Dungeons & Dragons style adventure.
         
-            
-                
-    except Exception as e:
-        print("Update error:",e)
-                
-            
-    return cleaned_response
-
-# Create Conversation Chain with LangChain
-def create_conversation_chain():
-    def get_session_history(session_id: str) -> BaseChatMessageHistory:
-        merged_system_prompt = f"""
-            You are the AI Dungeon Master, guiding a player through a dynamic Dungeons & Dragons style adventure.
-            
-            # Instructions:
-            - Provide immersive storytelling and vivid battle descriptions.
-            - Do NOT include any speaker labels such as "Dungeon Master:" or "AI Dungeon Master:" in your final response.
-            - Your output should be a plain narrative without extra prefixes or role names.
+        # Instructions:
+        - Provide immersive storytelling and vivid battle descriptions.
+        - Do NOT include any speaker labels such as "Dungeon Master:" or "AI Dungeon Master:" in your final response.
+        - Your output should be a plain narrative without extra prefixes or role names.
         
-            # Core Directives
-            1. Storytelling:
-            - Be immersive and adaptive. Expand the narrative with creativity.
-            - Each turn, provide the player with 3 or more distinct choices or actions.
-            - The player’s decisions shape the world—be ready to improvise.
-
-            2. Simplified Combat:
-            - When combat starts, resolve it within 2–3 rounds total (each round is one AI response).
-            - For each round:
-                a. Player Attack: Perform a d20 roll. If hit, roll damage (d6 or d8).
-                b. Enemy Attack: If enemy still alive, it also does a d20 roll and deals damage on hit.
-            - Provide short but vivid descriptions; avoid lengthy drawn-out battles.
-
-            3. XP & HP Tracking:
-            - Always track "xp_gained" and "hp_change".
-            - At the end of each response, append a JSON summary: {{ "xp_gained": <xp_value>, "hp_change": <hp_value> }}
-            - If no change, use zero.
-
-            4. Enemy Health Feedback:
-            - Never show exact HP. Use flavor text (e.g. "The goblin staggers...").
-
-            5. Character Data (for reference):
-            Name: {character_status.get("name", "Unknown")}
-            Level: {character_status["attributes"][0]["value"]}
-            XP: {character_status["attributes"][1]["value"]}
-            HP: {character_status["attributes"][2]["value"]}
-            Strength: {character_status["attributes"][3]["value"]}
-            Dexterity: {character_status["attributes"][4]["value"]}
-            Constitution: {character_status["attributes"][5]["value"]}
-            Intelligence: {character_status["attributes"][6]["value"]}
-            Wisdom: {character_status["attributes"][7]["value"]}
-            Charisma: {character_status["attributes"][8]["value"]}
-
-            # Initial Scene
-            "You stand before the entrance of an ancient dungeon. The massive stone door is slightly ajar, with a dense mist creeping out. 
-            A shattered tablet beside the door reads: 'Only those who dare shall claim the treasures within.' 
-            Your meager gear rattles slightly, and a chill wind howls behind you, as if no one dares follow you inside." """
-        if session_id not in store:
-            store[session_id] = InMemoryChatMessageHistory()
-            store[session_id].add_message(SystemMessage(content=merged_system_prompt))
+        # Core Directives
+        1. Storytelling:
+        - Be immersive and adaptive. Expand the narrative with creativity.
+        - Each turn, provide the player with 3 or more distinct choices or actions.
+        - The player’s decisions shape the world—be ready to improvise.
 
-        
-        return store[session_id]
-    
-    
-    llm=ChatOpenAI(temperature=0.3)
-    
-    chat_prompt = ChatPromptTemplate.from_messages([
-        HumanMessagePromptTemplate.from_template("{input}")
-    ])
-    # Build the conversation chain with message history and processing logic.
-    routed_chain = RunnableWithMessageHistory(
-        runnable=(
-            {"input": RunnablePassthrough()}  
-            | chat_prompt  
-            | llm  #
-            | StrOutputParser()  
-            | RunnableLambda(analyze_and_process_response)
-        ), 
-        get_session_history = get_session_history,
+        2. Simplified Combat:
+        - When combat starts, resolve it within 2–3 rounds total (each round is one AI response).
+        - For each round:
+            a. Player Attack: Perform a d20 roll. If hit, roll damage (d6 or d8).
+            b. Enemy Attack: If enemy still alive, it also does a d20 roll and deals damage on hit.
+        - Provide short but vivid descriptions; avoid lengthy drawn-out battles.
+
+        3. XP & HP Tracking:
+        - Always track "xp_gained" and "hp_change".
+        - At the end of each response, call the TurnOutcome tool once with the turn's "xp_gained" and "hp_change".
+        - If no change, use zero. Never write these values into the narrative itself.
+        - Always write the narrative as your reply text, then call the tool.
+
+        4. Enemy Health Feedback:
+        - Never show exact HP. Use flavor text (e.g. "The goblin staggers...").
+
+        5. Character Data:
+        - The character's current state is given in a system message right before each player action.
+        - It is always up to date; rely on it rather than on values mentioned earlier in the conversation.
+
+        # Initial Scene
+        "You stand before the entrance of an ancient dungeon. The massive stone door is slightly ajar, with a dense mist creeping out. 
+        A shattered tablet beside the door reads: 'Only those who dare shall claim the treasures within.' 
+        Your meager gear rattles slightly, and a chill wind howls behind you, as if no one dares follow you inside." """
+
+# Live character data, sent after the history each turn so it never invalidates the cached prefix
+CHARACTER_STATE = ("Character state: {name} | Level {level} | XP {experience} | HP {hit_point} | "
+                   "STR {strength} DEX {dexterity} CON {constitution} INT {intelligence} WIS {wisdom} CHA {charisma}")
+
+
+# Compact per-turn state message for one character
+def character_state_message(character: CharacterState) -> str:
+    return CHARACTER_STATE.format(
+        name=character.name or "Unknown", level=character.level, experience=character.experience,
+        hit_point=character.hit_point, strength=character.strength, dexterity=character.dexterity,
+        constitution=character.constitution, intelligence=character.intelligence,
+        wisdom=character.wisdom, charisma=character.charisma,
     )
-        
 
-    return routed_chain
+
+# One player's adventure: the character, its write-behind sync and the conversation history
+class AdventureSession:
+    def __init__(self, session_id: str, character: CharacterState, token_uri: str, token_id: int, llm):
+        self.session_id = session_id
+        self.token_id = token_id
+        self.character = character
+        # Flushed on the engine's shared timer instead of a timer thread per session
+        self.sync = CharacterSync(character, token_uri, token_id, flush_interval=None)
+        # Bounded history: older turns are folded into a rolling adventure summary
+        self.history = SummarizingChatMessageHistory(
+            DUNGEON_MASTER_PROMPT,
+            lambda summary, messages: self._summarize(llm, summary, messages),
+        )
+        self.turn_usage: list[TurnUsage] = []
+        self.usage = UsageTotals()
+        self.turn = 0
+        self.trace: TraceSummary | None = None     # time per stage, once the session is closed
+        get_tracer().begin_session(session_id)
+
+    @property
+    def alive(self) -> bool:
+        return self.character.alive
+
+    def _summarize(self, llm, summary, messages) -> str:
+        with turn_context(self.session_id, self.turn):
+            return summarize_adventure(llm, summary, messages)
+
+    # Apply one turn's XP/HP deltas to the character
+    def process_turn_outcome(self, outcome: TurnOutcome):
+        try:
+            # Applied to the character now, written to chain/IPFS in the background
+            with turn_context(self.session_id, self.turn):
+                self.sync.record(outcome.xp_gained, outcome.hp_change)
+        except Exception as e:
+            print("Update error:",e)
+
+    def record_usage(self, usage: TurnUsage):
+        self.turn_usage.append(usage)
+        self.usage.add(usage)
+
+    # Get summary from history message
+    def save_adventure_summary(self):
+        # Rolling summary of the older turns, extended with the turns still held verbatim
+        summary = self.history.full_summary() # LLM generate summary
+        self.sync.update(adventure_log=summary)
+        print("Adventure summary saved.")
+
+    # Write out everything still pending; returns the final status and token URI
+    def close(self) -> tuple[CharacterState, str]:
+        with turn_context(self.session_id, self.turn):
+            self.sync.close()
+        self.trace = get_tracer().end_session(self.session_id)
+        return self.character, self.sync.token_uri
+
+
+# Runs any number of concurrent adventures over one LLM client and one compiled chain,
+# both created once per process; opening a session only allocates its state.
+# The contract and IPFS clients are already shared process-wide by their modules.
+class StoryEngine:
+    def __init__(self, llm=None, flush_interval: float = SYNC_INTERVAL):
+        # stream_usage: token usage (including cached prompt tokens) arrives with the stream
+        self.llm = llm if llm is not None else get_chat_model(stream_usage=True)
+        self.sessions: dict[str, AdventureSession] = {}
+        self.usage = UsageTotals()      # across all sessions
+        self._lock = threading.Lock()
+        self.chain = self._create_conversation_chain()
+        self._stopped = threading.Event()
+        self._timer = threading.Thread(
+            target=self._flush_periodically, args=(flush_interval,), daemon=True, name="story-sync"
+        )
+        self._timer.start()
+
+    # Start an adventure for a character; a character can only be in one adventure at a time
+    def open_session(self, character: CharacterState, token_uri: str, token_id: int) -> AdventureSession:
+        with self._lock:
+            if any(session.token_id == token_id for session in self.sessions.values()):
+                raise ValueError(f"Character {token_id} is already on an adventure")
+            session = AdventureSession(uuid.uuid4().hex, character, token_uri, token_id, self.llm)
+            self.sessions[session.session_id] = session
+        return session
+
+    def close_session(self, session_id: str) -> tuple[CharacterState, str]:
+        with self._lock:
+            session = self.sessions.pop(session_id)
+        return session.close()
+
+    # Close every open session and stop the shared flush timer
+    def shutdown(self):
+        self._stopped.set()
+        for session_id in list(self.sessions):
+            self.close_session(session_id)
+
+    # Play one turn, yielding the Dungeon Master's narrative as it streams in
+    def stream_turn(self, session_id: str, player_input: str):
+        return self.chain.stream(self._turn_input(session_id, player_input), self._config(session_id))
+
+    def astream_turn(self, session_id: str, player_input: str):
+        return self.chain.astream(self._turn_input(session_id, player_input), self._config(session_id))
+
+    def invoke_turn(self, session_id: str, player_input: str) -> str:
+        return self.chain.invoke(self._turn_input(session_id, player_input), self._config(session_id))
+
+    def _turn_input(self, session_id: str, player_input: str) -> dict:
+        character_state = character_state_message(self.sessions[session_id].character)
+        return {"input": player_input, "character_state": character_state}
+
+    def _config(self, session_id: str) -> dict:
+        return {"configurable": {"session_id": session_id}}
+
+    def _session(self, config: dict) -> AdventureSession:
+        return self.sessions[config["configurable"]["session_id"]]
+
+    # One timer for every session. A session closed meanwhile was already removed from
+    # the map; a failure is reported for that session only, so the timer keeps running.
+    def _flush_periodically(self, interval: float):
+        while not self._stopped.wait(interval):
+            with self._lock:
+                sessions = list(self.sessions.values())
+            for session in sessions:
+                try:
+                    if session.session_id in self.sessions and session.sync.pending():
+                        session.sync.flush()
+                except Exception as e:
+                    print(f"Periodic flush failed for token {session.token_id}: {e}")
+
+    # Pass the narrative on as it streams in and apply the turn's deltas once it ends. The
+    # deltas come from the TurnOutcome tool call; a JSON block written into the text instead
+    # is withheld from the narrative and parsed locally as a fallback. A reply with only the
+    # tool call and no text shows the narrative field of the call instead.
+    def _process_response(self, chunks, config):
+        span = self._start_turn(config)
+        narrative = NarrativeFilter()
+        message = None
+        for chunk in chunks:
+            message = chunk if message is None else message + chunk
+            text = narrative.feed(chunk.content)
+            if text:
+                yield text
+                span.attributes.setdefault("first_text", span.elapsed())
+        tail = narrative.finish()
+        if tail:
+            yield tail
+        outcome = turn_outcome(message.tool_calls if message else [], narrative)
+        if not narrative.narrative() and outcome.narrative:
+            yield outcome.narrative
+        self._record_usage(config, message, span)
+        self._session(config).process_turn_outcome(outcome)
+
+    async def _aprocess_response(self, chunks, config):
+        span = self._start_turn(config)
+        narrative = NarrativeFilter()
+        message = None
+        async for chunk in chunks:
+            message = chunk if message is None else message + chunk
+            text = narrative.feed(chunk.content)
+            if text:
+                yield text
+                span.attributes.setdefault("first_text", span.elapsed())
+        tail = narrative.finish()
+        if tail:
+            yield tail
+        outcome = turn_outcome(message.tool_calls if message else [], narrative)
+        if not narrative.narrative() and outcome.narrative:
+            yield outcome.narrative
+        self._record_usage(config, message, span)
+        # Recording a death waits for the burn, so keep it off the event loop
+        await asyncio.to_thread(self._session(config).process_turn_outcome, outcome)
+
+    # Number the new turn and time its model call, from the request until the stream ends
+    def _start_turn(self, config: dict):
+        session = self._session(config)
+        session.turn += 1
+        return get_tracer().start("llm.turn", session.session_id, session.turn)
+
+    def _record_usage(self, config: dict, message, span):
+        usage = turn_usage(message)
+        if usage is not None:
+            self._session(config).record_usage(usage)
+            self.usage.add(usage)
+            count_tokens(span, usage)
+        get_tracer().finish(span)
+
+    # Create Conversation Chain with LangChain
+    def _create_conversation_chain(self):
+        def get_session_history(session_id: str) -> BaseChatMessageHistory:
+            return self.sessions[session_id].history
+
+        # Rules, summary and past turns first (the cacheable prefix), then the live character state
+        chat_prompt = ChatPromptTemplate.from_messages([
+            MessagesPlaceholder("history"),
+            SystemMessagePromptTemplate.from_template("{character_state}"),
+            HumanMessagePromptTemplate.from_template("{input}")
+        ])
+        # Build the conversation chain with message history and processing logic.
+        routed_chain = RunnableWithMessageHistory(
+            runnable=(
+                chat_prompt  
+                | self.llm.bind_tools([TurnOutcome])  # XP/HP deltas arrive as typed tool-call arguments
+                | RunnableGenerator(self._process_response, self._aprocess_response)
+            ), 
+            get_session_history = get_session_history,
+            input_messages_key="input",
+            history_messages_key="history",
+        )
+
+        return routed_chain
+
+
+_engine: StoryEngine | None = None
+_engine_lock = threading.Lock()
+
+# Get the process-wide story engine
+def get_engine() -> StoryEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = StoryEngine()
+        return _engine
 
 
 # Main Conversation Entry Point 
-def start_conversation(character:dict,tokenURI:str,token_id:int):
-    global character_status, character_tokenURI, character_tokenId
-    character_status = character
-    character_tokenURI = tokenURI
-    character_tokenId = token_id
-
-    conversation = create_conversation_chain()
-    session_id = "default_session"
+def start_conversation(character:CharacterState,tokenURI:str,token_id:int,stream:bool=True):
+    engine = get_engine()
+    session = engine.open_session(character, tokenURI, token_id)
     print("\n🔥 You have arrived at the mysterious dungeon entrance 🔥")
     print("(Type 'exit' or 'quit' to leave and save the conversation。)\n")
     
@@ -195,12 +302,25 @@ def start_conversation(character:dict,tokenURI:str,token_id:int):
         if user_input.lower() in {"exit", "quit"}:
             print("You have chosen to leave the dungeon... Game over.")
             # Before exiting, save the adventure summary and upload it to IPFS.
-            save_adventure_summary(session_id)
+            session.save_adventure_summary()
             break
-        if character_status["attributes"][2]["value"] <= 0:
+        if not session.alive:
             print("Your character has perished. Game Over.")
             break
-        response = conversation.invoke({"input": user_input},{"configurable": {"session_id": session_id}})
-        print("Dungeon Master:", response)
-
+        if stream:
+            # Print the narrative token by token instead of after the whole response
+            print("Dungeon Master:", end=" ", flush=True)
+            for chunk in engine.stream_turn(session.session_id, user_input):
+                print(chunk, end="", flush=True)
+            print()
+        else:
+            response = engine.invoke_turn(session.session_id, user_input)
+            print("Dungeon Master:", response)
 
+    print("Token usage:", session.usage)
+    # Write out everything still pending before leaving the session
+    print("Saving character...")
+    # Final state, so the caller can update its roster without reloading it
+    result = engine.close_session(session.session_id)
+    print(f"Time per stage:\n{session.trace}")
+    return result
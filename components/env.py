@@ -0,0 +1,16 @@
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+
+root_dir = Path(__file__).parent.parent
+
+_loaded = False
+_lock = threading.Lock()
+
+# Load the project's .env into the environment, once per process
+def load_env():
+    global _loaded
+    with _lock:
+        if not _loaded:
+            load_dotenv(root_dir / ".env")
+            _loaded = True
@@ -0,0 +1,100 @@
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, SystemMessage
+from .token_usage import count_tokens, turn_usage
+from .tracing import get_tracer
+
+# Prompt tokens the history may use before older turns are folded into the summary
+HISTORY_TOKEN_BUDGET = 3000
+# Most recent messages kept verbatim (3 player/DM turns), as long as they fit under the
+# low watermark; the latest turn is always kept
+KEEP_RECENT_MESSAGES = 6
+LATEST_TURN_MESSAGES = 2
+# Once over budget, the oldest turns are folded until the history is back down to this
+# share of it, so folds (each a blocking LLM call that also rewrites the summary right
+# after the rules, the start of the cached prompt prefix) come every several turns
+HISTORY_LOW_WATERMARK = 0.5
+
+SUMMARY_PROMPT = """
+Summarize the following conversation into a very short and concise adventure log,
+only describing the actions taken and key events, and DO NOT include any details
+about experience points or health values:\n\n"""
+
+SUMMARY_UPDATE_PROMPT = """
+Here is the adventure log so far:\n\n{summary}\n\n
+Rewrite it as a single very short and concise adventure log that also covers the
+following conversation, only describing the actions taken and key events, and DO NOT
+include any details about experience points or health values:\n\n"""
+
+
+# Rough token count (about 4 characters per token), cheap enough to run every turn
+def estimate_tokens(messages: list[BaseMessage]) -> int:
+    return sum(len(str(message.content)) // 4 + 4 for message in messages)
+
+
+# Fold `messages` into the adventure log `summary` with one LLM call
+def summarize_adventure(llm, summary: str, messages: list[BaseMessage]) -> str:
+    conversation = "\n".join(str(message.content) for message in messages)
+    if summary:
+        prompt = SUMMARY_UPDATE_PROMPT.format(summary=summary) + conversation
+    else:
+        prompt = SUMMARY_PROMPT + conversation
+    with get_tracer().span("llm.summary") as span:
+        message = llm.invoke(prompt)
+        usage = turn_usage(message)
+        if usage is not None:
+            count_tokens(span, usage)
+    return message.content
+
+
+# Chat history holding the system prompt, a rolling summary of older turns and the most
+# recent turns verbatim. When the history grows past `token_budget`, the oldest turns
+# are folded into the summary down to `low_watermark` of the budget, so the prompt sent
+# each turn stops growing.
+class SummarizingChatMessageHistory(BaseChatMessageHistory):
+    def __init__(self, system_prompt: str, summarizer, token_budget: int = HISTORY_TOKEN_BUDGET,
+                 keep_recent: int = KEEP_RECENT_MESSAGES, low_watermark: float = HISTORY_LOW_WATERMARK):
+        self.system_message = SystemMessage(content=system_prompt)
+        self.summarizer = summarizer    # (summary, messages) -> new summary
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.low_watermark = low_watermark
+        self.summary = ""
+        self.recent: list[BaseMessage] = []
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        messages = [self.system_message]
+        if self.summary:
+            messages.append(SystemMessage(content="Adventure so far: " + self.summary))
+        return messages + self.recent
+
+    def add_messages(self, messages: list[BaseMessage]):
+        self.recent.extend(messages)
+        if estimate_tokens(self.messages) > self.token_budget and len(self.recent) > LATEST_TURN_MESSAGES:
+            self._fold(self._fold_count())
+
+    # Oldest messages to fold to get back to the low watermark: everything before the last
+    # `keep_recent` messages, then more of those while the history is still above it
+    def _fold_count(self) -> int:
+        target = self.token_budget * self.low_watermark - estimate_tokens(self.messages[:-len(self.recent)])
+        size = estimate_tokens(self.recent)
+        count = 0
+        while count < len(self.recent) - LATEST_TURN_MESSAGES and (
+                count < len(self.recent) - self.keep_recent or size > target):
+            size -= estimate_tokens([self.recent[count]])
+            count += 1
+        return count
+
+    # Summary of the whole session, covering the turns still held verbatim
+    def full_summary(self) -> str:
+        if not self.recent:
+            return self.summary
+        return self.summarizer(self.summary, self.recent)
+
+    def _fold(self, count: int):
+        folded, self.recent = self.recent[:count], self.recent[count:]
+        self.summary = self.summarizer(self.summary, folded)
+
+    def clear(self):
+        self.summary = ""
+        self.recent = []
@@ -0,0 +1,228 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from eth_abi import decode
+from eth_utils import keccak
+from .contract_interaction import TRANSFER_TOPIC, RosterEntry
+from .env import load_env
+from .rpc import RpcClient, RpcError
+
+root_dir = Path(__file__).parent.parent
+
+DEFAULT_INDEX_PATH = root_dir / ".cache" / "character_index.sqlite"
+# Blocks requested per eth_getLogs call during backfill; halved when a node refuses a range
+LOG_CHUNK_SIZE = 2000
+# Only blocks this far below the head are indexed, so a reorg never reaches the index
+CONFIRMATIONS = 6
+INDEX_INTERVAL = 5
+
+STATUS_CHANGED_TOPIC = "0x" + keccak(text="StatusChanged(uint256,uint256,uint256)").hex()
+CHARACTER_CHANGED_TOPIC = "0x" + keccak(text="CharacterChanged(uint256,string)").hex()
+
+ZERO_ADDRESS = "0x" + "00" * 20
+
+
+# Where the index is stored (CHARACTER_INDEX_PATH), read when it is opened so .env applies
+def index_path() -> Path:
+    load_env()
+    return Path(os.getenv("CHARACTER_INDEX_PATH", DEFAULT_INDEX_PATH))
+
+
+def _topic_address(topic: str) -> str:
+    return "0x" + topic[-40:].lower()
+
+
+# Local SQLite index of the Character contract's events: who owns which character, its
+# token URI and its status. Backfills from `start_block` with chunked eth_getLogs, then
+# follows the chain on a background thread once started. Only blocks `confirmations`
+# below the head are ingested, so the index never has to undo a reorg. Reads overlay
+# the newer blocks, fetched from the node with one eth_getLogs, so the game's own mints,
+# burns and changes show up as soon as they are mined.
+class CharacterIndexer:
+    def __init__(self, rpc: RpcClient, address: str, path: Path | None = None, start_block: int = 0,
+                 confirmations: int = CONFIRMATIONS, chunk_size: int = LOG_CHUNK_SIZE,
+                 interval: float = INDEX_INTERVAL):
+        self.rpc = rpc
+        self.address = address.lower()
+        self.path = Path(path) if path is not None else index_path()
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS characters ("
+            " token_id INTEGER PRIMARY KEY, owner TEXT NOT NULL, token_uri TEXT,"
+            " level INTEGER NOT NULL DEFAULT 0, experience INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS characters_owner ON characters (owner)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS progress (address TEXT PRIMARY KEY, block INTEGER NOT NULL)")
+        self._reset_if_other_contract()
+        self._caught_up = False
+        self._stopped = threading.Event()
+        self._worker: threading.Thread | None = None
+
+    # An index file built for another deployment is started over
+    def _reset_if_other_contract(self):
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM progress WHERE address != ?", (self.address,)).fetchone():
+                self._db.execute("DELETE FROM characters")
+                self._db.execute("DELETE FROM progress")
+
+    # Last block ingested, or None before the first sync
+    @property
+    def synced_block(self) -> int | None:
+        with self._lock:
+            row = self._db.execute("SELECT block FROM progress WHERE address = ?", (self.address,)).fetchone()
+        return None if row is None else row[0]
+
+    # Whether a sync in this process has reached the confirmed head; a partial backfill
+    # (or an index file left behind by an earlier run) would answer with a partial roster
+    @property
+    def ready(self) -> bool:
+        return self._caught_up
+
+    # Ingest every confirmed block not indexed yet; returns how many logs were applied
+    def sync(self) -> int:
+        with self._sync_lock:
+            head = int(self.rpc.request("eth_blockNumber", []), 16)
+            safe = head - self.confirmations
+            synced = self.synced_block
+            start = self.start_block if synced is None else synced + 1
+            applied = 0
+            while start <= safe:
+                end = min(start + self.chunk_size - 1, safe)
+                try:
+                    logs = self._get_logs(start, end)
+                except RpcError:
+                    if end == start:
+                        raise
+                    # Too many results for this range: retry with smaller chunks
+                    self.chunk_size = max(1, self.chunk_size // 2)
+                    continue
+                self._apply(logs, end)
+                applied += len(logs)
+                start = end + 1
+            if synced is None and safe < self.start_block:
+                self._apply([], self.start_block - 1)   # nothing confirmed yet, but the index is usable
+            self._caught_up = True
+            return applied
+
+    def _get_logs(self, start: int, end: int | str) -> list[dict]:
+        return self.rpc.request("eth_getLogs", [{
+            "address": self.address,
+            "fromBlock": hex(start),
+            "toBlock": end if isinstance(end, str) else hex(end),
+            "topics": [[TRANSFER_TOPIC, STATUS_CHANGED_TOPIC, CHARACTER_CHANGED_TOPIC]],
+        }])
+
+    # Apply one chunk of logs and move the progress marker in a single transaction
+    def _apply(self, logs: list[dict], block: int):
+        logs = _in_chain_order(logs)
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for log in logs:
+                    self._apply_log(log)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO progress (address, block) VALUES (?, ?)", (self.address, block)
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _apply_log(self, log: dict):
+        topics = [topic.lower() for topic in log["topics"]]
+        data = bytes.fromhex(log["data"].removeprefix("0x"))
+        if topics[0] == TRANSFER_TOPIC:
+            sender, receiver, token_id = _topic_address(topics[1]), _topic_address(topics[2]), int(topics[3], 16)
+            if receiver == ZERO_ADDRESS:
+                self._db.execute("DELETE FROM characters WHERE token_id = ?", (token_id,))
+            elif sender == ZERO_ADDRESS:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO characters (token_id, owner) VALUES (?, ?)", (token_id, receiver)
+                )
+            else:
+                self._db.execute("UPDATE characters SET owner = ? WHERE token_id = ?", (receiver, token_id))
+            return
+        token_id = int(topics[1], 16)
+        if topics[0] == STATUS_CHANGED_TOPIC:
+            level, experience = decode(["uint256", "uint256"], data)
+            # Burned characters have no row left to update
+            self._db.execute(
+                "UPDATE characters SET level = ?, experience = ? WHERE token_id = ?", (level, experience, token_id)
+            )
+        elif topics[0] == CHARACTER_CHANGED_TOPIC:
+            (token_uri,) = decode(["string"], data)
+            self._db.execute("UPDATE characters SET token_uri = ? WHERE token_id = ?", (token_uri, token_id))
+
+    # Run `query` on the index with the blocks after the last ingested one applied on top
+    # (unconfirmed=True), in a transaction that is rolled back afterwards
+    def _read(self, query: str, params: tuple, unconfirmed: bool) -> list[tuple]:
+        synced = self.synced_block
+        tail = []
+        if unconfirmed and synced is not None:
+            tail = _in_chain_order(self._get_logs(synced + 1, "latest"))
+        with self._lock:
+            if not tail:
+                return self._db.execute(query, params).fetchall()
+            self._db.execute("BEGIN")
+            try:
+                for log in tail:
+                    self._apply_log(log)
+                return self._db.execute(query, params).fetchall()
+            finally:
+                self._db.execute("ROLLBACK")
+
+    # The characters owned by `owner`, by token ID; unconfirmed=False reads the confirmed
+    # blocks only, without asking the node
+    def roster(self, owner: str, unconfirmed: bool = True) -> list[RosterEntry]:
+        rows = self._read(
+            "SELECT token_id, token_uri, level, experience FROM characters WHERE owner = ? ORDER BY token_id",
+            (owner.lower(),), unconfirmed,
+        )
+        return [RosterEntry(*row) for row in rows]
+
+    # (level, experience) of a character, or None if it is not indexed
+    def status(self, token_id: int, unconfirmed: bool = True) -> tuple[int, int] | None:
+        rows = self._read("SELECT level, experience FROM characters WHERE token_id = ?", (token_id,), unconfirmed)
+        return tuple(rows[0]) if rows else None
+
+    # Follow the chain in the background
+    def start(self) -> "CharacterIndexer":
+        self._worker = threading.Thread(target=self._follow, daemon=True, name="character-indexer")
+        self._worker.start()
+        return self
+
+    def _follow(self):
+        while not self._stopped.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                print("Character indexer failed:", e)
+            self._stopped.wait(self.interval)
+
+    def close(self):
+        self._stopped.set()
+        if self._worker is not None:
+            self._worker.join()
+        self._db.close()
+
+
+def _in_chain_order(logs: list[dict]) -> list[dict]:
+    return sorted(logs, key=lambda log: (int(log["blockNumber"], 16), int(log["logIndex"], 16)))
+
+
+# Index for a contract client, when INDEX_FROM_BLOCK (the deployment block) is set and the
+# network has an RPC node to read logs from; None otherwise
+def indexer_for_client(client) -> CharacterIndexer | None:
+    start_block = os.getenv("INDEX_FROM_BLOCK")
+    if start_block is None or not client.network.url or client.network.is_fork:
+        return None
+    return CharacterIndexer(client.rpc, client.address, start_block=int(start_block)).start()
@@ -0,0 +1,114 @@
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from .env import load_env
+
+root_dir = Path(__file__).parent.parent
+
+DEFAULT_CACHE_PATH = root_dir / ".cache" / "ipfs_metadata.sqlite"
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+# Where the cache is stored (IPFS_CACHE_PATH), read when it is opened so .env applies
+def cache_path() -> Path:
+    load_env()
+    return Path(os.getenv("IPFS_CACHE_PATH", DEFAULT_CACHE_PATH))
+
+
+# Extract the CID from a gateway URL ("https://ipfs.io/ipfs/<cid>"), "ipfs://<cid>" or a bare CID.
+# Returns None for URIs that are not content-addressed.
+def cid_from_uri(uri: str) -> str | None:
+    if "/ipfs/" in uri:
+        cid = uri.split("/ipfs/", 1)[1]
+    elif uri.startswith("ipfs://"):
+        cid = uri[len("ipfs://"):]
+    else:
+        cid = uri
+    cid = cid.split("?", 1)[0].split("/", 1)[0]
+    if cid.startswith("baf") or (cid.startswith("Qm") and len(cid) == 46):
+        return cid
+    return None
+
+
+# CIDv1 of `data` stored as a single raw block (raw codec, sha2-256, base32), the CID
+# IPFS gives a small file pinned with raw leaves. Lets a client know a document's CID
+# before, or without, pinning it.
+def content_cid(data: bytes) -> str:
+    cid = bytes([0x01, 0x55, 0x12, 0x20]) + hashlib.sha256(data).digest()
+    return "b" + base64.b32encode(cid).decode().lower().rstrip("=")
+
+
+# On-disk store of IPFS JSON documents keyed by CID, evicting least recently used
+# entries once the stored content exceeds `max_bytes`. CIDs are immutable, so
+# entries never need invalidating.
+class MetadataCache:
+    def __init__(self, path: Path | None = None, max_bytes: int | None = None):
+        self.path = Path(path) if path is not None else cache_path()
+        if max_bytes is None:
+            max_bytes = int(os.getenv("IPFS_CACHE_MAX_BYTES", DEFAULT_CACHE_MAX_BYTES))
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            " cid TEXT PRIMARY KEY, content BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS metadata_last_used ON metadata (last_used)")
+
+    # Return a fresh copy of the cached document, or None on a miss
+    def get(self, cid: str):
+        with self._lock:
+            row = self._db.execute("SELECT content FROM metadata WHERE cid = ?", (cid,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE metadata SET last_used = ? WHERE cid = ?", (time.time(), cid))
+        return json.loads(row[0])
+
+    def put(self, cid: str, content):
+        data = json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO metadata (cid, content, size, last_used) VALUES (?, ?, ?, ?)",
+                (cid, data, len(data), time.time()),
+            )
+            self._evict()
+
+    def size(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM metadata").fetchone()[0]
+
+    def __contains__(self, cid: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM metadata WHERE cid = ?", (cid,)).fetchone() is not None
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM metadata").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for cid, size in self._db.execute("SELECT cid, size FROM metadata ORDER BY last_used").fetchall():
+            self._db.execute("DELETE FROM metadata WHERE cid = ?", (cid,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def close(self):
+        self._db.close()
+
+
+_cache: MetadataCache | None = None
+_cache_lock = threading.Lock()
+
+# Shared process-wide cache, opened on first use
+def get_cache() -> MetadataCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetadataCache()
+        return _cache
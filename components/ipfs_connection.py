@@ -1,97 +1,266 @@
+import json
 import os
-from pathlib import Path
-from dotenv import load_dotenv
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from .character_state import CharacterState, canonical_json
+from .env import load_env
+from .ipfs_cache import cid_from_uri, get_cache
+from .tracing import get_tracer
 
-# Load environment variables (adjust according to actual path)
-root_dir = Path(__file__).parent.parent
-load_dotenv(root_dir / ".env")
+load_env()
 
 PINATA_JWT = os.getenv("PINATA_JWT_TOKEN")
+PINATA_API_URL = os.getenv("PINATA_API_URL", "https://api.pinata.cloud")
+
+# Pinata API calls: per-request timeout (seconds), retries with exponential backoff, parallelism
+PINATA_TIMEOUT = 30
+PINATA_RETRIES = 4
+PINATA_BACKOFF = 0.5
+PINATA_MAX_BACKOFF = 30
+PINATA_MAX_PARALLEL = 8
+
+# Gateway reads: per-request timeout (seconds), retries with exponential backoff, parallelism
+GATEWAY_TIMEOUT = 10
+GATEWAY_RETRIES = 2
+GATEWAY_BACKOFF = 0.5
+GATEWAY_MAX_PARALLEL = 8
+
+# Read metadata from the IPFS gateway through one keep-alive connection pool
+gateway_session = requests.Session()
+gateway_session.mount("https://", HTTPAdapter(pool_maxsize=GATEWAY_MAX_PARALLEL))
+gateway_session.mount("http://", HTTPAdapter(pool_maxsize=GATEWAY_MAX_PARALLEL))
+
+class PinataError(Exception):
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status    # HTTP status of the refused request, if it got an answer
+
+
+# Seconds to wait according to a Retry-After header, if the response has one
+def _retry_after(response: requests.Response) -> float | None:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+# Pinata pinning API over one keep-alive session. Timeouts, connection errors, 429 and
+# 5xx responses are retried with exponential backoff; a 429 also holds back every other
+# request of this client until the rate limit window has passed.
+class PinataClient:
+    def __init__(self, jwt: str | None = PINATA_JWT, api_url: str = PINATA_API_URL,
+                 timeout: float = PINATA_TIMEOUT, retries: int = PINATA_RETRIES,
+                 backoff: float = PINATA_BACKOFF, max_parallel: int = PINATA_MAX_PARALLEL):
+        self.api_url = api_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_parallel = max_parallel
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {jwt}"
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=max_parallel))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=max_parallel))
+        self._resume_at = 0.0       # monotonic time before which requests wait (rate limited)
+        self._rate_lock = threading.Lock()
+
+    def _wait_for_rate_limit(self):
+        with self._rate_lock:
+            delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _hold(self, delay: float):
+        with self._rate_lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        # One span per API operation (e.g. pinata.pinJSONToIPFS), retries included
+        with get_tracer().span("pinata." + path.removeprefix("/pinning/").split("/")[0]) as span:
+            for attempt in range(self.retries + 1):
+                delay = min(self.backoff * 2 ** attempt, PINATA_MAX_BACKOFF)
+                if attempt:
+                    span.count("retries")
+                self._wait_for_rate_limit()
+                try:
+                    response = self.session.request(method, self.api_url + path, timeout=self.timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = f"{method} {path}: {e}"
+                else:
+                    span.count("bytes_sent", len(response.request.body or b""))
+                    span.count("bytes_received", len(response.content))
+                    if response.ok:
+                        return response
+                    error = f"{method} {path}: {response.status_code} {response.text[:200]}"
+                    if response.status_code == 429:
+                        delay = _retry_after(response) or delay
+                        self._hold(delay)
+                    elif response.status_code < 500:
+                        raise PinataError(error, response.status_code)    # not retryable
+                if attempt < self.retries:
+                    time.sleep(delay)
+            raise PinataError(error)
+
+    # Pin a JSON document; returns its CID (v1)
+    def pin_json(self, content: dict, name: str = "pinnie.json") -> str:
+        payload = {
+            "pinataOptions": {"cidVersion": 1},
+            "pinataMetadata": {"name": name},
+            "pinataContent": content
+        }
+        try:
+            cid = self._request("POST", "/pinning/pinJSONToIPFS", json=payload).json().get("IpfsHash")
+        except ValueError as e:
+            raise PinataError(f"invalid pin response: {e}")
+        if not cid:
+            raise PinataError("pin response has no IpfsHash")
+        return cid
+
+    # Pin a file (e.g. a character image); returns its CID (v1)
+    def pin_file(self, data: bytes, filename: str, content_type: str = "application/octet-stream") -> str:
+        form = {
+            "pinataOptions": json.dumps({"cidVersion": 1}),
+            "pinataMetadata": json.dumps({"name": filename}),
+        }
+        response = self._request("POST", "/pinning/pinFileToIPFS", files={"file": (filename, data, content_type)}, data=form)
+        try:
+            cid = response.json().get("IpfsHash")
+        except ValueError as e:
+            raise PinataError(f"invalid pin response: {e}")
+        if not cid:
+            raise PinataError("pin response has no IpfsHash")
+        return cid
+
+    # Pin a JSON document as the exact bytes given; its CID is then content_cid(document)
+    def pin_document(self, document: bytes, name: str = "metadata.json") -> str:
+        return self.pin_file(document, name, "application/json")
+
+    # Unpin a CID; one that is not pinned (any more, e.g. unpinned by an earlier run) counts as unpinned
+    def unpin(self, cid: str):
+        try:
+            self._request("DELETE", f"/pinning/unpin/{cid}")
+        except PinataError as e:
+            message = str(e).lower()
+            if e.status != 404 and "not pinned" not in message and "has_not_pinned" not in message:
+                raise
+
+    # Pin many documents concurrently; CIDs in the order of `contents`, None for failures
+    def pin_jsons(self, contents: list[dict]) -> list[str | None]:
+        return self._map(self.pin_json, contents)
+
+    # Unpin many CIDs concurrently; True for each CID that was unpinned
+    def unpin_many(self, cids: list[str]) -> list[bool]:
+        return [result is not None for result in self._map(lambda cid: self.unpin(cid) or cid, cids)]
+
+    def _map(self, operation, items: list) -> list:
+        def attempt(item):
+            try:
+                return operation(item)
+            except PinataError as e:
+                print(f"Pinata request failed: {e}")
+                return None
+
+        if len(items) <= 1:
+            return [attempt(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(items))) as pool:
+            return list(pool.map(attempt, items))
+
+
+_pinata: PinataClient | None = None
+_pinata_lock = threading.Lock()
+
+# Get the shared Pinata client
+def get_pinata() -> PinataClient:
+    global _pinata
+    with _pinata_lock:
+        if _pinata is None:
+            _pinata = PinataClient()
+        return _pinata
+
+# NFT metadata of a newly created character
+def character_metadata(character: dict) -> dict:
+    attributes = character["attributes"]
+    return CharacterState(
+        name=f"{character["name"]}",
+        description=f"{character["description"]}",
+        image=f"{character["image"]}",
+        level=1,
+        experience=0,
+        hit_point=10 + ((attributes["constitution"]-5)//2),
+        **attributes
+    ).to_metadata()
 
 # When create new character
 def upload_ipfs(character: dict):
-    url = "https://api.pinata.cloud/pinning/pinJSONToIPFS"
-    character_metadata = {
-        "name": f"{character["name"]}",
-        "description": f"{character["description"]}",
-        "image": f"{character["image"]}",
-        "attributes": [
-            {"trait_type": "level", "value": 1},
-            {"trait_type": "experience", "value": 0},
-            {"trait_type": "hit point", "value": 10 + ((character["attributes"]["constitution"]-5)//2)},
-            {"trait_type": "strength", "value": character["attributes"]["strength"]},
-            {"trait_type": "dexterity", "value": character["attributes"]["dexterity"]},
-            {"trait_type": "constitution", "value": character["attributes"]["constitution"]},
-            {"trait_type": "intelligence", "value": character["attributes"]["intelligence"]},
-            {"trait_type": "wisdom", "value": character["attributes"]["wisdom"]},
-            {"trait_type": "charisma", "value": character["attributes"]["charisma"]}
-        ]
-    }
-    payload = {
-        "pinataOptions": {"cidVersion": 1},
-        "pinataMetadata": {"name": "pinnie.json"},
-        "pinataContent": character_metadata
-    }
-    headers = {
-        "Authorization": f"Bearer {PINATA_JWT}",
-        "Content-Type": "application/json"
-    }
-    response = requests.request("POST", url, json=payload, headers=headers)
-    if response.status_code == 200:
-        print("Successfully carate character metadata on Pinata!")
-    else:
-        print("Failed to create character metadata. Status code:", response.status_code)
-        print("Response:", response.text)
-        
-    Cid = response.json().get("IpfsHash")
+    metadata = character_metadata(character)
+    try:
+        Cid = get_pinata().pin_document(canonical_json(metadata))
+    except PinataError as e:
+        print("Failed to create character metadata:", e)
+        return None
+    print("Successfully carate character metadata on Pinata!")
+    get_cache().put(Cid, metadata)
     return Cid
 
+def _should_retry(error: requests.RequestException) -> bool:
+    response = error.response
+    return response is None or response.status_code == 429 or response.status_code >= 500
+
+# Fetch one metadata JSON, retrying timeouts, 429 and 5xx responses with exponential backoff
+def fetch_ipfs_json(CID: str, timeout: float = GATEWAY_TIMEOUT, retries: int = GATEWAY_RETRIES):
+    with get_tracer().span("ipfs.get") as span:
+        for attempt in range(retries + 1):
+            if attempt:
+                span.count("retries")
+            try:
+                response = gateway_session.get(CID, timeout=timeout)
+                span.count("bytes_received", len(response.content))
+                response.raise_for_status()
+                return response.json()
+            except requests.RequestException as e:
+                if attempt == retries or not _should_retry(e):
+                    raise
+                time.sleep(GATEWAY_BACKOFF * 2 ** attempt)
+
+# Read metadata through the local CID cache; only misses reach the gateway
 def get_ipfs_json(CID: str):
+    cid = cid_from_uri(CID)
+    if cid is not None:
+        cached = get_cache().get(cid)
+        if cached is not None:
+            return cached
     try:
-        response = requests.get(CID)
-        json_data = response.json()
+        json_data = fetch_ipfs_json(CID)
+        if cid is not None:
+            get_cache().put(cid, json_data)
         return json_data
     except Exception as e:
         print(f"connection ipfs failed: {e}")
 
+# Fetch many token URIs concurrently; results are in the order of `CIDs`, None for failures
+def get_ipfs_jsons(CIDs: list[str], max_parallel: int = GATEWAY_MAX_PARALLEL) -> list:
+    if len(CIDs) <= 1:
+        return [get_ipfs_json(CID) for CID in CIDs]
+    with ThreadPoolExecutor(max_workers=min(max_parallel, len(CIDs))) as pool:
+        return list(pool.map(get_ipfs_json, CIDs))
+
 def delete_ipfs(cid: str):
-    url = f"https://api.pinata.cloud/pinning/unpin/{cid}"
-    headers = {
-        "Authorization": f"Bearer {PINATA_JWT}"
-    }
-    response = requests.delete(url, headers=headers)
-    
-    if response.status_code == 200:
+    try:
+        get_pinata().unpin(cid)
         print("Successfully unpinned IPFS file!")
-    else:
-        print("Failed to unpin IPFS file. Status code:", response.status_code)
-        print("Response:", response.text)
-
-# When update character
-def update_ipfs_metadata(keyvalues: dict):
-    
-    url = "https://api.pinata.cloud/pinning/pinJSONToIPFS"
-    payload = {
-        "pinataOptions": {"cidVersion": 1},
-        "pinataMetadata": {"name": "pinnie.json"},
-        "pinataContent": keyvalues
-    }
-    headers = {
-        "Authorization": f"Bearer {PINATA_JWT}",
-        "Content-Type": "application/json"
-    }
-    response = requests.request("POST", url, json=payload, headers=headers)
-
-    
-    if response.status_code == 200:
-        print("Successfully updated metadata on Pinata!")
-    else:
-        print("Failed to update metadata. Status code:", response.status_code)
-        print("Response:", response.text)
-    
-    Cid = response.json().get("IpfsHash")
-    return Cid
+    except PinataError as e:
+        print("Failed to unpin IPFS file:", e)
 
-    
-    
\ No newline at end of file
+# When update character. Pinned as canonical JSON (or `document`, its canonical JSON if the
+# caller already has it), so the CID returned is content_cid() of those bytes.
+def update_ipfs_metadata(keyvalues: dict, document: bytes | None = None):
+    try:
+        Cid = get_pinata().pin_document(document if document is not None else canonical_json(keyvalues))
+    except PinataError as e:
+        print("Failed to update metadata:", e)
+        return None
+    print("Successfully updated metadata on Pinata!")
+    get_cache().put(Cid, keyvalues)
+    return Cid
@@ -0,0 +1,43 @@
+import threading
+import httpx
+from openai import OpenAI
+from langchain_openai import ChatOpenAI
+
+# Connections to the OpenAI API are pooled and kept alive across every client in the process
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+OPENAI_TIMEOUT = 60
+DEFAULT_TEMPERATURE = 0.3
+
+_lock = threading.Lock()
+_http_client: httpx.Client | None = None
+_openai_client: OpenAI | None = None
+_chat_models: dict[tuple, ChatOpenAI] = {}
+
+
+def _shared_http_client() -> httpx.Client:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(
+            timeout=OPENAI_TIMEOUT,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS),
+        )
+    return _http_client
+
+
+# Chat model for the given settings, created on first use and then reused
+def get_chat_model(temperature: float = DEFAULT_TEMPERATURE, **kwargs) -> ChatOpenAI:
+    key = (temperature, tuple(sorted(kwargs.items())))
+    with _lock:
+        if key not in _chat_models:
+            _chat_models[key] = ChatOpenAI(temperature=temperature, http_client=_shared_http_client(), **kwargs)
+        return _chat_models[key]
+
+
+# Plain OpenAI client (images), sharing the chat models' connection pool
+def get_openai_client() -> OpenAI:
+    global _openai_client
+    with _lock:
+        if _openai_client is None:
+            _openai_client = OpenAI(http_client=_shared_http_client())
+        return _openai_client
@@ -0,0 +1,208 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from .contract_interaction import query_token_uri
+from .env import load_env
+from .rpc import ContractReverted
+from .ipfs_cache import cid_from_uri
+from .ipfs_connection import get_pinata
+
+root_dir = Path(__file__).parent.parent
+
+DEFAULT_GC_PATH = root_dir / ".cache" / "pin_gc.sqlite"
+# Unpin this many CIDs per batch; a full batch is collected right away, smaller ones on the timer
+GC_BATCH_SIZE = 50
+GC_INTERVAL = 10
+# Give up on a CID Pinata keeps refusing to unpin after this many batches: it is logged
+# as leaked and dropped from the queue
+GC_MAX_ATTEMPTS = 5
+
+WAITING = "waiting"     # the transaction replacing it on chain is not confirmed yet
+READY = "ready"         # no longer referenced on chain, safe to unpin
+
+
+# Where the queue is stored (PIN_GC_PATH), read when it is opened so .env applies
+def gc_path() -> Path:
+    load_env()
+    return Path(os.getenv("PIN_GC_PATH", DEFAULT_GC_PATH))
+
+
+# Deferred unpinning of superseded metadata pins. A CID is only unpinned once the
+# transaction that replaced it on chain (change_character or a burn) is confirmed, in
+# batches on a background thread. The queue lives in SQLite, so pins superseded before
+# a restart are still collected after it: their token URI is checked on chain instead.
+# A CID that becomes current again is taken off the queue (retain), and every token URI
+# is checked once more right before unpinning.
+class PinCollector:
+    def __init__(self, path: Path | None = None, batch_size: int = GC_BATCH_SIZE, interval: float = GC_INTERVAL):
+        self.path = Path(path) if path is not None else gc_path()
+        self.batch_size = batch_size
+        self.interval = interval
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS superseded ("
+            " cid TEXT PRIMARY KEY, token_id INTEGER NOT NULL, state TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, queued_at REAL NOT NULL)"
+        )
+        self._tracked: set[str] = set()     # waiting on a transaction handle in this process
+        self._collect_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._collect_periodically, daemon=True, name="pin-gc")
+        self._worker.start()
+
+    # Queue `uri` for unpinning once `handle` (the transaction replacing it on chain) is confirmed
+    def supersede(self, uri: str, token_id: int, handle):
+        cid = cid_from_uri(uri)
+        if cid is None:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO superseded (cid, token_id, state, queued_at) VALUES (?, ?, ?, ?)",
+                (cid, token_id, WAITING, time.time()),
+            )
+            self._tracked.add(cid)
+        handle.add_done_callback(lambda handle: self._settled(cid, handle))
+
+    # Take `uri` off the queue because it is (about to be) current again, e.g. metadata
+    # changed back to an earlier document with the same content CID
+    def retain(self, uri: str):
+        cid = cid_from_uri(uri)
+        if cid is None:
+            return
+        with self._lock:
+            self._db.execute("DELETE FROM superseded WHERE cid = ?", (cid,))
+            self._tracked.discard(cid)
+
+    def _settled(self, cid: str, handle):
+        with self._lock:
+            self._tracked.discard(cid)
+            if handle.ok:
+                self._db.execute("UPDATE superseded SET state = ? WHERE cid = ?", (READY, cid))
+                ready = self._count(READY)
+            else:
+                # The replacement never landed, so the chain still points at this CID
+                self._db.execute("DELETE FROM superseded WHERE cid = ?", (cid,))
+                ready = 0
+        if ready >= self.batch_size:
+            self._wake.set()
+
+    def _count(self, state: str) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM superseded WHERE state = ?", (state,)).fetchone()[0]
+
+    # CIDs queued and not yet unpinned
+    def pending(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM superseded").fetchone()[0]
+
+    # Unpin every CID that is ready, in batches; returns how many were unpinned
+    def collect(self) -> int:
+        with self._collect_lock:
+            with self._lock:
+                self._drop_failed()     # e.g. left behind by an earlier run
+            self._check_untracked()
+            unpinned = 0
+            while True:
+                with self._lock:
+                    rows = self._db.execute(
+                        "SELECT cid, token_id FROM superseded WHERE state = ? ORDER BY queued_at LIMIT ?",
+                        (READY, self.batch_size),
+                    ).fetchall()
+                if not rows:
+                    return unpinned
+                cids = self._not_current(rows)
+                if cids is None:
+                    return unpinned     # chain unreachable, retried on the next run
+                if not cids:
+                    continue
+                results = get_pinata().unpin_many(cids)
+                with self._lock:
+                    for cid, ok in zip(cids, results):
+                        if ok:
+                            self._db.execute("DELETE FROM superseded WHERE cid = ?", (cid,))
+                        else:
+                            self._db.execute("UPDATE superseded SET attempts = attempts + 1 WHERE cid = ?", (cid,))
+                    self._drop_failed()
+                unpinned += sum(results)
+                if not all(results):
+                    return unpinned     # retried on the next run
+
+    # Stop retrying CIDs Pinata refused to unpin GC_MAX_ATTEMPTS times; they stay pinned
+    def _drop_failed(self):
+        rows = self._db.execute("SELECT cid FROM superseded WHERE attempts >= ?", (GC_MAX_ATTEMPTS,)).fetchall()
+        for (cid,) in rows:
+            print(f"Pin GC gave up on {cid} after {GC_MAX_ATTEMPTS} attempts; it is still pinned on Pinata")
+        self._db.execute("DELETE FROM superseded WHERE attempts >= ?", (GC_MAX_ATTEMPTS,))
+
+    # CIDs of `rows` (cid, token_id) that their token no longer points at; the others are
+    # current on chain again and are dropped from the queue. None if the chain can't be read.
+    def _not_current(self, rows: list[tuple[str, int]]) -> list[str] | None:
+        cids = []
+        for cid, token_id in rows:
+            try:
+                current = cid_from_uri(query_token_uri(token_id))
+            except Exception as e:
+                if not isinstance(e, ContractReverted):
+                    print(f"Pin GC could not read token {token_id}: {e}")
+                    return None
+                current = None      # burned
+            if current == cid:
+                self.retain(cid)
+            else:
+                cids.append(cid)
+        return cids
+
+    # Entries queued by an earlier process have no handle to wait on: they are ready once
+    # the token no longer points at them
+    def _check_untracked(self):
+        with self._lock:
+            rows = [row for row in self._db.execute(
+                "SELECT cid, token_id FROM superseded WHERE state = ?", (WAITING,)
+            ) if row[0] not in self._tracked]
+        for cid, token_id in rows:
+            try:
+                current = cid_from_uri(query_token_uri(token_id))
+            except Exception as e:
+                print(f"Pin GC could not read token {token_id}: {e}")
+                continue
+            if current != cid:
+                with self._lock:
+                    self._db.execute("UPDATE superseded SET state = ? WHERE cid = ? AND state = ?", (READY, cid, WAITING))
+
+    def _collect_periodically(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.collect()
+            except Exception as e:
+                print("Pin GC failed:", e)
+
+    # Collect what is ready now and stop; anything still waiting is picked up after a restart
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
+        self._worker.join()
+        try:
+            self.collect()
+        finally:
+            self._db.close()
+
+
+_collector: PinCollector | None = None
+_collector_lock = threading.Lock()
+
+# Shared process-wide collector, started on first use
+def get_pin_collector() -> PinCollector:
+    global _collector
+    with _collector_lock:
+        if _collector is None:
+            _collector = PinCollector()
+        return _collector
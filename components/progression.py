@@ -0,0 +1,37 @@
+# Character progression rules, mirroring src/Character.vy exactly so the client can
+# predict a character's status without reading it back from chain.
+
+UINT256_MAX = 2**256 - 1
+MAX_LEVEL_UPS = 256
+
+
+# Raised where the contract would revert on uint256 overflow
+class ProgressionOverflow(ArithmeticError):
+    pass
+
+
+def _checked(value: int) -> int:
+    if value > UINT256_MAX:
+        raise ProgressionOverflow(value)
+    return value
+
+
+# Mirrors Character.vy::_xp_required_for_level
+def xp_required_for_level(level: int) -> int:
+    if level == 1:
+        return 0  # Level 1 requires no XP.
+    return _checked(10 * _checked(2 ** (level - 1)))
+
+
+# Mirrors Character.vy::_gain_experience; returns the new (level, experience)
+def gain_experience(level: int, experience: int, xp_gained: int) -> tuple[int, int]:
+    experience = _checked(experience + xp_gained)
+
+    for _ in range(MAX_LEVEL_UPS):
+        next_level_threshold = xp_required_for_level(_checked(level + 1))
+        if experience < next_level_threshold or next_level_threshold == 0:
+            break
+        level += 1
+        experience -= next_level_threshold
+
+    return level, experience
@@ -0,0 +1,61 @@
+from typing import NamedTuple
+from .character_state import CharacterState
+from .contract_interaction import query_characters
+
+
+# One character of the player's wallet with its metadata
+class OwnedCharacter(NamedTuple):
+    token_id: int
+    token_uri: str
+    character: CharacterState
+
+
+# The player's characters, loaded from chain on first use and then kept up to date
+# from the changes the game itself makes (mint, burn, end of an adventure)
+class Roster:
+    def __init__(self):
+        self._characters: list[OwnedCharacter] | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._characters is not None
+
+    def characters(self) -> list[OwnedCharacter]:
+        if self._characters is None:
+            self.refresh()
+        return self._characters
+
+    # Reload the full roster from chain and IPFS. A failed read keeps the last loaded
+    # roster and raises, so it is never mistaken for an empty wallet.
+    def refresh(self):
+        result = query_characters()
+        if result is None:
+            raise RuntimeError("Could not load characters from chain")
+        json_datas, token_URIs, token_IDs = result
+        self._characters = [
+            OwnedCharacter(token_id, token_URI, CharacterState.from_metadata(json_data))
+            for json_data, token_URI, token_id in zip(json_datas, token_URIs, token_IDs)
+            if json_data is not None
+        ]
+
+    # Add a freshly minted character with the token URI and metadata it was created with
+    def add(self, token_id: int, token_uri: str, metadata: dict):
+        if self._characters is None:
+            return  # picked up by the first load
+        self._characters.append(OwnedCharacter(token_id, token_uri, CharacterState.from_metadata(metadata)))
+
+    def update(self, token_id: int, token_uri: str, character: CharacterState):
+        if self._characters is None:
+            return
+        self._characters = [
+            OwnedCharacter(token_id, token_uri, character) if c.token_id == token_id else c
+            for c in self._characters
+        ]
+
+    def remove(self, token_id: int):
+        if self._characters is None:
+            return
+        self._characters = [c for c in self._characters if c.token_id != token_id]
+
+    def __len__(self) -> int:
+        return len(self.characters())
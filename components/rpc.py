@@ -0,0 +1,174 @@
+import itertools
+import requests
+from eth_abi import decode, encode
+from eth_utils import function_signature_to_4byte_selector
+from .tracing import current_span, get_tracer
+
+
+# Canonical ABI type of an input/output entry (tuples are expanded from their components)
+def _abi_type(entry: dict) -> str:
+    if entry["type"].startswith("tuple"):
+        inner = ",".join(_abi_type(c) for c in entry["components"])
+        return f"({inner}){entry['type'][len('tuple'):]}"
+    return entry["type"]
+
+
+# Encode and decode calls for one function of a JSON ABI
+class AbiFunction:
+    def __init__(self, abi: list, name: str):
+        entry = next(e for e in abi if e.get("type") == "function" and e.get("name") == name)
+        self.name = name
+        self.input_types = [_abi_type(i) for i in entry["inputs"]]
+        self.output_types = [_abi_type(o) for o in entry["outputs"]]
+        signature = f"{name}({','.join(self.input_types)})"
+        self.selector = function_signature_to_4byte_selector(signature)
+
+    def encode_call(self, *args) -> str:
+        return "0x" + (self.selector + encode(self.input_types, list(args))).hex()
+
+    def decode_result(self, data: str):
+        values = decode(self.output_types, bytes.fromhex(data.removeprefix("0x")))
+        return values[0] if len(values) == 1 else values
+
+
+class RpcError(Exception):
+    pass
+
+
+# The call itself failed on chain (e.g. a view the deployed contract does not have),
+# as opposed to the node or the transport failing
+class ContractReverted(RpcError):
+    pass
+
+
+def _rpc_error(error: dict) -> RpcError:
+    message = error.get("message") or ""
+    if error.get("code") == 3 or "revert" in message.lower():
+        return ContractReverted(message)
+    return RpcError(message)
+
+
+# Send JSON-RPC payloads over a pooled keep-alive HTTP session. A node refusing the
+# request (HTTP 4xx/5xx, e.g. batches not supported) raises RpcError like a JSON-RPC error.
+class HttpTransport:
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def __call__(self, payload):
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        span = current_span()
+        if span is not None:
+            span.count("bytes_sent", len(response.request.body or b""))
+            span.count("bytes_received", len(response.content))
+        try:
+            response.raise_for_status()
+            return response.json()
+        except requests.HTTPError as e:
+            raise RpcError(f"HTTP {response.status_code}: {response.text[:200]}") from e
+        except ValueError as e:
+            raise RpcError(f"invalid JSON-RPC response: {e}") from e
+
+
+# Answer eth_call payloads in-process against the active boa environment (pyevm / fork)
+class BoaTransport:
+    def __call__(self, payload):
+        if isinstance(payload, list):
+            return [self._handle(p) for p in payload]
+        return self._handle(payload)
+
+    def _handle(self, payload: dict) -> dict:
+        import boa
+
+        if payload["method"] != "eth_call":
+            return {"jsonrpc": "2.0", "id": payload["id"],
+                    "error": {"code": -32601, "message": f"unsupported method {payload['method']}"}}
+        call = payload["params"][0]
+        computation = boa.env.execute_code(
+            to_address=call["to"],
+            data=bytes.fromhex(call["data"].removeprefix("0x")),
+            is_modifying=False,
+        )
+        if computation.is_error:
+            return {"jsonrpc": "2.0", "id": payload["id"],
+                    "error": {"code": 3, "message": "execution reverted"}}
+        return {"jsonrpc": "2.0", "id": payload["id"], "result": "0x" + computation.output.hex()}
+
+
+# JSON-RPC client that can group many requests into a single round trip. Against a node
+# refusing batches it falls back to one request per call, and stops batching once the
+# single requests went through.
+class RpcClient:
+    def __init__(self, transport):
+        self.transport = transport
+        self.round_trips = 0
+        self.batches = True
+        self._ids = itertools.count(1)
+
+    def _payload(self, method: str, params: list) -> dict:
+        return {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params}
+
+    def request(self, method: str, params: list):
+        self.round_trips += 1
+        with get_tracer().span(f"rpc.{method}"):
+            response = self.transport(self._payload(method, params))
+        if "error" in response:
+            raise _rpc_error(response["error"])
+        return response["result"]
+
+    # Send all (method, params) pairs in one JSON-RPC batch, results in request order
+    def batch(self, calls: list[tuple[str, list]]) -> list:
+        if not calls:
+            return []
+        if self.batches:
+            try:
+                responses = self._send_batch(calls)
+            except RpcError as e:
+                print(f"Batch request failed, sending its {len(calls)} calls one by one: {e}")
+            else:
+                results = []
+                for response in responses:
+                    if "error" in response:
+                        raise _rpc_error(response["error"])
+                    results.append(response["result"])
+                return results
+        results = [self.request(method, params) for method, params in calls]
+        self.batches = False
+        return results
+
+    # One round trip for all calls; the responses in request order. Raises RpcError when
+    # the batch as a whole failed.
+    def _send_batch(self, calls: list[tuple[str, list]]) -> list[dict]:
+        payloads = [self._payload(method, params) for method, params in calls]
+        self.round_trips += 1
+        with get_tracer().span("rpc.batch") as span:
+            span.count("rpc_calls", len(payloads))
+            answer = self.transport(payloads)
+        if not isinstance(answer, list):
+            # Nodes without batch support answer with a single error object
+            error = answer.get("error") if isinstance(answer, dict) else None
+            raise RpcError(error.get("message") if isinstance(error, dict) else f"unexpected batch response: {answer!r:.200}")
+        responses = {r.get("id"): r for r in answer if isinstance(r, dict)}
+        missing = [payload["method"] for payload in payloads if payload["id"] not in responses]
+        if missing:
+            raise RpcError(f"no response for batched {missing[0]}")
+        return [responses[payload["id"]] for payload in payloads]
+
+    def eth_call(self, address: str, fn: AbiFunction, *args):
+        return fn.decode_result(self.request("eth_call", [{"to": address, "data": fn.encode_call(*args)}, "latest"]))
+
+    # Read many view calls as one batch; `calls` is a list of (AbiFunction, args)
+    def batch_eth_call(self, address: str, calls: list[tuple[AbiFunction, tuple]]) -> list:
+        raw = self.batch([
+            ("eth_call", [{"to": address, "data": fn.encode_call(*args)}, "latest"])
+            for fn, args in calls
+        ])
+        return [fn.decode_result(data) for (fn, _), data in zip(calls, raw)]
+
+
+# Pick the transport for a moccasin network: HTTP for live RPC nodes, in-process otherwise
+def rpc_for_network(network) -> RpcClient:
+    if network.url and not network.is_fork:
+        return RpcClient(HttpTransport(network.url))
+    return RpcClient(BoaTransport())
@@ -0,0 +1,215 @@
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from .character_state import CharacterState
+from .ipfs_cache import cid_from_uri, content_cid, get_cache
+from .ipfs_connection import update_ipfs_metadata
+from .pin_gc import get_pin_collector
+from .contract_interaction import gain_xp, change_character, query_level, burn_character
+from .progression import gain_experience
+from .tx_submitter import TX_WAIT_TIMEOUT
+
+# Flush pending changes after this many state-changing turns ...
+SYNC_EVERY_TURNS = 5
+# ... or after this many seconds, whichever comes first
+SYNC_INTERVAL = 30
+
+
+# Write-behind store for one character's status. Turn outcomes are applied to the
+# in-memory status right away; chain and IPFS writes are coalesced and flushed on
+# a background worker every few turns, on a timer, on death and at session exit.
+# The metadata CID is computed locally, so the token URI is set on chain while the
+# metadata is being pinned.
+class CharacterSync:
+    def __init__(self, character: CharacterState, token_uri: str, token_id: int,
+                 flush_every: int = SYNC_EVERY_TURNS, flush_interval: float | None = SYNC_INTERVAL):
+        self.character = character
+        self.token_uri = token_uri
+        self.token_id = token_id
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.burned = False         # set once the burn is confirmed on chain
+        self._burn = None           # the burn transaction, while it is not confirmed
+        self._pending_xp: list[int] = []
+        # Content CID of the metadata behind token_uri; a flush that comes to the same CID
+        # has nothing to write
+        character.mark_clean()
+        self._cid = content_cid(character.to_json())
+        self._unpinned = False      # token_uri set on chain, its document not pinned yet
+        self._replaced = []         # (uri, handle replacing it) to release once token_uri is pinned
+        self._turns_since_flush = 0
+        self._in_flight = []        # chain writes not yet confirmed
+        self._xp_in_flight = 0
+        self._lock = threading.RLock()
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="character-sync")
+        self._stopped = threading.Event()
+        # flush_interval=None leaves the timer to the caller (e.g. one shared by many sessions)
+        self._timer = None
+        if flush_interval is not None:
+            self._timer = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._timer.start()
+
+    @property
+    def alive(self) -> bool:
+        return self.character.alive
+
+    # Apply one turn's XP/HP deltas locally and schedule the write
+    def record(self, xp_gained: int, hp_change: int):
+        if xp_gained == 0 and hp_change == 0:
+            return
+        with self._lock:
+            character = self.character
+            if hp_change != 0:
+                character.hit_point += hp_change
+            if xp_gained != 0:
+                # Predicted locally with the contract's own rules, verified after the flush
+                character.level, character.experience = gain_experience(
+                    character.level, character.experience, xp_gained
+                )
+                self._pending_xp.append(xp_gained)
+            self._turns_since_flush += 1
+            due = self._turns_since_flush >= self.flush_every
+        if not self.alive:
+            self.flush().result()   # character die
+        elif due:
+            self.flush()
+
+    # Set metadata-only fields (e.g. the adventure log) for the next flush
+    def update(self, **fields):
+        with self._lock:
+            for field, value in fields.items():
+                setattr(self.character, field, value)
+
+    # Whether the character changed since the last flush (turn outcomes, the adventure log),
+    # or died and is not burned yet
+    def pending(self) -> bool:
+        with self._lock:
+            return self._pending()
+
+    def _pending(self) -> bool:
+        if not self.alive:
+            return not self.burned
+        return bool(self.character.dirty or self._pending_xp or self._unpinned)
+
+    # Schedule a flush on the background worker; its writes are traced for the current turn
+    def flush(self) -> Future:
+        return self._worker.submit(contextvars.copy_context().run, self._flush)
+
+    # Flush everything that is pending, wait for the chain writes and stop the background work
+    def close(self):
+        self._stopped.set()
+        self.flush().result()
+        self._wait_in_flight()
+        if self.pending():  # corrected after verification, or a pin to retry
+            self.flush().result()
+            self._wait_in_flight()
+        self._worker.shutdown(wait=True)
+        if not self.alive and not self.burned:
+            print(f"WARNING: token {self.token_id} died but its burn was not confirmed; it is still on chain.")
+        elif self._unpinned:
+            print(f"WARNING: token {self.token_id} points at {self.token_uri}, which could not be pinned. "
+                  f"Its metadata is only in the local IPFS cache ({get_cache().path}); pin it before it is evicted.")
+
+    def _flush_periodically(self):
+        while not self._stopped.wait(self.flush_interval):
+            if self.pending():
+                self.flush()
+
+    def _wait_in_flight(self):
+        with self._lock:
+            handles, self._in_flight = self._in_flight, []
+        for handle in handles:
+            if not handle.wait(TX_WAIT_TIMEOUT).done():
+                print(f"Gave up waiting for {handle}")
+
+    def _flush(self):
+        with self._lock:
+            if not self._pending():
+                return
+            awards, self._pending_xp = self._pending_xp, []
+            snapshot = self.character.copy()
+            self.character.mark_clean()
+            self._turns_since_flush = 0
+        try:
+            if not self.alive:
+                # A failed burn is sent again; one still unconfirmed is waited on again
+                if self._burn is None or (self._burn.done() and not self._burn.ok):
+                    self._burn = burn_character(self.token_id)
+                    for previous, _ in self._replaced:
+                        get_pin_collector().supersede(previous, self.token_id, self._burn)
+                    if not self._unpinned:
+                        get_pin_collector().supersede(self.token_uri, self.token_id, self._burn)
+                if self._burn.wait(TX_WAIT_TIMEOUT).ok:
+                    self.burned = True
+                else:
+                    print(f"Burn of token {self.token_id} not confirmed, retried on the next flush")
+                return
+
+            handles = []
+            if awards:
+                # Progression is multi-level, so the turns' awards settle as one
+                xp_handle = gain_xp(self.token_id, sum(awards))  # update xp on chain
+                with self._lock:
+                    self._xp_in_flight += 1
+                xp_handle.add_done_callback(self._on_xp_settled)
+                handles.append(xp_handle)
+
+            document = snapshot.to_json()
+            cid = content_cid(document)
+            # Unchanged CID (e.g. damage healed again before the flush): nothing to pin or set
+            if cid != self._cid:
+                # An earlier document again (e.g. damage healed over two flushes): its pin stays
+                get_pin_collector().retain(cid)
+                self._replaced = [(uri, handle) for uri, handle in self._replaced if cid_from_uri(uri) != cid]
+                # Kept locally first: until the pin succeeds, this is the only copy of what the token points at
+                get_cache().put(cid, snapshot.to_metadata())
+                # Submitted with the locally computed CID, so it confirms while the document is pinned
+                handle = change_character(self.token_id, cid)  # change character's metadata
+                if not self._unpinned:
+                    self._replaced.append((self.token_uri, handle))
+                self.token_uri, self._cid, self._unpinned = cid, cid, True
+                handles.append(handle)
+            if self._unpinned:
+                pinned = update_ipfs_metadata(snapshot.to_metadata(), document)  # update ipfs
+                if pinned is not None and pinned != cid:
+                    # The chain must point at what Pinata actually stored
+                    print(f"Pinned CID {pinned} does not match the computed {cid}, updating the token URI")
+                    get_pin_collector().retain(pinned)
+                    handle = change_character(self.token_id, pinned)
+                    self.token_uri = pinned
+                    handles.append(handle)
+                    self._replaced = [(previous, handle) for previous, _ in self._replaced]
+                if pinned is not None:
+                    # The previous pins are unpinned in the background once the new URI is confirmed on chain
+                    self._unpinned = False
+                    for previous, handle in self._replaced:
+                        get_pin_collector().supersede(previous, self.token_id, handle)
+                    self._replaced = []
+                # else: retried on the next flush; the previous pins are kept until then
+
+            with self._lock:
+                self._in_flight += handles
+        except Exception as e:
+            print("Update error:", e)
+
+    def _on_xp_settled(self, handle):
+        with self._lock:
+            self._xp_in_flight -= 1
+            settled = self._xp_in_flight == 0 and not self._pending_xp
+        if handle.ok and settled and not self._verify_level() and not self._stopped.is_set():
+            self.flush()    # re-pin with the chain's values
+
+    # Check the locally predicted level/experience against chain once no XP is in flight.
+    # If they ever disagree the chain wins; returns False when the status had to be corrected.
+    def _verify_level(self) -> bool:
+        on_chain = query_level(self.token_id)
+        if on_chain is None:
+            return True
+        with self._lock:
+            character = self.character
+            predicted = (character.level, character.experience)
+            if tuple(on_chain) == predicted or self._pending_xp or self._xp_in_flight:
+                return True
+            print(f"Level mismatch for token {self.token_id}: predicted {predicted}, chain {tuple(on_chain)}")
+            character.level, character.experience = on_chain   # marks them dirty for the next flush
+            return False
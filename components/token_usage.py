@@ -0,0 +1,59 @@
+import threading
+from typing import NamedTuple
+
+
+# Token counts of one model call; cached prompt tokens were served from the provider's
+# prompt cache (billed at a discount and faster to process)
+class TurnUsage(NamedTuple):
+    prompt_tokens: int
+    cached_tokens: int
+    output_tokens: int
+
+    @property
+    def uncached_tokens(self) -> int:
+        return self.prompt_tokens - self.cached_tokens
+
+
+# Usage of a LangChain message (None when the provider reported none)
+def turn_usage(message) -> TurnUsage | None:
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return None
+    details = usage.get("input_token_details") or {}
+    return TurnUsage(usage.get("input_tokens", 0), details.get("cache_read", 0), usage.get("output_tokens", 0))
+
+
+# Add a call's token counts to its tracing span
+def count_tokens(span, usage: TurnUsage):
+    span.count("prompt_tokens", usage.prompt_tokens)
+    span.count("cached_tokens", usage.cached_tokens)
+    span.count("output_tokens", usage.output_tokens)
+
+
+# Running totals over many turns, safe to update from several sessions at once
+class UsageTotals:
+    def __init__(self):
+        self.turns = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def add(self, usage: TurnUsage):
+        with self._lock:
+            self.turns += 1
+            self.prompt_tokens += usage.prompt_tokens
+            self.cached_tokens += usage.cached_tokens
+            self.output_tokens += usage.output_tokens
+
+    @property
+    def uncached_tokens(self) -> int:
+        return self.prompt_tokens - self.cached_tokens
+
+    @property
+    def cache_hit_rate(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def __str__(self):
+        return (f"{self.turns} turns: {self.prompt_tokens} prompt tokens ({self.cached_tokens} cached, "
+                f"{self.uncached_tokens} uncached, {self.cache_hit_rate:.0%} hit rate), {self.output_tokens} output tokens")
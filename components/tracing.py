@@ -0,0 +1,163 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from .env import load_env
+
+# The adventure session and turn the current code runs for; copied into worker threads
+# by the code that hands work over to them
+_session_id = contextvars.ContextVar("trace_session_id", default=None)
+_turn = contextvars.ContextVar("trace_turn", default=None)
+_current_span = contextvars.ContextVar("trace_current_span", default=None)
+
+
+# One timed operation (an LLM call, an RPC request, a transaction, a Pinata or gateway
+# request) with counters such as bytes, tokens and retries
+class Span:
+    def __init__(self, name: str, session_id: str | None, turn: int | None, attributes: dict):
+        self.name = name
+        self.session_id = session_id
+        self.turn = turn
+        self.attributes = attributes
+        self.counters: dict[str, int] = {}
+        self.started_at = time.time()
+        self.duration: float | None = None
+        self.error: str | None = None
+        self._start = time.perf_counter()
+
+    # Seconds since the span started
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def count(self, counter: str, value: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "session": self.session_id,
+            "turn": self.turn,
+            "start": self.started_at,
+            "duration": self.duration,
+            "error": self.error,
+            **({"attributes": self.attributes} if self.attributes else {}),
+            **({"counters": self.counters} if self.counters else {}),
+        }
+
+
+# Time and counters per stage for one session, to see which stage dominates a turn
+class TraceSummary:
+    def __init__(self):
+        self.stages: dict[str, list] = {}      # name -> [calls, total seconds, errors]
+        self.counters: dict[str, int] = {}
+
+    def add(self, span: Span):
+        stage = self.stages.setdefault(span.name, [0, 0.0, 0])
+        stage[0] += 1
+        stage[1] += span.duration
+        stage[2] += span.error is not None
+        for counter, value in span.counters.items():
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def __str__(self):
+        lines = [f"{'stage':<32} {'calls':>6} {'total':>10} {'mean':>10} {'errors':>7}"]
+        for name, (calls, total, errors) in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<32} {calls:>6} {total:>9.3f}s {total / calls * 1000:>8.1f}ms {errors:>7}")
+        if self.counters:
+            lines.append(", ".join(f"{counter}={value}" for counter, value in sorted(self.counters.items())))
+        return "\n".join(lines)
+
+
+class Tracer:
+    # path: export every span as one JSON line to this file; None: spans are only summarized per session
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path) if path else None
+        self._file = None
+        self._sessions: dict[str, TraceSummary] = {}
+        self._lock = threading.Lock()
+
+    # Start a span that ends elsewhere (e.g. in a transaction's done callback)
+    def start(self, name: str, session_id: str | None = None, turn: int | None = None, **attributes) -> Span:
+        return Span(
+            name,
+            session_id if session_id is not None else _session_id.get(),
+            turn if turn is not None else _turn.get(),
+            attributes,
+        )
+
+    def finish(self, span: Span, error: str | None = None):
+        span.duration = span.elapsed()
+        if error is not None:
+            span.error = error
+        with self._lock:
+            summary = self._sessions.get(span.session_id)
+            if summary is not None:
+                summary.add(span)
+            if self.path is not None:
+                if self._file is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    self._file = open(self.path, "a", buffering=1)
+                self._file.write(json.dumps(span.to_dict()) + "\n")
+
+    # Time the block; it can add counters to the span it is given, and so can the code
+    # it calls through current_span()
+    @contextmanager
+    def span(self, name: str, session_id: str | None = None, turn: int | None = None, **attributes):
+        span = self.start(name, session_id, turn, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = str(e)[:200]
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish(span)
+
+    # Aggregate the spans of a session until end_session
+    def begin_session(self, session_id: str):
+        with self._lock:
+            self._sessions[session_id] = TraceSummary()
+
+    # Summary of a finished session; its spans are no longer aggregated afterwards
+    def end_session(self, session_id: str) -> TraceSummary:
+        with self._lock:
+            return self._sessions.pop(session_id, TraceSummary())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# Attribute the spans started in this block to a session and turn
+@contextmanager
+def turn_context(session_id: str, turn: int | None):
+    session_token, turn_token = _session_id.set(session_id), _turn.set(turn)
+    try:
+        yield
+    finally:
+        _turn.reset(turn_token)
+        _session_id.reset(session_token)
+
+
+# The innermost span open in this context, if any
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+_tracer: Tracer | None = None
+_tracer_lock = threading.Lock()
+
+# Get the process-wide tracer, exporting to TRACE_PATH (read on first use, so .env applies)
+def get_tracer() -> Tracer:
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            load_env()
+            _tracer = Tracer(os.getenv("TRACE_PATH"))
+        return _tracer
@@ -0,0 +1,142 @@
+import json
+import re
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+
+# XP/HP deltas of one Dungeon Master turn. Bound to the model as a tool, so the deltas
+# arrive as typed tool-call arguments next to the streamed narrative. Models that reply
+# with only a tool call and no text put the narrative in the call instead.
+class TurnOutcome(BaseModel):
+    """Record the outcome of this turn for the player's character."""
+
+    xp_gained: int = Field(default=0, json_schema_extra={"minimum": 0},
+                           description="Experience points the player gained this turn, 0 if none")
+    hp_change: int = Field(default=0, description="Change in the player's HP this turn, negative for damage, 0 if none")
+    narrative: str = Field(default="", description="This turn's narrative, only if it was not written as the reply text")
+
+    # A negative XP value is clamped rather than failing the whole outcome, so the turn's
+    # HP change still applies
+    @field_validator("xp_gained")
+    @classmethod
+    def _clamp_xp(cls, value: int) -> int:
+        return max(value, 0)
+
+
+NO_CHANGE = TurnOutcome()
+
+# Fallback for blocks that are not valid JSON (single quotes, trailing commas, ...)
+_FIELD_PATTERN = re.compile(r'["\']?(xp_gained|hp_change)["\']?\s*:\s*["\']?([+-]?\d+)')
+
+
+# Beginnings of the XP/HP JSON block the Dungeon Master appends to each response,
+# compared with whitespace removed
+STATE_BLOCK_PREFIXES = ('{"xp_gained"', '{"hp_change"', "{'xp_gained'", "{'hp_change'")
+
+
+def _compact(text: str) -> str:
+    return "".join(text.split())
+
+
+# Splits a streamed Dungeon Master response into narrative, which can be shown as it
+# arrives, and the trailing { "xp_gained": ..., "hp_change": ... } block, which is
+# withheld. Text from a "{" is held back only until it is clear whether it starts a
+# state block; trailing whitespace is held until more narrative follows it.
+class NarrativeFilter:
+    def __init__(self):
+        self.text = ""              # full raw response
+        self.state_blocks: list[str] = []
+        self._held = ""
+        self._started = False
+
+    # Add a streamed chunk; returns the narrative that is now safe to display
+    def feed(self, chunk: str) -> str:
+        self.text += chunk
+        self._held += chunk
+        out = []
+        while self._held:
+            brace = self._held.find("{")
+            if brace == -1:
+                out.append(self._held)
+                self._held = ""
+                break
+            out.append(self._held[:brace])
+            self._held = self._held[brace:]
+            state = self._classify(self._held)
+            if state == "undecided":
+                break
+            if state == "narrative":
+                out.append("{")
+                self._held = self._held[1:]
+                continue
+            # A complete state block: drop it and keep scanning what follows
+            end = self._held.index("}") + 1
+            self.state_blocks.append(self._held[:end])
+            self._held = self._held[end:]
+        return self._emit("".join(out))
+
+    # End of stream: returns any narrative still held back
+    def finish(self) -> str:
+        held, self._held = self._held, ""
+        if "{" in held and self._classify(held[held.find("{"):]) != "narrative":
+            self.state_blocks.append(held[held.find("{"):])   # unterminated state block
+            held = held[:held.find("{")]
+        return self._emit(held).rstrip() if not held.isspace() else ""
+
+    # The narrative with all state blocks removed, as a single string
+    def narrative(self) -> str:
+        text = self.text
+        for block in self.state_blocks:
+            text = text.replace(block, "", 1)
+        return text.strip()
+
+    def _classify(self, candidate: str) -> str:
+        compact = _compact(candidate)
+        for prefix in STATE_BLOCK_PREFIXES:
+            if len(compact) < len(prefix) and prefix.startswith(compact):
+                return "undecided"
+            if compact.startswith(prefix):
+                return "state" if "}" in candidate else "undecided"
+        return "narrative"
+
+    # Hold trailing whitespace (it may precede the state block) and drop leading whitespace
+    def _emit(self, text: str) -> str:
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+        stripped = text.rstrip()
+        self._held = text[len(stripped):] + self._held
+        return stripped
+
+
+# Deltas from a state block the model wrote into its text instead of calling the tool
+def parse_state_block(block: str) -> TurnOutcome | None:
+    try:
+        data = json.loads(block)
+    except ValueError:
+        data = {key: value for key, value in _FIELD_PATTERN.findall(block)}
+        if not data:
+            return None
+    try:
+        return TurnOutcome.model_validate(data)
+    except ValidationError as e:
+        print("Invalid turn outcome:", block, e.errors(include_url=False))
+        return None
+
+
+# The turn's deltas: the TurnOutcome tool call if the model made one, otherwise the
+# last state block withheld from the narrative, otherwise no change
+def turn_outcome(tool_calls: list[dict], narrative: NarrativeFilter) -> TurnOutcome:
+    for call in reversed(tool_calls):
+        if call["name"] == TurnOutcome.__name__:
+            try:
+                return TurnOutcome.model_validate(call["args"])
+            except ValidationError as e:
+                print("Invalid turn outcome:", call["args"], e.errors(include_url=False))
+                return NO_CHANGE
+    for block in reversed(narrative.state_blocks):
+        outcome = parse_state_block(block)
+        if outcome is not None:
+            return outcome
+    return NO_CHANGE
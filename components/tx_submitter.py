@@ -0,0 +1,301 @@
+import threading
+import time
+from collections import OrderedDict
+from .rpc import AbiFunction, RpcClient, RpcError
+from .tracing import get_tracer
+
+# Used when eth_estimateGas fails, e.g. for a call that depends on an earlier
+# transaction that is still in flight
+DEFAULT_GAS_LIMIT = 3_000_000
+GAS_LIMIT_MARGIN = 1.25
+RECEIPT_POLL_INTERVAL = 0.5
+# A transaction without a receipt this many seconds after (re)broadcasting is sent again,
+# up to TX_REBROADCASTS times; after that it is considered dropped and fails
+TX_TIMEOUT = 60
+TX_REBROADCASTS = 2
+# Longest callers block on a handle: enough for every rebroadcast to run out
+TX_WAIT_TIMEOUT = TX_TIMEOUT * (TX_REBROADCASTS + 1) + 30
+# How many finished transactions stay queryable by hash
+RECENT_TRANSACTIONS = 1000
+
+PENDING = "pending"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+
+
+# A submitted contract transaction and its outcome
+class TxHandle:
+    def __init__(self, fn_name: str, args: tuple):
+        self.fn_name = fn_name
+        self.args = args
+        self.tx_hash: str | None = None
+        self.status = PENDING
+        self.receipt: dict | None = None
+        self.result = None          # return value, when known
+        self.error: str | None = None
+        self._done = threading.Event()
+        self._finished = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+        # From submission until the receipt is known
+        self._span = get_tracer().start(f"tx.{fn_name}")
+
+    @property
+    def ok(self) -> bool:
+        return self.status == CONFIRMED
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    # Block until the receipt is known and callbacks have run (or `timeout` seconds pass)
+    def wait(self, timeout: float | None = None) -> "TxHandle":
+        self._done.wait(timeout)
+        return self
+
+    # Call `callback(handle)` once the transaction is confirmed or failed
+    def add_done_callback(self, callback):
+        with self._lock:
+            if not self._finished:
+                self._callbacks.append(callback)
+                return
+        self._run_callback(callback)
+
+    def _run_callback(self, callback):
+        try:
+            callback(self)
+        except Exception as e:
+            print(f"Transaction callback failed: {e}\n")
+
+    def _finish(self, status: str, receipt: dict | None = None, error: str | None = None):
+        with self._lock:
+            self.status, self.receipt, self.error = status, receipt, error
+            self._finished = True
+            callbacks, self._callbacks = self._callbacks, []
+        get_tracer().finish(self._span, error if status == FAILED else None)
+        if status == FAILED:
+            print(f"Transaction {self.fn_name}{self.args} failed: {error}\n")
+        for callback in callbacks:
+            self._run_callback(callback)
+        self._done.set()
+
+    def __repr__(self):
+        return f"TxHandle({self.fn_name}, {self.status}, {self.tx_hash})"
+
+
+# Signs and sends contract transactions from one account without waiting for their
+# receipts. Nonces are assigned locally so several transactions can be in flight at
+# once; a background thread polls their receipts in batches. A transaction the node
+# drops is rebroadcast, then failed, so no handle stays pending forever.
+class TransactionSubmitter:
+    def __init__(self, rpc: RpcClient, account, contract_address: str, abi: list,
+                 poll_interval: float = RECEIPT_POLL_INTERVAL, tx_timeout: float = TX_TIMEOUT):
+        self.rpc = rpc
+        self.account = account
+        self.contract_address = contract_address
+        self.abi = abi
+        self.poll_interval = poll_interval
+        self.tx_timeout = tx_timeout
+        self._functions: dict[str, AbiFunction] = {}
+        self._nonce_lock = threading.Lock()
+        self._in_flight: dict[str, TxHandle] = {}
+        self._broadcasts: dict[str, list] = {}     # tx hash -> [raw transaction, deadline, rebroadcasts]
+        self._recent: OrderedDict[str, TxHandle] = OrderedDict()
+        self._in_flight_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self.chain_id = int(self.rpc.request("eth_chainId", []), 16)
+        self._next_nonce = self._chain_nonce()
+        self._poller = threading.Thread(target=self._poll_receipts, daemon=True, name="tx-receipts")
+        self._poller.start()
+
+    def _chain_nonce(self) -> int:
+        return int(self.rpc.request("eth_getTransactionCount", [self.account.address, "pending"]), 16)
+
+    def _function(self, fn_name: str) -> AbiFunction:
+        if fn_name not in self._functions:
+            self._functions[fn_name] = AbiFunction(self.abi, fn_name)
+        return self._functions[fn_name]
+
+    # Sign and broadcast `fn_name(*args)`; returns as soon as the node accepted the transaction
+    def submit(self, fn_name: str, *args) -> TxHandle:
+        handle = TxHandle(fn_name, args)
+        data = self._function(fn_name).encode_call(*args)
+        call = {"from": self.account.address, "to": self.contract_address, "data": data}
+        try:
+            gas_price, gas = self._fees(call)
+            with self._nonce_lock:
+                signed = self.account.sign_transaction({
+                    **call,
+                    "nonce": self._next_nonce,
+                    "gas": gas,
+                    "gasPrice": gas_price,
+                    "value": 0,
+                    "chainId": self.chain_id,
+                })
+                raw = getattr(signed, "raw_transaction", None) or signed.rawTransaction
+                raw = "0x" + raw.hex().removeprefix("0x")
+                handle.tx_hash = self.rpc.request("eth_sendRawTransaction", [raw])
+                self._next_nonce += 1
+        except Exception as e:
+            # The nonce was not consumed (or is out of sync); re-read it from the node
+            with self._nonce_lock:
+                self._next_nonce = self._chain_nonce()
+            handle._finish(FAILED, error=str(e))
+            return handle
+
+        with self._in_flight_lock:
+            self._in_flight[handle.tx_hash] = handle
+            self._broadcasts[handle.tx_hash] = [raw, time.monotonic() + self.tx_timeout, 0]
+            self._recent[handle.tx_hash] = handle
+            while len(self._recent) > RECENT_TRANSACTIONS:
+                self._recent.popitem(last=False)
+        self._wake.set()
+        return handle
+
+    # Gas price and gas limit, fetched together in one round trip
+    def _fees(self, call: dict) -> tuple[int, int]:
+        try:
+            gas_price, gas = self.rpc.batch([("eth_gasPrice", []), ("eth_estimateGas", [call])])
+            return int(gas_price, 16), int(int(gas, 16) * GAS_LIMIT_MARGIN)
+        except RpcError:
+            return int(self.rpc.request("eth_gasPrice", []), 16), DEFAULT_GAS_LIMIT
+
+    # Handles of transactions still waiting for a receipt
+    def in_flight(self) -> list[TxHandle]:
+        with self._in_flight_lock:
+            return list(self._in_flight.values())
+
+    # Status of a recent transaction by hash (None if unknown)
+    def status(self, tx_hash: str) -> str | None:
+        with self._in_flight_lock:
+            handle = self._recent.get(tx_hash)
+        return handle.status if handle else None
+
+    # Block until every transaction submitted so far has a receipt
+    def wait_all(self, timeout: float | None = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for handle in self.in_flight():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not handle.wait(remaining).done():
+                return False
+        return True
+
+    # Stop polling; transactions still without a receipt fail (they may yet be mined)
+    def close(self, timeout: float = 0):
+        self.wait_all(timeout)
+        self._stopped.set()
+        self._wake.set()
+        self._poller.join()
+        for handle in self.in_flight():
+            self._drop(handle, "submitter closed before the receipt arrived")
+
+    def _poll_receipts(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            handles = self.in_flight()
+            if not handles:
+                continue
+            try:
+                receipts = self.rpc.batch([
+                    ("eth_getTransactionReceipt", [handle.tx_hash]) for handle in handles
+                ])
+            except Exception as e:
+                print(f"Receipt polling failed, polling one transaction at a time: {e}\n")
+                receipts = [self._receipt(handle) for handle in handles]
+            # Deadlines run even while the node can't be polled, so no handle waits forever
+            now = time.monotonic()
+            for handle, receipt in zip(handles, receipts):
+                if receipt is None:
+                    self._check_deadline(handle, now)
+                    continue
+                with self._in_flight_lock:
+                    self._in_flight.pop(handle.tx_hash, None)
+                    self._broadcasts.pop(handle.tx_hash, None)
+                if int(receipt["status"], 16) == 1:
+                    handle._finish(CONFIRMED, receipt)
+                else:
+                    handle._finish(FAILED, receipt, error="reverted")
+
+    # Receipt of one transaction, None if it is not mined yet or can't be read
+    def _receipt(self, handle: TxHandle) -> dict | None:
+        try:
+            return self.rpc.request("eth_getTransactionReceipt", [handle.tx_hash])
+        except Exception:
+            return None
+
+    # Rebroadcast a transaction still without a receipt past its deadline (the node may
+    # have dropped it from its pool), or fail it once it was sent TX_REBROADCASTS times
+    def _check_deadline(self, handle: TxHandle, now: float):
+        with self._in_flight_lock:
+            broadcast = self._broadcasts.get(handle.tx_hash)
+            if broadcast is None or now < broadcast[1]:
+                return
+            raw, _, rebroadcasts = broadcast
+        if rebroadcasts >= TX_REBROADCASTS:
+            self._drop(handle, f"no receipt after {rebroadcasts + 1} broadcasts, dropped by the node")
+            return
+        try:
+            self.rpc.request("eth_sendRawTransaction", [raw])
+        except Exception as e:
+            if "nonce too low" in str(e):
+                # Its nonce was used by another transaction: this one can no longer be mined
+                self._drop(handle, str(e))
+                return
+            # e.g. "already known": still in the node's pool
+        with self._in_flight_lock:
+            broadcast[1:] = [now + self.tx_timeout, rebroadcasts + 1]
+
+    # Fail a transaction that will not get a receipt, and re-read the nonce so the ones
+    # sent after it do not wait behind a gap
+    def _drop(self, handle: TxHandle, error: str):
+        with self._in_flight_lock:
+            if self._in_flight.pop(handle.tx_hash, None) is None:
+                return
+            self._broadcasts.pop(handle.tx_hash, None)
+        try:
+            with self._nonce_lock:
+                self._next_nonce = self._chain_nonce()
+        except Exception as e:
+            print(f"Could not re-read the nonce: {e}\n")
+        handle._finish(FAILED, error=error)
+
+
+# Pick the submitter for a moccasin network: pipelined raw transactions for live RPC
+# nodes, direct execution for in-process networks
+def submitter_for_network(network, rpc: RpcClient, account, contract, abi: list):
+    if network.url and not network.is_fork:
+        return TransactionSubmitter(rpc, account, contract.address, abi)
+    return InlineSubmitter(contract)
+
+
+# Same interface for in-process networks (pyevm, forks): runs each call through the
+# boa contract right away and returns an already finished handle
+class InlineSubmitter:
+    def __init__(self, contract):
+        self.contract = contract
+        self._lock = threading.Lock()   # the in-process EVM is not thread-safe
+
+    def submit(self, fn_name: str, *args) -> TxHandle:
+        handle = TxHandle(fn_name, args)
+        try:
+            with self._lock:
+                handle.result = getattr(self.contract, fn_name)(*args)
+            handle._finish(CONFIRMED)
+        except Exception as e:
+            handle._finish(FAILED, error=str(e))
+        return handle
+
+    def in_flight(self) -> list[TxHandle]:
+        return []
+
+    def status(self, tx_hash: str) -> str | None:
+        return None
+
+    def wait_all(self, timeout: float | None = None) -> bool:
+        return True
+
+    def close(self, timeout: float = 0):
+        pass
@@ -1,107 +1,165 @@
-from components.create_character import generate_character
-from components.contract_interaction import mint_character,query_characters,burn_character
-from components.create_story import start_conversation
-from components.ipfs_connection import upload_ipfs
+from components.character_state import CharacterState
+from components.contract_interaction import burn_character
+from components.roster import Roster
+from components.pin_gc import get_pin_collector
+from components.tx_submitter import TX_WAIT_TIMEOUT
 
 
 
 
-def character_select_info(character:dict):
+def character_select_info(character: CharacterState):
     print("Load character...")
-    print("Name       :", character.get("name"))
-    print("Description:", character.get("description"))
-    print("Level:", character.get("attributes")[0].get("value"))
-    
+    print("Name       :", character.name)
+    print("Description:", character.description)
+    print("Level:", character.level)
+
+def character_list(roster: Roster):
+    for index, owned in enumerate(roster.characters()):
+        character = owned.character
+        print(f"{index + 1}: {character.name or 'Unknown'} - Experience: {character.experience} - Level: {character.level}")
+
+# Generate, pin and mint a new character, then add it to the roster
+def create_character(roster: Roster):
+    # The OpenAI stack is only imported once a character is created, keeping startup fast
+    from components.create_character import ask_character, mint_new_character
+
+    created = mint_new_character(ask_character())
+    if created is not None:
+        roster.add(created.token_id, created.token_uri, created.metadata)
+
+# Create many characters at once (e.g. an NPC roster) sharing one description
+def create_character_batch(roster: Roster):
+    from components.create_character import CharacterRequest, mint_new_characters
+
+    name = input("Base name for the characters: ").strip()
+    description = input("Background description shared by the characters: ")
+    count = int(input("How many characters: ").strip())
+    created = mint_new_characters([CharacterRequest(f"{name} {i + 1}", description) for i in range(count)])
+    for character in created:
+        if character is not None:
+            roster.add(character.token_id, character.token_uri, character.metadata)
+    print(f"Created {sum(character is not None for character in created)} of {count} characters.")
+
+# Play an adventure and apply its outcome to the roster
+def play(roster: Roster, owned):
+    # The LangChain stack is only imported once an adventure starts
+    from components.create_story import start_conversation
+
+    character_select_info(owned.character)
+    character, tokenURI = start_conversation(owned.character, owned.token_uri, owned.token_id)
+    if not character.alive:
+        roster.remove(owned.token_id)
+    else:
+        roster.update(owned.token_id, tokenURI, character)
+
 def main():
     print("\n🔥 Welcome to RPG agent game 🔥")
+    # Loaded on first use, then updated in place after mint, burn and adventures
+    roster = Roster()
     while True:
         print("\n=== Main Menu ===")
         print("1. Create character")
         print("2. Start game")
         print("3. Query character")
         print("4. Burn")
+        print("5. Refresh characters")
+        print("6. Create characters in batch")
         print("0. Exit")
-        
+
         choice = input("Select an option: ").strip()
-        
-        json_datas,token_URIs,token_IDs = query_characters()
+
         if choice == "1":
             # Start a new game: generate a character, upload metadata, mint NFT, then start conversation.
             try:
-                
-                character = generate_character()
-                tokenURI = upload_ipfs(character)
-                mint_character(character, tokenURI)
-                
+                create_character(roster)
+
             except Exception as e:
                 print("Error Creating character:", e)
-                
+
         elif choice == "2":
             # Query character: ask for token ID and display character info.
             try:
-                if len(json_datas)==0:
-                    character = generate_character()
-                    tokenURI = upload_ipfs(character)
-                    mint_character(character, tokenURI)
-                elif len(json_datas)==1:
-                    character_select_info(json_datas[0])
-                    start_conversation(json_datas[0],token_URIs[0],token_IDs[0])
+                characters = roster.characters()
+                if len(characters)==0:
+                    create_character(roster)
+                elif len(characters)==1:
+                    play(roster, characters[0])
                 else:
-                    for index, data in enumerate(json_datas):
-                        print(f"{index + 1}: {data.get('name', 'Unknown')} - Experience: {data.get("attributes")[1].get("value")} - Level: {data.get("attributes")[0].get("value")}")
+                    character_list(roster)
                     try:
                         choice_index = int(input("Select a character by number: ")) - 1
-                        if 0 <= choice_index < len(json_datas):
-                            character_select_info(json_datas[choice_index])
-                            start_conversation(json_datas[choice_index],token_URIs[choice_index],token_IDs[choice_index])
+                        if 0 <= choice_index < len(characters):
+                            play(roster, characters[choice_index])
                         else:
                             print("Invalid selection. Returning to main menu.")
                     except ValueError:
                         print("Invalid input. Returning to main menu.")
-                    
 
-                
+
+
             except Exception as e:
                 print("Error starting game:", e)
-                
+
         elif choice == "3":
             # Query character: ask for token ID and display character info.
             try:
-                if len(json_datas) == 0:
+                if len(roster) == 0:
                     print("No characters found. Please create a character first.")
                 else:
-                    for json_data in json_datas:
+                    for owned in roster.characters():
+                        character = owned.character
                         print("===================================")
-                        print(f"Name        : {json_data.get('name', 'N/A')}")
-                        print(f"Description : {json_data.get('description', 'N/A')}")
-                        print(f"Image URL   : {json_data.get('image', 'N/A')}")
+                        print(f"Name        : {character.name or 'N/A'}")
+                        print(f"Description : {character.description or 'N/A'}")
+                        print(f"Image URL   : {character.image or 'N/A'}")
                         print("\nAttributes:")
-                        for attr in json_data.get("attributes", []):
-                            print(f"  {attr.get('trait_type', 'N/A')}: {attr.get('value', 'N/A')}")
+                        for trait_type, value in character.traits():
+                            print(f"  {trait_type or 'N/A'}: {value if value is not None else 'N/A'}")
             except Exception as e:
                 print("Error querying character:", e)
-                
+
         elif choice == "4":
             # Burn character: ask for token ID and burn the character NFT.
             try:
-                for index, data in enumerate(json_datas):
-                        print(f"{index + 1}: {data.get('name', 'Unknown')} - Experience: {data.get("attributes")[1].get("value")} - Level: {data.get("attributes")[0].get("value")}")
-                burn_index = int(input("Enter number to burn character: ").strip())
-                
-                burn_character(token_IDs[burn_index])
-                print("Character burned successsfully.")
+                characters = roster.characters()
+                character_list(roster)
+                burn_index = int(input("Enter number to burn character: ").strip()) - 1
+                if not 0 <= burn_index < len(characters):
+                    print("Invalid selection. Returning to main menu.")
+                    continue
+
+                burned = characters[burn_index]
+                handle = burn_character(burned.token_id)
+                # Its metadata pin is released in the background once the burn is confirmed
+                get_pin_collector().supersede(burned.token_uri, burned.token_id, handle)
+                if handle.wait(TX_WAIT_TIMEOUT).ok:
+                    roster.remove(burned.token_id)
+                    print("Character burned successsfully.")
             except Exception as e:
                 print("Error burning character:", e)
-                
+
+        elif choice == "5":
+            try:
+                roster.refresh()
+                print(f"Loaded {len(roster)} characters.")
+            except Exception as e:
+                print("Error refreshing characters:", e)
+
+        elif choice == "6":
+            try:
+                create_character_batch(roster)
+            except Exception as e:
+                print("Error creating characters:", e)
+
         elif choice == "0":
             print("Exiting game. Goodbye!")
             break
         else:
             print("Invalid option. Please try again.")
-    
 
-   
-    
+
+
+
 # Moccasin entry point
 def moccasin_main():
     return main()
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import secrets
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from components.character_state import CharacterState
+from components.create_story import get_engine
+from components.contract_interaction import query_owner, query_token_uri
+from components.ipfs_connection import get_ipfs_json
+
+SERVER_HOST = os.getenv("GAME_SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("GAME_SERVER_PORT", "8765"))
+# Adventures running at once; further players wait for a free slot
+MAX_SESSIONS = int(os.getenv("GAME_SERVER_MAX_SESSIONS", "500"))
+
+
+async def prompt(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, text: str) -> str | None:
+    writer.write(text.encode())
+    await writer.drain()
+    line = await reader.readline()
+    if not line:
+        return None     # player disconnected
+    return line.decode(errors="replace").strip()
+
+
+async def send(writer: asyncio.StreamWriter, text: str):
+    writer.write(text.encode())
+    await writer.drain()
+
+
+# Load a character's metadata from its token URI
+async def load_character(token_id: int) -> tuple[CharacterState | None, str]:
+    token_uri = await asyncio.to_thread(query_token_uri, token_id)
+    metadata = await asyncio.to_thread(get_ipfs_json, token_uri)
+    return None if metadata is None else CharacterState.from_metadata(metadata), token_uri
+
+
+# One-time message the player signs to prove they own the character
+def ownership_challenge(token_id: int) -> str:
+    return f"Play character {token_id} on the RPG agent server ({secrets.token_hex(16)})"
+
+
+# Whether `signature` over `challenge` was made by `owner`'s key
+def signed_by(challenge: str, signature: str, owner: str) -> bool:
+    try:
+        signer = Account.recover_message(encode_defunct(text=challenge), signature=signature)
+    except Exception:
+        return False
+    return signer.lower() == owner.lower()
+
+
+# Ask the player to sign a challenge with the wallet owning the character; only its
+# owner may play it, since a session rewrites the character's token
+async def verify_owner(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, token_id: int) -> bool:
+    owner = await asyncio.to_thread(query_owner, token_id)
+    challenge = ownership_challenge(token_id)
+    signature = await prompt(reader, writer, f"Sign this message with the wallet owning the character:\n"
+                                             f"{challenge}\nSignature: ")
+    return signature is not None and signed_by(challenge, signature, owner)
+
+
+# One player connection: pick a character, then play turns until exit, death or disconnect
+async def play(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    engine = get_engine()
+    answer = await prompt(reader, writer, "Character token ID: ")
+    if answer is None:
+        return
+    try:
+        token_id = int(answer)
+        if not await verify_owner(reader, writer, token_id):
+            raise ValueError("signature does not match the character's owner")
+        character, token_uri = await load_character(token_id)
+        if character is None:
+            raise ValueError("character metadata not found")
+        session = engine.open_session(character, token_uri, token_id)
+    except Exception as e:
+        await send(writer, f"Could not load character: {e}\n")
+        return
+
+    await send(writer, f"\n🔥 {character.name or 'Unknown'} arrives at the mysterious dungeon entrance 🔥\n"
+                       "(Type 'exit' or 'quit' to leave and save the conversation。)\n\n")
+    try:
+        while session.alive:
+            user_input = await prompt(reader, writer, "Player: ")
+            if user_input is None:
+                break
+            if user_input.lower() in {"exit", "quit"}:
+                await send(writer, "You have chosen to leave the dungeon... Game over.\n")
+                await asyncio.to_thread(session.save_adventure_summary)
+                break
+            await send(writer, "Dungeon Master: ")
+            async for chunk in engine.astream_turn(session.session_id, user_input):
+                await send(writer, chunk)
+            await send(writer, "\n")
+        if not session.alive:
+            await send(writer, "Your character has perished. Game Over.\n")
+    finally:
+        # Pending chain and IPFS writes are flushed off the event loop
+        await asyncio.to_thread(engine.close_session, session.session_id)
+
+
+async def main():
+    slots = asyncio.Semaphore(MAX_SESSIONS)
+
+    async def handle_player(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async with slots:
+            try:
+                await play(reader, writer)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            except Exception as e:
+                print("Session error:", e)
+            finally:
+                writer.close()
+
+    server = await asyncio.start_server(handle_player, SERVER_HOST, SERVER_PORT)
+    print(f"RPG agent server listening on {SERVER_HOST}:{SERVER_PORT}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await asyncio.to_thread(get_engine().shutdown)
+
+
+# Moccasin entry point
+def moccasin_main():
+    return asyncio.run(main())
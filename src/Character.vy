@@ -23,9 +23,30 @@ struct CharacterStatus:
     level: uint256         # Character level
     experience: uint256    # Experience points
 
+# Emitted whenever a character's level or experience is set, including at mint
+# and when it is killed (reset to zero).
+event StatusChanged:
+    token_id: indexed(uint256)
+    level: uint256
+    experience: uint256
+
+# Emitted whenever a character's metadata URI is set, with the full token URI.
+event CharacterChanged:
+    token_id: indexed(uint256)
+    token_uri: String[512]
+
 # Mapping: token_id => CharacterStatus
 character_status: public(HashMap[uint256, CharacterStatus])
 
+# Maximum number of characters returned by one bulk view call.
+MAX_PAGE_SIZE: constant(uint256) = 50
+
+# Maximum number of XP awards settled by one gain_experience_batch call.
+MAX_BATCH_SIZE: constant(uint256) = 100
+
+# Upper bound on level-ups from a single XP award.
+MAX_LEVEL_UPS: constant(uint256) = 256
+
 # NFT counter
 counter: public(uint256)
 agent_admin: address
@@ -44,7 +65,10 @@ def __init__(base_uri: String[80]):
 def create_character(
     owner: address,
     metadata_uri: String[128],
-):
+) -> uint256:
+    """
+    Mint a new character to `owner` and return its token ID.
+    """
     token_id: uint256 = self.counter
 
     # Mint the NFT and set the Metadata URI.
@@ -56,13 +80,17 @@ def create_character(
         level=1,
         experience=0,
     )
+    log CharacterChanged(token_id, self._token_uri(token_id))
+    log StatusChanged(token_id, 1, 0)
     self.counter += 1
+    return token_id
 
 
 @external
 def change_character(token_id:uint256 ,metadata_uri: String[128]):
     assert msg.sender == self.agent_admin, "Only admin can change character"
     erc721._set_token_uri(token_id, metadata_uri)
+    log CharacterChanged(token_id, self._token_uri(token_id))
 
 
 @external
@@ -81,6 +109,7 @@ def update_status(
     status.experience = new_experience
 
     self.character_status[token_id] = status
+    log StatusChanged(token_id, new_level, new_experience)
 
 @internal
 @pure
@@ -94,23 +123,46 @@ def _xp_required_for_level(level: uint256) -> uint256:
         return 0  # Level 1 requires no XP.
     return 10 * (2 ** (level - 1))
 
-@external
-def gain_experience(token_id: uint256, xp_gained: uint256):
-    """
-    Allow the character to gain XP: accumulate XP and, if sufficient, automatically level up.
-    Only admin can call this.
-    """
-    assert msg.sender == self.agent_admin, "Only admin can modify XP"
-    
+@internal
+def _gain_experience(token_id: uint256, xp_gained: uint256):
     status: CharacterStatus = self.character_status[token_id]
     status.experience += xp_gained
 
-    next_level_threshold: uint256 = self._xp_required_for_level(status.level + 1)
-    if status.experience >= next_level_threshold and next_level_threshold > 0:
+    # Level up as many times as the accumulated XP allows. Thresholds double
+    # every level, so a uint256 of XP never needs more than MAX_LEVEL_UPS steps.
+    for i: uint256 in range(MAX_LEVEL_UPS):
+        next_level_threshold: uint256 = self._xp_required_for_level(status.level + 1)
+        if status.experience < next_level_threshold or next_level_threshold == 0:
+            break
         status.level += 1
         status.experience -= next_level_threshold
 
     self.character_status[token_id] = status
+    log StatusChanged(token_id, status.level, status.experience)
+
+@external
+def gain_experience(token_id: uint256, xp_gained: uint256):
+    """
+    Allow the character to gain XP: accumulate XP and, if sufficient, automatically level up
+    (possibly several levels at once).
+    Only admin can call this.
+    """
+    assert msg.sender == self.agent_admin, "Only admin can modify XP"
+    self._gain_experience(token_id, xp_gained)
+
+@external
+def gain_experience_batch(
+    token_ids: DynArray[uint256, MAX_BATCH_SIZE],
+    xp_gained: DynArray[uint256, MAX_BATCH_SIZE],
+):
+    """
+    Award XP to several characters in one transaction: token_ids[i] gains xp_gained[i].
+    A token may appear more than once. Only admin can call this.
+    """
+    assert msg.sender == self.agent_admin, "Only admin can modify XP"
+    assert len(token_ids) == len(xp_gained), "Length mismatch"
+    for i: uint256 in range(len(token_ids), bound=MAX_BATCH_SIZE):
+        self._gain_experience(token_ids[i], xp_gained[i])
 
 @external
 @view
@@ -120,6 +172,54 @@ def query_character(token_id: uint256) -> CharacterStatus:
     """
     return self.character_status[token_id]
 
+@internal
+@view
+def _token_uri(token_id: uint256) -> String[512]:
+    """
+    Same result as `tokenURI` for a minted token with a metadata URI set.
+    """
+    return concat(erc721._BASE_URI, erc721._token_uris[token_id])
+
+@external
+@view
+def query_roster(owner: address, offset: uint256, limit: uint256) -> (
+    DynArray[uint256, MAX_PAGE_SIZE],
+    DynArray[String[512], MAX_PAGE_SIZE],
+    DynArray[CharacterStatus, MAX_PAGE_SIZE],
+):
+    """
+    Return one page of the characters owned by `owner`: their token IDs,
+    token URIs and status, starting at owner index `offset` and holding at
+    most `limit` entries (capped at MAX_PAGE_SIZE).
+    """
+    token_ids: DynArray[uint256, MAX_PAGE_SIZE] = []
+    token_uris: DynArray[String[512], MAX_PAGE_SIZE] = []
+    statuses: DynArray[CharacterStatus, MAX_PAGE_SIZE] = []
+
+    balance: uint256 = erc721._balances[owner]
+    if offset >= balance:
+        return token_ids, token_uris, statuses
+
+    for i: uint256 in range(MAX_PAGE_SIZE):
+        if i >= limit or offset + i >= balance:
+            break
+        token_id: uint256 = erc721._owned_tokens[owner][offset + i]
+        token_ids.append(token_id)
+        token_uris.append(self._token_uri(token_id))
+        statuses.append(self.character_status[token_id])
+    return token_ids, token_uris, statuses
+
+@external
+@view
+def query_statuses(token_ids: DynArray[uint256, MAX_PAGE_SIZE]) -> DynArray[CharacterStatus, MAX_PAGE_SIZE]:
+    """
+    Query the status of several characters in one call, in the order given.
+    """
+    statuses: DynArray[CharacterStatus, MAX_PAGE_SIZE] = []
+    for token_id: uint256 in token_ids:
+        statuses.append(self.character_status[token_id])
+    return statuses
+
 @external
 def kill_character(token_id: uint256):
     """
@@ -128,3 +228,4 @@ def kill_character(token_id: uint256):
     assert msg.sender == self.agent_admin, "Only the owner can burn"
     erc721._burn(token_id)
     self.character_status[token_id] = empty(CharacterStatus)
+    log StatusChanged(token_id, 0, 0)
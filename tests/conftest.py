@@ -5,6 +5,25 @@ from moccasin.boa_tools import VyperContract
 from moccasin.config import get_config
 from moccasin.moccasin_account import MoccasinAccount
 
+@pytest.fixture(autouse=True)
+def local_state(tmp_path, monkeypatch):
+    """
+    Keeps the IPFS metadata cache, the pin GC queue and the character index of each
+    test in its tmp_path instead of the repository's .cache.
+    """
+    from components import ipfs_cache, pin_gc
+
+    monkeypatch.setenv("IPFS_CACHE_PATH", str(tmp_path / "ipfs_metadata.sqlite"))
+    monkeypatch.setenv("PIN_GC_PATH", str(tmp_path / "pin_gc.sqlite"))
+    monkeypatch.setenv("CHARACTER_INDEX_PATH", str(tmp_path / "character_index.sqlite"))
+    monkeypatch.setattr(ipfs_cache, "_cache", None)
+    monkeypatch.setattr(pin_gc, "_collector", None)
+    yield
+    if ipfs_cache._cache is not None:
+        ipfs_cache._cache.close()
+    if pin_gc._collector is not None:
+        pin_gc._collector.close()
+
 @pytest.fixture
 def character_contract() -> VyperContract:
     """
@@ -19,3 +38,61 @@ def default_account() -> MoccasinAccount:
     Retrieves the default account from the test network.
     """
     return moccasin.config.get_active_network().get_default_account()
+
+@pytest.fixture
+def ipfs_standin():
+    """
+    Runs a local IPFS gateway stand-in for the duration of a test.
+    """
+    from tests.ipfs_standin import IpfsStandin
+
+    standin = IpfsStandin().start()
+    yield standin
+    standin.stop()
+
+@pytest.fixture
+def calls(monkeypatch):
+    """
+    Records the chain and IPFS writes made by CharacterSync instead of performing them.
+    """
+    from components import state_sync
+    from components.character_state import CharacterState
+    from components.ipfs_cache import content_cid
+    from components.tx_submitter import CONFIRMED, TxHandle
+
+    calls = []
+
+    class Collector:
+        # Superseded pins are "unpinned" as soon as the replacing transaction is confirmed
+        def supersede(self, uri, token_id, handle):
+            handle.add_done_callback(lambda handle: handle.ok and calls.append(("unpin", uri.rstrip("/").split("/")[-1])))
+
+        def retain(self, uri):
+            pass
+
+    collector = Collector()
+
+    def transaction(*call):
+        calls.append(call)
+        handle = TxHandle(call[0], call[1:])
+        handle._finish(CONFIRMED)
+        return handle
+
+    monkeypatch.setattr(state_sync, "gain_xp", lambda token_id, xp: transaction("gain_xp", token_id, xp))
+    monkeypatch.setattr(state_sync, "query_level", lambda token_id: calls.append(("query_level", token_id)) or (2, 5))
+    monkeypatch.setattr(state_sync, "update_ipfs_metadata", lambda metadata, document: calls.append(("pin", CharacterState.from_metadata(metadata).hit_point)) or content_cid(document))
+    monkeypatch.setattr(state_sync, "get_pin_collector", lambda: collector)
+    monkeypatch.setattr(state_sync, "change_character", lambda token_id, uri: transaction("change_character", token_id, uri))
+    monkeypatch.setattr(state_sync, "burn_character", lambda token_id: transaction("burn", token_id))
+    return calls
+
+@pytest.fixture
+def pinata(ipfs_standin, monkeypatch):
+    """
+    Installs a Pinata client talking to the stand-in as the shared client.
+    """
+    from components import ipfs_connection
+
+    client = ipfs_connection.PinataClient(jwt="test-jwt", api_url=ipfs_standin.url, backoff=0.01)
+    monkeypatch.setattr(ipfs_connection, "_pinata", client)
+    return client
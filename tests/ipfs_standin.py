@@ -0,0 +1,168 @@
+"""
+Local stand-in for the IPFS gateway and the Pinata pinning API, served from a
+background thread.
+"""
+import base64
+import hashlib
+import json
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class IpfsStandin:
+    def __init__(self):
+        self.documents = {}     # cid -> JSON-serializable content
+        self.files = {}         # cid -> bytes pinned with pinFileToIPFS
+        self.delays = {}        # cid -> seconds to wait before answering
+        self.failures = {}      # cid -> list of status codes to answer before succeeding
+        self.requests = []      # paths requested, in arrival order
+        # Pinata API
+        self.api_requests = []  # (method, path), in arrival order
+        self.api_failures = []  # status codes to answer the next API requests with
+        self.api_delay = 0.0    # seconds each API request takes
+        self.rate_limit = None  # (requests, window seconds): beyond that answer 429 with Retry-After
+        self.unpinned = []
+        self._window = []
+        self.lock = threading.Lock()
+        self.server = _Server(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def gateway_uri(self, cid: str) -> str:
+        return f"{self.url}/ipfs/{cid}"
+
+    # Stand-in CID of a pinned document (content addressed, but not a real CID)
+    def cid_of(self, content) -> str:
+        return "bafy" + hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()[:40]
+
+    # CIDv1 of a file pinned as one raw block, as IPFS computes it
+    def file_cid_of(self, data: bytes) -> str:
+        cid = bytes([0x01, 0x55, 0x12, 0x20]) + hashlib.sha256(data).digest()
+        return "b" + base64.b32encode(cid).decode().lower().rstrip("=")
+
+    def _api_status(self, method: str, path: str):
+        with self.lock:
+            self.api_requests.append((method, path))
+            if self.api_failures:
+                return self.api_failures.pop(0), None
+            if self.rate_limit:
+                limit, window = self.rate_limit
+                now = time.monotonic()
+                self._window = [t for t in self._window if now - t < window]
+                if len(self._window) >= limit:
+                    return 429, window - (now - self._window[0])
+                self._window.append(now)
+        return None, None
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, body):
+                data = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client gave up (timeout tests)
+
+            def _send_rate_limited(self, retry_after: float):
+                self.send_response(429)
+                self.send_header("Retry-After", f"{retry_after:.3f}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def _api(self, method: str) -> bool:
+                if self.headers.get("Authorization", "").removeprefix("Bearer ") in ("", "None"):
+                    self._send_json(401, {"error": "missing JWT"})
+                    return False
+                status, retry_after = standin._api_status(method, self.path)
+                time.sleep(standin.api_delay)
+                if retry_after is not None:
+                    self._send_rate_limited(retry_after)
+                    return False
+                if status is not None:
+                    self._send_json(status, {"error": "injected failure"})
+                    return False
+                return True
+
+            def _pin_file(self, body: bytes):
+                form = BytesParser(policy=HTTP).parsebytes(
+                    f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+                )
+                data = next(part.get_payload(decode=True) for part in form.iter_parts()
+                            if part.get_param("name", header="content-disposition") == "file")
+                cid = standin.file_cid_of(data)
+                with standin.lock:
+                    standin.files[cid] = data
+                self._send_json(200, {"IpfsHash": cid, "PinSize": len(data)})
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path == "/pinning/pinFileToIPFS":
+                    if self._api("POST"):
+                        self._pin_file(raw)
+                    return
+                body = json.loads(raw)
+                if self.path != "/pinning/pinJSONToIPFS":
+                    self._send_json(404, {"error": "not found"})
+                elif self._api("POST"):
+                    content = body["pinataContent"]
+                    cid = standin.cid_of(content)
+                    with standin.lock:
+                        standin.documents[cid] = content
+                    self._send_json(200, {"IpfsHash": cid, "PinSize": len(json.dumps(content))})
+
+            def do_DELETE(self):
+                cid = self.path.rstrip("/").split("/")[-1]
+                if not self.path.startswith("/pinning/unpin/"):
+                    self._send_json(404, {"error": "not found"})
+                elif self._api("DELETE"):
+                    with standin.lock:
+                        standin.documents.pop(cid, None)
+                        standin.files.pop(cid, None)
+                        standin.unpinned.append(cid)
+                    self._send_json(200, {"ok": True})
+
+            def do_GET(self):
+                cid = self.path.rstrip("/").split("/")[-1]
+                with standin.lock:
+                    standin.requests.append(self.path)
+                    pending = standin.failures.get(cid)
+                    status = pending.pop(0) if pending else None
+                time.sleep(standin.delays.get(cid, 0))
+                if status is not None:
+                    self._send_json(status, {"error": "injected failure"})
+                elif cid in standin.documents:
+                    self._send_json(200, standin.documents[cid])
+                elif cid in standin.files:
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(standin.files[cid])))
+                    self.end_headers()
+                    self.wfile.write(standin.files[cid])
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+        return Handler
@@ -0,0 +1,97 @@
+import json
+import time
+from components.character_state import CharacterState
+from components.ipfs_connection import character_metadata
+
+CREATED = {"name": "Aria", "description": "A wandering sellsword", "image": "ipfs://bafyimage",
+           "attributes": {"strength": 12, "dexterity": 14, "constitution": 10,
+                          "intelligence": 8, "wisdom": 11, "charisma": 13}}
+
+
+def test_metadata_round_trips():
+    metadata = character_metadata(CREATED)
+    metadata["adventure_log"] = "Aria cleared the goblin den."
+    state = CharacterState.from_metadata(metadata)
+    assert (state.level, state.experience, state.hit_point, state.constitution) == (1, 0, 12, 10)
+    assert state.to_metadata() == metadata
+    assert list(state.to_metadata()) == list(metadata)
+    assert state.to_metadata()["attributes"] == metadata["attributes"]
+
+
+def test_unknown_keys_and_traits_are_kept():
+    metadata = character_metadata(CREATED)
+    metadata["attributes"].append({"trait_type": "speed", "value": 30, "display_type": "number"})
+    metadata["external_url"] = "https://example.com/aria"
+    assert CharacterState.from_metadata(metadata).to_metadata() == metadata
+
+
+def test_dirty_fields_and_canonical_json():
+    """
+    Only assignments that change a value mark the field dirty, and the canonical JSON
+    is only rebuilt after a change.
+    """
+    state = CharacterState.from_metadata(character_metadata(CREATED))
+    document = state.to_json()
+    assert json.loads(document) == state.to_metadata()
+    assert document == CharacterState.from_metadata(json.loads(document)).to_json()
+
+    state.level = 1
+    assert state.dirty == frozenset()
+    assert state.to_json() is document
+
+    snapshot = state.copy()
+    state.hit_point -= 3
+    state.adventure_log = "Ambushed."
+    assert state.dirty == {"hit_point", "adventure_log"}
+    assert state.to_json() != document
+    assert snapshot.hit_point == 12 and snapshot.to_json() == document
+    state.mark_clean()
+    assert state.dirty == frozenset()
+
+
+def test_canonical_json_matches_the_encoder():
+    states = [
+        CharacterState.from_metadata(character_metadata(CREATED)),
+        CharacterState('Ébène "the quiet"', description="line\nbreak", level=3, hit_point=0),
+        CharacterState("Brom", strength=12.5),
+        CharacterState.from_metadata({"name": "Cyra", "attributes": [{"trait_type": "luck", "value": 7}]}),
+    ]
+    for state in states:
+        expected = json.dumps(state.to_metadata(), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        assert state.to_json() == expected.encode()
+
+
+def test_named_fields_beat_attribute_scans():
+    """
+    Benchmark: a turn's stat updates through named fields versus scanning the metadata
+    attribute list, plus serializing an unchanged state.
+    """
+    metadata = character_metadata(CREATED)
+    state = CharacterState.from_metadata(metadata)
+    n = 20000
+
+    def by_trait(trait):
+        return next(a for a in metadata["attributes"] if a["trait_type"] == trait)
+
+    start = time.perf_counter()
+    for _ in range(n):
+        by_trait("hit point")["value"] -= 1
+        by_trait("experience")["value"] += 1
+        json.dumps(metadata)
+    scans = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(n):
+        state.hit_point -= 1
+        state.experience += 1
+        state.to_json()
+    named = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(n):
+        state.to_json()
+    unchanged = time.perf_counter() - start
+
+    print(f"\n{n} updates: attribute scans {scans:.3f}s, named fields {named:.3f}s, unchanged {unchanged:.4f}s")
+    assert named < scans
+    assert unchanged < named / 10
@@ -200,3 +200,156 @@ def test_change_character_revert_not_admin(character_contract, default_account):
             sender=attacker
         )
 
+
+
+def test_query_roster_pagination(character_contract, default_account):
+    """
+    Test that query_roster returns token IDs, URIs and status page by page:
+      - Pages follow the owner's token order and respect offset and limit
+      - An offset past the end returns empty arrays
+    """
+    for i in range(5):
+        character_contract.create_character(default_account.address, f"cid{i}", sender=default_account.address)
+    character_contract.gain_experience(3, 25, sender=default_account.address)
+
+    token_ids, token_uris, statuses = character_contract.query_roster(default_account.address, 0, 2)
+    assert list(token_ids) == [0, 1]
+    assert list(token_uris) == [base_uri + "cid0", base_uri + "cid1"]
+    assert [tuple(s) for s in statuses] == [(1, 0), (1, 0)]
+
+    token_ids, token_uris, statuses = character_contract.query_roster(default_account.address, 2, 2)
+    assert list(token_ids) == [2, 3]
+    assert tuple(statuses[1]) == (2, 5)
+
+    # The last page is truncated to the owner's balance
+    token_ids, token_uris, statuses = character_contract.query_roster(default_account.address, 4, 2)
+    assert list(token_ids) == [4]
+    assert list(token_uris) == [base_uri + "cid4"]
+
+    token_ids, token_uris, statuses = character_contract.query_roster(default_account.address, 5, 2)
+    assert len(token_ids) == len(token_uris) == len(statuses) == 0
+
+
+def test_query_roster_other_owner(character_contract, default_account):
+    """
+    Test that query_roster only returns the characters of the given owner, and
+    skips burned characters.
+    """
+    other = boa.env.generate_address()
+    character_contract.create_character(default_account.address, "cid0", sender=default_account.address)
+    character_contract.create_character(other, "cid1", sender=default_account.address)
+    character_contract.create_character(default_account.address, "cid2", sender=default_account.address)
+    character_contract.kill_character(0, sender=default_account.address)
+
+    token_ids, token_uris, _ = character_contract.query_roster(default_account.address, 0, 50)
+    assert list(token_ids) == [2]
+    assert list(token_uris) == [base_uri + "cid2"]
+
+    token_ids, _, _ = character_contract.query_roster(other, 0, 50)
+    assert list(token_ids) == [1]
+
+
+def test_query_roster_limit_capped(character_contract, default_account):
+    """
+    Test that a page never holds more than MAX_PAGE_SIZE (50) characters.
+    """
+    for i in range(52):
+        character_contract.create_character(default_account.address, f"cid{i}", sender=default_account.address)
+
+    token_ids, _, _ = character_contract.query_roster(default_account.address, 0, 100)
+    assert len(token_ids) == 50
+    token_ids, _, _ = character_contract.query_roster(default_account.address, 50, 100)
+    assert list(token_ids) == [50, 51]
+
+
+def test_query_statuses(character_contract, default_account):
+    """
+    Test that query_statuses returns the status of each requested token in order.
+    """
+    for i in range(3):
+        character_contract.create_character(default_account.address, f"cid{i}", sender=default_account.address)
+    character_contract.update_status(1, 4, 7, sender=default_account.address)
+
+    statuses = character_contract.query_statuses([1, 0, 2])
+    assert [tuple(s) for s in statuses] == [(4, 7), (1, 0), (1, 0)]
+
+
+def test_create_character_returns_token_id(character_contract, default_account):
+    """
+    Test that create_character returns the token ID of the new character.
+    """
+    assert character_contract.create_character(default_account.address, "cid0", sender=default_account.address) == 0
+    assert character_contract.create_character(default_account.address, "cid1", sender=default_account.address) == 1
+    assert character_contract.tokenURI(1) == base_uri + "cid1"
+
+
+def test_gain_experience_multiple_levels(character_contract, default_account):
+    """
+    Test that a large XP award levels the character up several times in one call:
+      - 20 XP reaches level 2, 40 more reach level 3, 80 more reach level 4
+    """
+    character_contract.create_character(default_account.address, "cid0", sender=default_account.address)
+    token_id = 0
+
+    character_contract.gain_experience(token_id, 20 + 40 + 80 + 7, sender=default_account.address)
+
+    status = character_contract.query_character(token_id)
+    assert status[0] == 4   # level
+    assert status[1] == 7   # experience
+
+
+def test_gain_experience_batch(character_contract, default_account):
+    """
+    Test awarding XP to several characters in one transaction:
+      - Each token gets its own award, with multi-level progression
+      - A token listed twice receives both awards
+    """
+    for i in range(3):
+        character_contract.create_character(default_account.address, f"cid{i}", sender=default_account.address)
+
+    character_contract.gain_experience_batch([0, 1, 2, 1], [25, 65, 0, 10], sender=default_account.address)
+
+    assert tuple(character_contract.query_character(0)) == (2, 5)
+    assert tuple(character_contract.query_character(1)) == (3, 15)
+    assert tuple(character_contract.query_character(2)) == (1, 0)
+
+
+def test_gain_experience_batch_reverts(character_contract, default_account):
+    """
+    Test that gain_experience_batch is admin-only and rejects mismatched arrays.
+    """
+    character_contract.create_character(default_account.address, "cid0", sender=default_account.address)
+    attacker = boa.env.generate_address()
+
+    with boa.reverts("Only admin can modify XP"):
+        character_contract.gain_experience_batch([0], [10], sender=attacker)
+    with boa.reverts("Length mismatch"):
+        character_contract.gain_experience_batch([0, 0], [10], sender=default_account.address)
+
+
+@pytest.mark.parametrize("n_characters", [1, 10, 50])
+def test_gain_experience_batch_gas(character_contract, default_account, n_characters):
+    """
+    Gas benchmark: settling XP for N characters with one gain_experience_batch
+    transaction versus N gain_experience transactions. Each transaction is
+    charged the 21000 base cost on top of its execution gas.
+    """
+    tx_base_cost = 21000
+    for i in range(n_characters):
+        character_contract.create_character(default_account.address, f"cid{i}", sender=default_account.address)
+
+    # Both settlements start from the same state
+    single = 0
+    with boa.env.anchor():
+        for token_id in range(n_characters):
+            character_contract.gain_experience(token_id, 30, sender=default_account.address)
+            single += tx_base_cost + character_contract._computation.get_gas_used()
+
+    token_ids = list(range(n_characters))
+    character_contract.gain_experience_batch(token_ids, [30] * n_characters, sender=default_account.address)
+    batch = tx_base_cost + character_contract._computation.get_gas_used()
+
+    print(f"\nN={n_characters}: {single} gas in {n_characters} transactions, {batch} gas in one batch")
+    assert tuple(character_contract.query_character(n_characters - 1)) == (2, 10)
+    if n_characters > 1:
+        assert batch < single
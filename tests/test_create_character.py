@@ -0,0 +1,66 @@
+import json
+import threading
+import time
+from moccasin.config import get_active_network
+from components import create_character
+from components.contract_interaction import CharacterClient
+from components.create_character import CharacterRequest, mint_new_character, mint_new_characters
+
+IMAGE_DELAY = 0.2
+
+
+def test_batch_creation_pipeline(character_contract, pinata, ipfs_standin, monkeypatch):
+    """
+    Benchmark: a batch of characters is generated, pinned and minted with bounded
+    concurrency; each image is pinned as bytes and referenced by its CID, and the
+    minted token points at the pinned metadata.
+    """
+    running, peak = 0, 0
+    lock = threading.Lock()
+
+    def generate_image(description):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(IMAGE_DELAY)
+        with lock:
+            running -= 1
+        return f"PNG of {description}".encode()
+
+    client = CharacterClient(get_active_network(), character_contract.address)
+    monkeypatch.setattr(create_character, "generate_image", generate_image)
+    monkeypatch.setattr(create_character, "mint_character", client.mint_character)
+    ipfs_standin.api_delay = 0.02
+
+    n = 8
+    requests = [CharacterRequest(f"Goblin {i}", f"goblin number {i}") for i in range(n)]
+    start = time.perf_counter()
+    created = mint_new_characters(requests, max_parallel=4)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{n} characters: {elapsed:.2f}s batched vs at least {n * IMAGE_DELAY:.2f}s one by one")
+    assert peak == 4
+    assert elapsed < n * IMAGE_DELAY / 2
+    assert sorted(character.token_id for character in created) == list(range(n))
+    for request, character in zip(requests, created):
+        image_cid = character.metadata["image"].removeprefix("ipfs://")
+        assert ipfs_standin.files[image_cid] == f"PNG of {request.description}".encode()
+        assert json.loads(ipfs_standin.files[character.token_uri]) == character.metadata
+        assert client.token_uri(character.token_id) == "https://ipfs.io/ipfs/" + character.token_uri
+        assert character.metadata["name"] == request.name
+
+
+def test_failed_character_does_not_stop_the_batch(character_contract, pinata, ipfs_standin, monkeypatch):
+    def generate_image(description):
+        if description == "cursed":
+            raise RuntimeError("content policy")
+        return b"PNG"
+
+    client = CharacterClient(get_active_network(), character_contract.address)
+    monkeypatch.setattr(create_character, "generate_image", generate_image)
+    monkeypatch.setattr(create_character, "mint_character", client.mint_character)
+
+    created = mint_new_characters([CharacterRequest("A", "fine"), CharacterRequest("B", "cursed")])
+    assert created[0] is not None and created[1] is None
+    assert mint_new_character(CharacterRequest("C", "fine")).token_id == 1
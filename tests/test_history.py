@@ -0,0 +1,75 @@
+from langchain_core.messages import AIMessage, HumanMessage
+from components.history import SummarizingChatMessageHistory, estimate_tokens
+
+
+def play_turns(history, turns, first=0):
+    for i in range(first, first + turns):
+        history.add_messages([
+            HumanMessage(content=f"I search room {i:03d} carefully. " * 5),
+            AIMessage(content=f"Room {i:03d} holds dust and an old chest. " * 20),
+        ])
+
+
+def test_prompt_size_plateaus():
+    """
+    The prompt sent each turn stays within the token budget however long the
+    session runs, while the most recent turns are kept verbatim.
+    """
+    folds = []
+
+    def summarizer(summary, messages):
+        folds.append(len(messages))
+        return f"log after {sum(folds):04d} messages"
+
+    history = SummarizingChatMessageHistory("You are the AI Dungeon Master.", summarizer, token_budget=3000)
+    sizes = []
+    for turn in range(100):
+        play_turns(history, 1, first=turn)
+        sizes.append(estimate_tokens(history.messages))
+
+    assert max(sizes) <= 3000 + estimate_tokens(history.recent[-2:])
+    assert max(sizes[50:]) <= max(sizes[:50])
+    assert history.messages[0].content == "You are the AI Dungeon Master."
+    assert history.messages[1].content == f"Adventure so far: log after {sum(folds):04d} messages"
+    assert history.recent[-1].content.startswith("Room 099 ")
+    assert len(history.recent) >= history.keep_recent
+    # Folding happens in chunks down to the low watermark, not every turn
+    assert len(folds) <= 10
+
+
+def test_folds_come_in_chunks_on_a_tight_budget():
+    """
+    Even when the recent turns alone nearly fill the budget, a fold goes down to the
+    low watermark, so the next one is several turns away.
+    """
+    fold_turns = []
+    history = SummarizingChatMessageHistory("rules", lambda summary, messages: fold_turns.append(turn) or "log",
+                                            token_budget=1000)
+    for turn in range(100):
+        play_turns(history, 1, first=turn)
+
+    assert min(later - earlier for earlier, later in zip(fold_turns, fold_turns[1:])) >= 3
+    assert len(history.recent) >= 2
+
+
+def test_summary_is_incremental():
+    """
+    Each fold receives the previous summary plus only the newly folded turns,
+    oldest first.
+    """
+    seen = []
+
+    def summarizer(summary, messages):
+        seen.append((summary, [m.content.split(" ")[3] for m in messages if isinstance(m, HumanMessage)]))
+        return f"summary {len(seen)}"
+
+    history = SummarizingChatMessageHistory("rules", summarizer, token_budget=600, keep_recent=2)
+    play_turns(history, 6)
+
+    assert [summary for summary, _ in seen] == [""] + [f"summary {i}" for i in range(1, len(seen))]
+    folded_rooms = [room for _, rooms in seen for room in rooms]
+    assert folded_rooms == [f"{i:03d}" for i in range(len(folded_rooms))]
+    assert history.recent[0].content.startswith(f"I search room {len(folded_rooms):03d} ")
+
+    folds = len(seen)
+    assert history.full_summary() == f"summary {folds + 1}"
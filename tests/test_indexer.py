@@ -0,0 +1,153 @@
+import time
+import pytest
+from moccasin.config import get_active_network
+from components.contract_interaction import CharacterClient
+from components.indexer import CharacterIndexer
+from components.rpc import RpcClient
+from tests.chain_standin import ChainStandin
+
+OTHER_OWNER = "0x" + "ab" * 20
+
+
+@pytest.fixture
+def chain():
+    return ChainStandin()
+
+
+@pytest.fixture
+def indexer(tmp_path, chain, character_contract):
+    indexer = CharacterIndexer(RpcClient(chain), character_contract.address, tmp_path / "index.sqlite",
+                               start_block=1, confirmations=2, chunk_size=4, interval=0.02)
+    yield indexer
+    indexer.close()
+
+
+def mint(chain, contract, owner, uri):
+    contract.create_character(owner, uri, sender=owner)
+    chain.mine(contract)
+
+
+def test_index_follows_mints_and_status(indexer, chain, character_contract, default_account):
+    """
+    Mints, XP awards, metadata changes and burns are reflected in the
+    index once their blocks are confirmed.
+    """
+    owner = default_account.address
+    for i in range(2):
+        mint(chain, character_contract, owner, f"cid{i}")
+    character_contract.create_character(OTHER_OWNER, "cid2", sender=owner)
+    chain.mine(character_contract)
+    character_contract.gain_experience(0, 25, sender=owner)
+    chain.mine(character_contract)
+    character_contract.change_character(1, "cid1-v2", sender=owner)
+    chain.mine(character_contract)
+    character_contract.kill_character(1, sender=owner)
+    chain.mine(character_contract)
+
+    # The burn and the metadata change are not confirmed yet, but reads overlay them
+    indexer.sync()
+    assert indexer.synced_block == chain.head - 2
+    assert [entry.token_id for entry in indexer.roster(owner, unconfirmed=False)] == [0, 1]
+    assert indexer.roster(owner) == [(0, "https://ipfs.io/ipfs/cid0", 2, 5)]
+    assert indexer.status(1, unconfirmed=False) == (1, 0)
+    assert indexer.status(1) is None
+    assert indexer.status(0) == (2, 5)
+
+    chain.advance(2)
+    indexer.sync()
+    assert indexer.roster(owner, unconfirmed=False) == [(0, "https://ipfs.io/ipfs/cid0", 2, 5)]
+    assert indexer.roster(OTHER_OWNER) == [(2, "https://ipfs.io/ipfs/cid2", 1, 0)]
+    assert indexer.status(1) is None
+    assert character_contract.tokenURI(0) == indexer.roster(owner)[0].token_uri
+
+
+def test_backfill_is_chunked_and_resumes(tmp_path, chain, character_contract, default_account):
+    """
+    Backfill reads logs in chunks, halves them when the node refuses a range, and a
+    restarted indexer continues from the last block it ingested.
+    """
+    owner = default_account.address
+    for i in range(10):
+        mint(chain, character_contract, owner, f"cid{i}")
+    chain.advance(10)
+    chain.max_logs = 5
+
+    path = tmp_path / "index.sqlite"
+    before = CharacterIndexer(RpcClient(chain), character_contract.address, path, start_block=1,
+                              confirmations=0, chunk_size=8)
+    before.sync()
+    assert before.chunk_size < 8
+    assert len(before.roster(owner)) == 10
+    before.close()
+
+    mint(chain, character_contract, owner, "cid10")
+    chain.log_requests.clear()
+    after = CharacterIndexer(RpcClient(chain), character_contract.address, path, start_block=1, confirmations=0)
+    after.sync()
+    assert chain.log_requests == [(chain.head, chain.head)]
+    assert len(after.roster(owner)) == 11
+    after.close()
+
+
+def test_not_ready_until_caught_up(tmp_path, chain, character_contract, default_account):
+    """
+    The index only answers once a sync has reached the confirmed head: not in the middle
+    of a backfill, and not from an index file left by an earlier run.
+    """
+    owner = default_account.address
+    for i in range(6):
+        mint(chain, character_contract, owner, f"cid{i}")
+    chain.advance(2)
+
+    path = tmp_path / "index.sqlite"
+    indexer = CharacterIndexer(RpcClient(chain), character_contract.address, path, start_block=1,
+                               confirmations=2, chunk_size=2)
+    get_logs, seen = indexer._get_logs, []
+    indexer._get_logs = lambda start, end: seen.append(indexer.ready) or get_logs(start, end)
+    indexer.sync()
+    assert len(seen) > 1 and not any(seen)
+    assert indexer.ready
+    indexer.close()
+
+    restarted = CharacterIndexer(RpcClient(chain), character_contract.address, path, start_block=1, confirmations=2)
+    assert restarted.synced_block == chain.head - 2
+    assert not restarted.ready
+    restarted.sync()
+    assert restarted.ready
+    restarted.close()
+
+
+def test_roster_is_served_from_the_index(indexer, chain, character_contract, default_account):
+    """
+    Benchmark: once the index has caught up, loading a roster costs a single eth_getLogs
+    for the unconfirmed blocks, whatever the wallet's size, and returns what the chain
+    returns, including a character minted a moment ago.
+    """
+    owner = default_account.address
+    for i in range(60):
+        mint(chain, character_contract, owner, f"cid{i}")
+    chain.advance(2)
+
+    client = CharacterClient(get_active_network(), character_contract.address)
+    expected = client.load_roster()
+
+    indexer.start()
+    for _ in range(200):
+        if indexer.ready:
+            break
+        time.sleep(0.02)
+    assert indexer.ready
+    client.indexer = indexer
+    indexer.rpc.round_trips = client.rpc.round_trips = 0
+    start = time.perf_counter()
+    roster = client.load_roster()
+    elapsed = time.perf_counter() - start
+
+    print(f"\n60 characters from the index in {elapsed * 1000:.2f}ms")
+    assert client.rpc.round_trips == 0
+    assert indexer.rpc.round_trips == 1
+    assert roster == expected
+
+    mint(chain, character_contract, owner, "cid60")
+    assert client.load_roster() == client._load_roster_per_token(owner)
+    assert len(client.load_roster()) == 61
@@ -0,0 +1,90 @@
+import pytest
+from components import ipfs_cache, ipfs_connection
+from components.ipfs_cache import MetadataCache, cid_from_uri, content_cid
+
+CID = "bafkreiglnb5fntnlr33cxg4f4d5p4fjfrwn4gehcpiyv5x7hllbvegm7ku"
+
+
+@pytest.fixture
+def metadata_cache(tmp_path, monkeypatch):
+    cache = MetadataCache(tmp_path / "ipfs.sqlite")
+    monkeypatch.setattr(ipfs_cache, "_cache", cache)
+    yield cache
+    cache.close()
+
+
+def test_cid_from_uri():
+    assert cid_from_uri("https://ipfs.io/ipfs/" + CID) == CID
+    assert cid_from_uri("ipfs://" + CID) == CID
+    assert cid_from_uri(CID) == CID
+    assert cid_from_uri("https://game.com/meta/character.json") is None
+
+
+def test_content_cid():
+    # The CID IPFS gives an empty file
+    assert content_cid(b"") == "bafkreihdwdcefgh4dqkjv67uzcmw7ojee6xedzdetojuzjevtenxquvyku"
+    assert cid_from_uri(content_cid(b"{}")) == content_cid(b"{}")
+
+
+def test_warm_roster_load_skips_gateway(ipfs_standin, metadata_cache):
+    """
+    A second roster load is answered from the cache with zero HTTP requests.
+    """
+    cids = [CID[:-1] + c for c in "abcd"]
+    for i, cid in enumerate(cids):
+        ipfs_standin.documents[cid] = {"name": f"character {i}"}
+    uris = [ipfs_standin.gateway_uri(cid) for cid in cids]
+
+    cold = ipfs_connection.get_ipfs_jsons(uris)
+    assert len(ipfs_standin.requests) == 4
+
+    warm = ipfs_connection.get_ipfs_jsons(uris)
+    assert warm == cold
+    assert len(ipfs_standin.requests) == 4
+
+
+def test_cache_returns_copies(metadata_cache):
+    """
+    Callers may mutate loaded metadata without corrupting the cached document.
+    """
+    metadata_cache.put(CID, {"attributes": [{"value": 1}]})
+    loaded = metadata_cache.get(CID)
+    loaded["attributes"][0]["value"] = 99
+    assert metadata_cache.get(CID) == {"attributes": [{"value": 1}]}
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """
+    Once the stored size exceeds the limit, the least recently used documents go first.
+    """
+    cache = MetadataCache(tmp_path / "ipfs.sqlite", max_bytes=250)
+    doc = {"padding": "x" * 80}
+    cache.put("bafy1", doc)
+    cache.put("bafy2", doc)
+    cache.get("bafy1")          # bafy2 is now the least recently used
+    cache.put("bafy3", doc)
+
+    assert "bafy1" in cache
+    assert "bafy2" not in cache
+    assert "bafy3" in cache
+    assert cache.size() <= 250
+    cache.close()
+
+
+def test_update_writes_through(metadata_cache, pinata, monkeypatch):
+    """
+    Metadata pinned through update_ipfs_metadata is served from the cache afterwards.
+    """
+    monkeypatch.setattr(ipfs_connection, "fetch_ipfs_json", lambda *args, **kwargs: pytest.fail("gateway hit"))
+
+    cid = ipfs_connection.update_ipfs_metadata({"name": "Aria", "attributes": []})
+    assert cid is not None
+    assert ipfs_connection.get_ipfs_json("https://ipfs.io/ipfs/" + cid) == {"name": "Aria", "attributes": []}
+
+
+def test_cache_path_is_read_when_opened(tmp_path, monkeypatch):
+    """
+    IPFS_CACHE_PATH set after import (e.g. from .env) still decides where the cache lives.
+    """
+    monkeypatch.setenv("IPFS_CACHE_PATH", str(tmp_path / "elsewhere.sqlite"))
+    assert ipfs_cache.get_cache().path == tmp_path / "elsewhere.sqlite"
@@ -0,0 +1,144 @@
+import time
+import pytest
+import requests
+from components import ipfs_connection
+from components.character_state import canonical_json
+from components.ipfs_cache import content_cid
+from components.ipfs_connection import PinataClient, PinataError
+
+
+def test_get_ipfs_jsons_keeps_token_order(ipfs_standin):
+    """
+    Results come back in the order of the requested URIs, even when later
+    documents answer first.
+    """
+    cids = [f"cid{i}" for i in range(6)]
+    for i, cid in enumerate(cids):
+        ipfs_standin.documents[cid] = {"name": f"character {i}"}
+        ipfs_standin.delays[cid] = 0.05 * (len(cids) - i)
+
+    results = ipfs_connection.get_ipfs_jsons([ipfs_standin.gateway_uri(cid) for cid in cids])
+    assert [r["name"] for r in results] == [f"character {i}" for i in range(6)]
+
+
+def test_get_ipfs_jsons_is_bounded_by_slowest_response(ipfs_standin):
+    """
+    Benchmark: roster metadata load time follows the slowest gateway response
+    rather than the sum of all responses.
+    """
+    n, delay = 16, 0.2
+    for i in range(n):
+        ipfs_standin.documents[f"cid{i}"] = {"i": i}
+        ipfs_standin.delays[f"cid{i}"] = delay
+    uris = [ipfs_standin.gateway_uri(f"cid{i}") for i in range(n)]
+
+    start = time.perf_counter()
+    results = ipfs_connection.get_ipfs_jsons(uris, max_parallel=n)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{n} documents at {delay}s each: {elapsed:.2f}s concurrent vs {n * delay:.2f}s serial")
+    assert [r["i"] for r in results] == list(range(n))
+    assert elapsed < 4 * delay
+
+
+def test_get_ipfs_json_retries_server_errors(ipfs_standin, monkeypatch):
+    """
+    5xx and 429 responses are retried; a missing document is not.
+    """
+    monkeypatch.setattr(ipfs_connection, "GATEWAY_BACKOFF", 0)
+    ipfs_standin.documents["flaky"] = {"ok": True}
+    ipfs_standin.failures["flaky"] = [503, 429]
+
+    assert ipfs_connection.get_ipfs_json(ipfs_standin.gateway_uri("flaky")) == {"ok": True}
+    assert ipfs_connection.get_ipfs_json(ipfs_standin.gateway_uri("missing")) is None
+    assert len(ipfs_standin.requests) == 4
+
+
+def test_get_ipfs_json_times_out(ipfs_standin, monkeypatch):
+    """
+    A stalled gateway response fails after the per-request timeout and its retries.
+    """
+    monkeypatch.setattr(ipfs_connection, "GATEWAY_BACKOFF", 0)
+    ipfs_standin.documents["slow"] = {"ok": True}
+    ipfs_standin.delays["slow"] = 0.5
+
+    start = time.perf_counter()
+    with pytest.raises(requests.Timeout):
+        ipfs_connection.fetch_ipfs_json(ipfs_standin.gateway_uri("slow"), timeout=0.1, retries=1)
+    assert len(ipfs_standin.requests) == 2
+    assert time.perf_counter() - start < 1.5
+
+
+def test_pin_and_unpin(pinata, ipfs_standin):
+    """
+    Metadata pinned through the client can be read back from the gateway and unpinned.
+    Its CID is known before pinning: the content CID of its canonical JSON.
+    """
+    metadata = {"name": "Aria", "attributes": [{"trait_type": "level", "value": 1}]}
+    cid = ipfs_connection.update_ipfs_metadata(metadata)
+    assert cid == content_cid(canonical_json(metadata))
+    assert cid == ipfs_standin.file_cid_of(b'{"attributes":[{"trait_type":"level","value":1}],"name":"Aria"}')
+    assert ipfs_connection.fetch_ipfs_json(ipfs_standin.gateway_uri(cid)) == metadata
+
+    ipfs_connection.delete_ipfs(cid)
+    assert ipfs_standin.unpinned == [cid]
+    assert ipfs_standin.api_requests == [("POST", "/pinning/pinFileToIPFS"), ("DELETE", f"/pinning/unpin/{cid}")]
+
+
+def test_pinata_retries_server_errors_only(pinata, ipfs_standin):
+    """
+    5xx responses are retried with backoff; other client errors fail at once and
+    the module functions report them instead of raising.
+    """
+    ipfs_standin.api_failures = [502, 503]
+    assert pinata.pin_json({"name": "Brom"}) == ipfs_standin.cid_of({"name": "Brom"})
+    assert len(ipfs_standin.api_requests) == 3
+
+    ipfs_standin.api_failures = [400]
+    with pytest.raises(PinataError):
+        pinata.pin_json({"name": "Cato"})
+    assert len(ipfs_standin.api_requests) == 4
+
+    ipfs_standin.api_failures = [500] * (pinata.retries + 1)
+    assert ipfs_connection.update_ipfs_metadata({"name": "Dara"}) is None
+    assert len(ipfs_standin.api_requests) == 5 + pinata.retries
+
+
+def test_pinata_honours_rate_limit(pinata, ipfs_standin):
+    """
+    A 429 holds back every request of the client for its Retry-After window, so a
+    rate-limited batch still completes without exhausting its retries.
+    """
+    ipfs_standin.rate_limit = (4, 0.3)
+    contents = [{"i": i} for i in range(12)]
+
+    start = time.perf_counter()
+    cids = pinata.pin_jsons(contents)
+    elapsed = time.perf_counter() - start
+
+    assert cids == [ipfs_standin.cid_of(content) for content in contents]
+    assert elapsed >= 0.5   # at least two windows after the first four pins
+    assert pinata.unpin_many(cids[:6]) == [True] * 6
+
+
+def test_pinata_batch_throughput(ipfs_standin):
+    """
+    Benchmark: batch pinning over the pooled session is bounded by the parallelism,
+    not by the number of documents.
+    """
+    n, delay = 32, 0.05
+    ipfs_standin.api_delay = delay
+    pinata = PinataClient(jwt="test-jwt", api_url=ipfs_standin.url, max_parallel=8)
+
+    start = time.perf_counter()
+    serial = [pinata.pin_json({"serial": i}) for i in range(n)]
+    serial_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = pinata.pin_jsons([{"batch": i} for i in range(n)])
+    batch_elapsed = time.perf_counter() - start
+    unpinned = pinata.unpin_many(serial + batch)
+
+    print(f"\n{n} pins: {n / serial_elapsed:.0f}/s serial, {n / batch_elapsed:.0f}/s batched")
+    assert None not in batch and all(unpinned)
+    assert batch_elapsed < serial_elapsed / 3
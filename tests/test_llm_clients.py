@@ -0,0 +1,21 @@
+from components import llm_clients
+from components.llm_clients import get_chat_model, get_openai_client
+
+
+def test_clients_are_created_once(monkeypatch):
+    """
+    Every chat model and the image client are created on first use, reused after
+    that, and share one HTTP connection pool.
+    """
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(llm_clients, "_chat_models", {})
+
+    model = get_chat_model()
+    assert get_chat_model() is model
+    assert get_chat_model(temperature=0.3) is model
+    assert get_chat_model(temperature=0) is not model
+
+    shared = llm_clients._shared_http_client()
+    assert model.http_client is shared
+    assert get_openai_client() is get_openai_client()
+    assert get_openai_client()._client is shared
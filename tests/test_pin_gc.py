@@ -0,0 +1,182 @@
+import time
+import pytest
+from components import pin_gc, state_sync
+from components.character_state import CharacterState
+from components.ipfs_cache import cid_from_uri
+from components.ipfs_connection import update_ipfs_metadata
+from components.pin_gc import PinCollector
+from components.rpc import ContractReverted
+from components.state_sync import CharacterSync
+from components.tx_submitter import CONFIRMED, FAILED, TxHandle
+
+
+@pytest.fixture
+def token_uris(monkeypatch):
+    """
+    Token URIs on chain by token ID; tokens not listed point at some other CID.
+    """
+    token_uris = {}
+    monkeypatch.setattr(pin_gc, "query_token_uri", lambda token_id: token_uris.get(token_id, "bafycurrent"))
+    return token_uris
+
+
+@pytest.fixture
+def collector(tmp_path, pinata, token_uris):
+    collector = PinCollector(tmp_path / "pin_gc.sqlite", batch_size=50, interval=60)
+    yield collector
+    if not collector._stopped.is_set():
+        collector.close()
+
+
+def pending_handle():
+    return TxHandle("change_character", ())
+
+
+def test_unpins_only_after_confirmation(collector, ipfs_standin):
+    """
+    A superseded pin stays pinned while the replacing transaction is pending and
+    is unpinned once it is confirmed.
+    """
+    handle = pending_handle()
+    collector.supersede("https://ipfs.io/ipfs/bafyold", 1, handle)
+    assert collector.collect() == 0
+    assert ipfs_standin.unpinned == []
+
+    handle._finish(CONFIRMED)
+    assert collector.collect() == 1
+    assert ipfs_standin.unpinned == ["bafyold"]
+    assert collector.pending() == 0
+
+
+def test_failed_replacement_keeps_pin(collector, ipfs_standin):
+    handle = pending_handle()
+    collector.supersede("bafyold", 1, handle)
+    handle._finish(FAILED, error="reverted")
+    assert collector.collect() == 0
+    assert collector.pending() == 0
+    assert ipfs_standin.unpinned == []
+
+
+def test_full_batch_is_collected_in_the_background(collector, ipfs_standin):
+    """
+    Confirmed CIDs are unpinned together once a batch fills up, without waiting
+    for the timer.
+    """
+    for i in range(collector.batch_size):
+        handle = pending_handle()
+        collector.supersede(f"bafy{i}", i, handle)
+        handle._finish(CONFIRMED)
+
+    for _ in range(200):
+        if collector.pending() == 0:
+            break
+        time.sleep(0.02)
+    assert sorted(ipfs_standin.unpinned) == sorted(f"bafy{i}" for i in range(collector.batch_size))
+
+
+def test_queue_survives_restart(tmp_path, pinata, ipfs_standin, monkeypatch):
+    """
+    Pins superseded before a restart are collected afterwards, once the chain
+    shows the token no longer points at them.
+    """
+    path = tmp_path / "pin_gc.sqlite"
+    before = PinCollector(path, interval=60)
+    before.supersede("bafyreplaced", 1, pending_handle())
+    before.supersede("bafystillcurrent", 2, pending_handle())
+    before.close()
+
+    token_uris = {1: "https://ipfs.io/ipfs/bafynew", 2: "https://ipfs.io/ipfs/bafystillcurrent"}
+    monkeypatch.setattr(pin_gc, "query_token_uri", lambda token_id: token_uris[token_id])
+    after = PinCollector(path, interval=60)
+    assert after.collect() == 1
+    assert ipfs_standin.unpinned == ["bafyreplaced"]
+    assert after.pending() == 1
+    after.close()
+
+
+def test_refused_unpin_is_retried(collector, ipfs_standin):
+    handle = pending_handle()
+    collector.supersede("bafyold", 1, handle)
+    handle._finish(CONFIRMED)
+
+    ipfs_standin.api_failures = [400]
+    assert collector.collect() == 0
+    assert collector.pending() == 1
+    assert collector.collect() == 1
+    assert ipfs_standin.unpinned == ["bafyold"]
+
+
+def test_cid_that_is_not_pinned_counts_as_unpinned(collector, ipfs_standin):
+    handle = pending_handle()
+    collector.supersede("bafyold", 1, handle)
+    handle._finish(CONFIRMED)
+
+    ipfs_standin.api_failures = [404]
+    assert collector.collect() == 1
+    assert collector.pending() == 0
+
+
+def test_unpin_is_given_up_after_max_attempts(collector, ipfs_standin, capsys):
+    """
+    A CID Pinata keeps refusing to unpin leaves the queue after GC_MAX_ATTEMPTS
+    runs, and is reported as still pinned.
+    """
+    handle = pending_handle()
+    collector.supersede("bafyold", 1, handle)
+    handle._finish(CONFIRMED)
+
+    for _ in range(pin_gc.GC_MAX_ATTEMPTS):
+        ipfs_standin.api_failures = [400]
+        assert collector.pending() == 1
+        assert collector.collect() == 0
+    assert collector.pending() == 0
+    assert "gave up on bafyold" in capsys.readouterr().out
+
+
+def test_current_cid_is_never_unpinned(collector, ipfs_standin, monkeypatch):
+    """
+    A CID the token points at again is dropped from the queue instead of unpinned;
+    a burned token's CID is unpinned.
+    """
+    def query_token_uri(token_id):
+        if token_id == 2:
+            raise ContractReverted("execution reverted")
+        return "https://ipfs.io/ipfs/bafyagain"
+
+    monkeypatch.setattr(pin_gc, "query_token_uri", query_token_uri)
+    for token_id, cid in [(1, "bafyagain"), (2, "bafyburned")]:
+        handle = pending_handle()
+        collector.supersede(cid, token_id, handle)
+        handle._finish(CONFIRMED)
+    assert collector.collect() == 1
+    assert ipfs_standin.unpinned == ["bafyburned"]
+    assert collector.pending() == 0
+
+
+def test_metadata_changed_back_keeps_its_pin(collector, ipfs_standin, token_uris, monkeypatch):
+    """
+    Damage then a heal back to identical metadata makes the original CID current again:
+    only the intermediate pin is unpinned.
+    """
+    def change_character(token_id, uri):
+        handle = TxHandle("change_character", (token_id, uri))
+        token_uris[token_id] = uri
+        handle._finish(CONFIRMED)
+        return handle
+
+    monkeypatch.setattr(state_sync, "get_pin_collector", lambda: collector)
+    monkeypatch.setattr(state_sync, "change_character", change_character)
+    character = CharacterState("Aria", level=1, experience=0, hit_point=10)
+    original = update_ipfs_metadata(character.to_metadata(), character.to_json())
+    token_uris[7] = original
+    sync = CharacterSync(character, original, 7, flush_every=1, flush_interval=None)
+    sync.record(0, -2)
+    sync.flush().result()
+    damaged = sync.token_uri
+    sync.record(0, 2)
+    sync.close()
+
+    assert cid_from_uri(token_uris[7]) == original
+    collector.collect()
+    assert ipfs_standin.unpinned == [damaged]
+    assert original in ipfs_standin.files
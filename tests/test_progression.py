@@ -0,0 +1,57 @@
+import boa
+import pytest
+from hypothesis import HealthCheck, given, settings, strategies as st
+from components import progression
+
+UINT256_MAX = 2**256 - 1
+
+
+@pytest.fixture
+def minted(character_contract, default_account):
+    character_contract.create_character(default_account.address, "cid0", sender=default_account.address)
+    return character_contract
+
+
+def contract_gain(contract, admin, level, experience, xp_gained):
+    contract.update_status(0, level, experience, sender=admin)
+    contract.gain_experience(0, xp_gained, sender=admin)
+    return tuple(contract.query_character(0))
+
+
+@settings(max_examples=300, deadline=None, suppress_health_check=[HealthCheck.function_scoped_fixture])
+@given(
+    level=st.one_of(st.integers(0, 12), st.integers(0, 300)),
+    experience=st.one_of(st.integers(0, 50_000), st.integers(0, UINT256_MAX)),
+    xp_gained=st.one_of(st.integers(0, 50_000), st.integers(0, UINT256_MAX)),
+)
+def test_matches_contract(minted, default_account, level, experience, xp_gained):
+    """
+    Property: the Python engine predicts exactly the status the contract stores
+    after gain_experience, and overflows exactly where the contract reverts.
+    """
+    try:
+        expected = progression.gain_experience(level, experience, xp_gained)
+    except progression.ProgressionOverflow:
+        with boa.reverts():
+            contract_gain(minted, default_account.address, level, experience, xp_gained)
+        return
+    assert contract_gain(minted, default_account.address, level, experience, xp_gained) == expected
+
+
+@settings(max_examples=50, deadline=None, suppress_health_check=[HealthCheck.function_scoped_fixture])
+@given(awards=st.lists(st.integers(0, 400), min_size=1, max_size=8))
+def test_matches_contract_over_a_session(minted, default_account, awards):
+    """
+    Property: a sequence of awards from a fresh character stays in step with the chain.
+    """
+    level, experience = 1, 0
+    for xp_gained in awards:
+        level, experience = progression.gain_experience(level, experience, xp_gained)
+        minted.gain_experience(0, xp_gained, sender=default_account.address)
+        assert tuple(minted.query_character(0)) == (level, experience)
+
+
+def test_xp_required_for_level():
+    assert progression.xp_required_for_level(1) == 0
+    assert progression.xp_required_for_level(2) == 20
+    assert progression.xp_required_for_level(3) == 40
@@ -0,0 +1,135 @@
+import pytest
+from moccasin.config import get_active_network
+from components import roster as roster_module
+from components.contract_interaction import ROSTER_PAGE_SIZE, CharacterClient
+from components.roster import Roster
+
+base_uri = "https://ipfs.io/ipfs/"
+
+
+def serial_roster(client, owner):
+    """
+    The pre-batching access pattern: balanceOf, then tokenOfOwnerByIndex,
+    tokenURI and query_character one call at a time.
+    """
+    abi, rpc = client._abi, client.rpc
+    balance = rpc.eth_call(client.address, abi["balanceOf"], owner)
+    roster = []
+    for i in range(balance):
+        token_id = rpc.eth_call(client.address, abi["tokenOfOwnerByIndex"], owner, i)
+        token_uri = rpc.eth_call(client.address, abi["tokenURI"], token_id)
+        level, experience = rpc.eth_call(client.address, abi["query_character"], token_id)
+        roster.append((token_id, token_uri, level, experience))
+    return roster
+
+
+@pytest.mark.parametrize("n_characters", [1, 5, 25, 60])
+def test_roster_round_trips(character_contract, default_account, n_characters):
+    """
+    Benchmark: the batched roster loader needs a constant number of RPC round
+    trips per page of characters, and returns the same data as serial reads.
+    Run with `--network anvil -s` to measure against a local node.
+    """
+    for i in range(n_characters):
+        character_contract.create_character(default_account.address, f"cid{i}", sender=default_account.address)
+    character_contract.gain_experience(0, 25, sender=default_account.address)
+
+    client = CharacterClient(get_active_network(), character_contract.address)
+
+    client.rpc.round_trips = 0
+    roster = client.load_roster()
+    paged = client.rpc.round_trips
+
+    client.rpc.round_trips = 0
+    per_token = client._load_roster_per_token(default_account.address)
+    batched = client.rpc.round_trips
+
+    client.rpc.round_trips = 0
+    expected = serial_roster(client, default_account.address)
+    serial = client.rpc.round_trips
+
+    print(f"\nN={n_characters}: query_roster={paged}, per-token batched={batched}, serial={serial} round trips")
+    assert [tuple(entry) for entry in roster] == expected
+    assert [tuple(entry) for entry in per_token] == expected
+    assert roster[0].token_uri == base_uri + "cid0"
+    assert (roster[0].level, roster[0].experience) == (2, 5)
+    assert paged == (1 if n_characters <= ROSTER_PAGE_SIZE else 2)
+    assert batched == 3
+    assert serial == 1 + 3 * n_characters
+
+
+def test_roster_empty_wallet(character_contract):
+    """
+    A wallet without characters loads in a single round trip.
+    """
+    client = CharacterClient(get_active_network(), character_contract.address)
+    assert client.load_roster() == []
+    assert client.rpc.round_trips == 1
+
+
+def test_query_levels(character_contract, default_account):
+    """
+    query_levels reads the status of many characters in one call.
+    """
+    for i in range(3):
+        character_contract.create_character(default_account.address, f"cid{i}", sender=default_account.address)
+    character_contract.gain_experience(2, 25, sender=default_account.address)
+
+    client = CharacterClient(get_active_network(), character_contract.address)
+    assert client.query_levels([2, 0]) == [(2, 5), (1, 0)]
+    assert client.rpc.round_trips == 1
+
+
+def test_failed_load_is_not_an_empty_roster(monkeypatch):
+    """
+    A failed chain read raises instead of caching an empty roster, and keeps the
+    last loaded one.
+    """
+    results = iter([([{"name": "Aria"}], ["https://ipfs.io/ipfs/bafyaria"], [1]), None])
+    monkeypatch.setattr(roster_module, "query_characters", lambda: next(results))
+
+    roster = Roster()
+    assert [owned.token_id for owned in roster.characters()] == [1]
+    with pytest.raises(RuntimeError):
+        roster.refresh()
+    assert [owned.token_id for owned in roster.characters()] == [1]
+
+    monkeypatch.setattr(roster_module, "query_characters", lambda: None)
+    with pytest.raises(RuntimeError):
+        Roster().characters()
+
+
+def test_roster_loads_from_a_node_refusing_batches(character_contract, default_account):
+    """
+    Against a node that refuses JSON-RPC batches the roster is read one call at a
+    time, instead of being mistaken for a missing bulk view.
+    """
+    for i in range(3):
+        character_contract.create_character(default_account.address, f"cid{i}", sender=default_account.address)
+    client = CharacterClient(get_active_network(), character_contract.address)
+    transport = client.rpc.transport
+
+    def no_batches(payload):
+        if isinstance(payload, list):
+            return {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "batch not supported"}}
+        return transport(payload)
+
+    client.rpc.transport = no_batches
+    roster = client.load_roster()
+    assert [(entry.token_id, entry.token_uri) for entry in roster] == [(i, base_uri + f"cid{i}") for i in range(3)]
+    assert not client.rpc.batches
+
+
+def test_add_uses_what_creation_returned(monkeypatch):
+    """
+    A freshly minted character is added from its creation result, without reading
+    the chain or IPFS again.
+    """
+    monkeypatch.setattr(roster_module, "query_characters", lambda: ([], [], []))
+    roster = Roster()
+    assert roster.characters() == []
+
+    monkeypatch.setattr(roster_module, "query_characters", lambda: pytest.fail("roster reloaded"))
+    roster.add(4, "https://ipfs.io/ipfs/bafynew", {"name": "Brom", "attributes": [{"trait_type": "Level", "value": 1}]})
+    [owned] = roster.characters()
+    assert (owned.token_id, owned.token_uri, owned.character.name) == (4, "https://ipfs.io/ipfs/bafynew", "Brom")
@@ -0,0 +1,77 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from components.rpc import ContractReverted, HttpTransport, RpcClient, RpcError
+
+
+@pytest.fixture
+def node():
+    """
+    HTTP JSON-RPC node answering eth_blockNumber; batches are refused the way
+    `node.batches` says: "http" with HTTP 400, "object" with a single error object.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            status, body = 200, None
+            if self.path != "/":
+                status, body = 404, {"error": "not found"}
+            elif not isinstance(payload, list):
+                server.singles += 1
+                body = {"jsonrpc": "2.0", "id": payload["id"], "result": "0x10"}
+            elif server.batches == "http":
+                status, body = 400, {"error": "batch requests are not supported"}
+            else:
+                body = {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "batch not supported"}}
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.batches = "http"
+    server.singles = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("refusal", ["http", "object"])
+def test_refused_batches_fall_back_to_single_requests(node, refusal):
+    """
+    A node refusing batches, with an HTTP error or a single error object, gets the
+    calls one by one; later batches skip the refused round trip.
+    """
+    node.batches = refusal
+    rpc = RpcClient(HttpTransport(f"http://127.0.0.1:{node.server_address[1]}"))
+    assert rpc.batch([("eth_blockNumber", []), ("eth_blockNumber", [])]) == ["0x10", "0x10"]
+    assert node.singles == 2 and rpc.round_trips == 3
+    assert rpc.batch([("eth_blockNumber", [])]) == ["0x10"]
+    assert rpc.round_trips == 4
+
+
+def test_http_errors_raise_rpc_errors(node):
+    rpc = RpcClient(HttpTransport(f"http://127.0.0.1:{node.server_address[1]}/missing"))
+    with pytest.raises(RpcError, match="HTTP 404"):
+        rpc.request("eth_blockNumber", [])
+
+
+def test_reverted_call_in_a_batch_is_not_retried():
+    """
+    A call reverting inside a batch raises ContractReverted and keeps batching on.
+    """
+    def transport(payload):
+        return [{"jsonrpc": "2.0", "id": p["id"], "error": {"code": 3, "message": "execution reverted"}}
+                for p in payload]
+
+    rpc = RpcClient(transport)
+    with pytest.raises(ContractReverted):
+        rpc.batch([("eth_call", [{}, "latest"])])
+    assert rpc.batches and rpc.round_trips == 1
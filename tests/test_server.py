@@ -0,0 +1,47 @@
+import asyncio
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from script import server
+
+
+class Player:
+    """
+    Line-based client side of a connection: answers the server's signature prompt by
+    signing the challenge it shows with `account`.
+    """
+
+    def __init__(self, account):
+        self.account = account
+        self.shown = ""
+
+    def write(self, data: bytes):
+        self.shown += data.decode()
+
+    async def drain(self):
+        pass
+
+    async def readline(self) -> bytes:
+        challenge = self.shown.splitlines()[-2]
+        signed = self.account.sign_message(encode_defunct(text=challenge))
+        return ("0x" + signed.signature.hex().removeprefix("0x") + "\n").encode()
+
+
+def test_only_the_owner_can_play(monkeypatch):
+    """
+    A character is only opened for a player who signs the challenge with the wallet
+    owning it.
+    """
+    owner, other = Account.create(), Account.create()
+    monkeypatch.setattr(server, "query_owner", lambda token_id: owner.address)
+
+    player = Player(owner)
+    assert asyncio.run(server.verify_owner(player, player, 7))
+    assert "Play character 7 " in player.shown
+
+    intruder = Player(other)
+    assert not asyncio.run(server.verify_owner(intruder, intruder, 7))
+    assert not server.signed_by("Play character 7", "not a signature", owner.address)
+
+
+def test_challenges_are_not_reused():
+    assert server.ownership_challenge(7) != server.ownership_challenge(7)
@@ -0,0 +1,35 @@
+import subprocess
+import sys
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+
+# Packages only needed once a character is created or an adventure starts
+HEAVY_PACKAGES = ("langchain", "langchain_core", "langchain_openai", "openai", "moccasin", "boa")
+STARTUP_BUDGET = 1.5    # seconds, generous for slow CI machines
+
+
+def import_times(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root_dir, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative) / 1_000_000
+    return times
+
+
+def test_game_menu_starts_without_the_llm_stack():
+    """
+    Benchmark: importing the game only loads what the menu needs; LangChain, OpenAI
+    and moccasin are imported once an adventure or a character creation starts.
+    """
+    times = import_times("script.game")
+    heavy = sorted(name for name in times if name.split(".")[0] in HEAVY_PACKAGES)
+    print(f"\nscript.game imported in {times['script.game']:.2f}s")
+    assert heavy == []
+    assert times["script.game"] < STARTUP_BUDGET
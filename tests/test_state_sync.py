@@ -0,0 +1,184 @@
+import time
+from components import state_sync
+from components.character_state import CharacterState
+from components.ipfs_cache import content_cid, get_cache
+from components.state_sync import CharacterSync
+from components.tx_submitter import CONFIRMED, FAILED, TxHandle
+
+
+def make_status(hp=10):
+    return CharacterState("Aria", level=1, experience=0, hit_point=hp)
+
+
+def test_turns_are_coalesced(calls):
+    """
+    Several state-changing turns are applied locally at once and written with a
+    single pin and a single change_character.
+    """
+    status = make_status()
+    sync = CharacterSync(status, "https://ipfs.io/ipfs/bafyold", 7, flush_every=3, flush_interval=60)
+    sync.record(10, 0)
+    sync.record(0, -2)
+    assert status.hit_point == 8
+    assert calls == []
+
+    sync.record(15, -1)
+    sync.close()
+    cid = content_cid(status.to_json())
+    assert calls == [
+        ("gain_xp", 7, 25),
+        ("query_level", 7),
+        ("change_character", 7, cid),   # with the locally computed CID, before the pin
+        ("pin", 7),
+        ("unpin", "bafyold"),   # only once the new URI is pinned and confirmed
+    ]
+    assert (status.level, status.experience) == (2, 5)
+    assert sync.token_uri == cid
+
+
+def test_level_is_predicted_locally(calls):
+    """
+    Level and experience are updated as soon as XP is awarded, before any chain read.
+    """
+    status = make_status()
+    sync = CharacterSync(status, "bafyold", 7, flush_every=10, flush_interval=60)
+    sync.record(25, 0)
+    assert (status.level, status.experience) == (2, 5)
+    assert calls == []
+    sync.close()
+
+
+def test_chain_mismatch_is_corrected(calls, monkeypatch):
+    """
+    If the chain disagrees with the prediction, the chain wins and the metadata is re-pinned.
+    """
+    monkeypatch.setattr(state_sync, "query_level", lambda token_id: (3, 1))
+    status = make_status()
+    sync = CharacterSync(status, "bafyold", 7, flush_every=1, flush_interval=60)
+    sync.record(25, 0)
+    sync.close()
+    assert (status.level, status.experience) == (3, 1)
+    changes = [c for c in calls if c[0] == "change_character"]
+    assert len(changes) == 2
+    assert changes[-1] == ("change_character", 7, content_cid(status.to_json()))
+    assert [c for c in calls if c[0] == "unpin"] == [("unpin", "bafyold"), ("unpin", changes[0][2])]
+
+
+def test_no_change_turns_do_not_write(calls):
+    sync = CharacterSync(make_status(), "bafyold", 7, flush_every=1, flush_interval=60)
+    sync.record(0, 0)
+    sync.close()
+    assert calls == []
+
+
+def test_unchanged_metadata_is_not_repinned(calls):
+    """
+    Changes that cancel out before a flush leave the same document, and so the same
+    CID: nothing is pinned or set on chain.
+    """
+    sync = CharacterSync(make_status(), "bafyold", 7, flush_every=2, flush_interval=60)
+    sync.record(0, -2)
+    sync.record(0, 2)
+    sync.update(name="Aria")
+    sync.close()
+    assert calls == []
+
+
+def test_failed_pin_is_retried(calls, monkeypatch):
+    """
+    If the pin fails after the new CID was set on chain, the next flush pins it again,
+    and the previous pin is kept until then.
+    """
+    failures = [None]
+    pin = state_sync.update_ipfs_metadata
+
+    def flaky_pin(metadata, document):
+        cid = pin(metadata, document)
+        return failures.pop() if failures else cid
+
+    monkeypatch.setattr(state_sync, "update_ipfs_metadata", flaky_pin)
+    status = make_status()
+    sync = CharacterSync(status, "bafyold", 7, flush_every=1, flush_interval=60)
+    sync.record(0, -1)
+    cid = content_cid(status.to_json())
+    assert ("unpin", "bafyold") not in calls
+    sync.close()
+    assert calls == [("change_character", 7, cid), ("pin", 9), ("pin", 9), ("unpin", "bafyold")]
+
+
+def test_unpinned_metadata_is_kept_locally(calls, monkeypatch, capsys):
+    """
+    Until the pin succeeds, the document the token points at is in the local cache;
+    if it never does, close() says so.
+    """
+    monkeypatch.setattr(state_sync, "update_ipfs_metadata", lambda metadata, document: None)
+    status = make_status()
+    sync = CharacterSync(status, "bafyold", 7, flush_every=1, flush_interval=60)
+    sync.record(0, -1)
+    cid = content_cid(status.to_json())
+    assert get_cache().get(cid) == status.to_metadata()
+    sync.close()
+    assert calls == [("change_character", 7, cid)]
+    assert f"token 7 points at {cid}, which could not be pinned" in capsys.readouterr().out
+
+
+def test_mismatched_pin_updates_the_token_uri(calls, monkeypatch):
+    """
+    If Pinata stores the document under another CID, the token is pointed at that one.
+    """
+    monkeypatch.setattr(state_sync, "update_ipfs_metadata", lambda metadata, document: "bafyother")
+    status = make_status()
+    sync = CharacterSync(status, "bafyold", 7, flush_every=1, flush_interval=60)
+    sync.record(0, -1)
+    sync.close()
+    assert calls == [
+        ("change_character", 7, content_cid(status.to_json())),
+        ("change_character", 7, "bafyother"),
+        ("unpin", "bafyold"),
+    ]
+    assert sync.token_uri == "bafyother"
+
+
+def test_death_burns_immediately(calls):
+    """
+    A fatal turn burns the character right away and drops the pending writes; the
+    burned character's pin is released once the burn is confirmed.
+    """
+    sync = CharacterSync(make_status(hp=3), "bafyold", 7, flush_every=10, flush_interval=60)
+    sync.record(10, 0)
+    sync.record(0, -5)
+    assert calls == [("burn", 7), ("unpin", "bafyold")]
+    sync.close()
+    assert calls == [("burn", 7), ("unpin", "bafyold")]
+
+
+def test_failed_burn_is_retried(calls, monkeypatch):
+    """
+    A burn that fails keeps the dead character pending, so the next flush sends it again.
+    """
+    burns = [FAILED]
+
+    def flaky_burn(token_id):
+        calls.append(("burn", token_id))
+        handle = TxHandle("kill_character", (token_id,))
+        handle._finish(burns.pop() if burns else CONFIRMED, error="reverted")
+        return handle
+
+    monkeypatch.setattr(state_sync, "burn_character", flaky_burn)
+    sync = CharacterSync(make_status(hp=3), "bafyold", 7, flush_every=10, flush_interval=60)
+    sync.record(0, -5)
+    assert not sync.burned and sync.pending()
+    sync.close()
+    assert sync.burned
+    assert calls == [("burn", 7), ("burn", 7), ("unpin", "bafyold")]
+
+
+def test_timer_flushes(calls):
+    sync = CharacterSync(make_status(), "bafyold", 7, flush_every=10, flush_interval=0.05)
+    sync.record(0, -1)
+    for _ in range(100):
+        if calls:
+            break
+        time.sleep(0.02)
+    sync.close()
+    assert ("pin", 9) in calls
@@ -0,0 +1,177 @@
+import asyncio
+import itertools
+import time
+import pytest
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from components.character_state import CharacterState
+from components.create_story import DUNGEON_MASTER_PROMPT, StoryEngine
+
+
+def make_character(name, hp=10):
+    return CharacterState(name, level=1, experience=0, hit_point=hp, strength=12, dexterity=14,
+                          constitution=10, intelligence=8, wisdom=11, charisma=13)
+
+
+class FakeDungeonMaster(GenericFakeChatModel):
+    """
+    Streams a fixed response word by word, then its token usage; tools are accepted
+    and ignored, so the deltas reach the engine through the text fallback.
+    """
+
+    usage: dict | None = None
+    prompts: list = []
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages)
+        yield from super()._stream(messages, stop, run_manager, **kwargs)
+        if self.usage:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self.usage))
+
+
+@pytest.fixture
+def engine(calls):
+    response = AIMessage(content='A goblin {snarls} and falls. { "xp_gained": 10, "hp_change": -1 }')
+    usage = {"input_tokens": 1200, "output_tokens": 40, "total_tokens": 1240,
+             "input_token_details": {"cache_read": 1024}}
+    llm = FakeDungeonMaster(messages=itertools.repeat(response), usage=usage, prompts=[])
+    engine = StoryEngine(llm=llm, flush_interval=60)
+    yield engine
+    engine.shutdown()
+
+
+async def play_turns(engine, session, turns):
+    responses = []
+    for turn in range(turns):
+        chunks = [chunk async for chunk in engine.astream_turn(session.session_id, f"turn {turn}")]
+        responses.append("".join(chunks))
+    return responses
+
+
+def test_concurrent_sessions_are_isolated(engine, calls):
+    """
+    Adventures played concurrently on one engine keep their own character state and
+    history, and each character's changes are written to its own token.
+    """
+    aria = engine.open_session(make_character("Aria"), "https://ipfs.io/ipfs/bafyaria", 1)
+    brom = engine.open_session(make_character("Brom"), "https://ipfs.io/ipfs/bafybrom", 2)
+
+    async def play_both():
+        return await asyncio.gather(play_turns(engine, aria, 3), play_turns(engine, brom, 2))
+
+    aria_responses, brom_responses = asyncio.run(play_both())
+    assert aria_responses == ["A goblin {snarls} and falls."] * 3
+    assert len(brom_responses) == 2
+    assert aria.character.hit_point == 7
+    assert brom.character.hit_point == 8
+    assert len(aria.history.recent) == 6 and len(brom.history.recent) == 4
+    assert aria.history.messages[0].content == brom.history.messages[0].content == DUNGEON_MASTER_PROMPT
+
+    engine.close_session(aria.session_id)
+    engine.close_session(brom.session_id)
+    assert ("gain_xp", 1, 30) in calls and ("gain_xp", 2, 20) in calls
+    assert engine.sessions == {}
+
+
+def test_stream_turn(engine, calls):
+    session = engine.open_session(make_character("Aria"), "https://ipfs.io/ipfs/bafyaria", 1)
+    assert "".join(engine.stream_turn(session.session_id, "I attack")) == "A goblin {snarls} and falls."
+    assert engine.invoke_turn(session.session_id, "Again") == "A goblin {snarls} and falls."
+    assert session.character.hit_point == 8
+
+
+def test_character_plays_one_session_at_a_time(engine, calls):
+    engine.open_session(make_character("Aria"), "https://ipfs.io/ipfs/bafyaria", 1)
+    with pytest.raises(ValueError):
+        engine.open_session(make_character("Aria"), "https://ipfs.io/ipfs/bafyaria", 1)
+
+
+def test_timer_outlives_a_failing_session(calls):
+    """
+    A session whose flush fails (e.g. closed while the timer was going through the
+    sessions) does not stop the periodic flush of the others.
+    """
+    engine = StoryEngine(llm=FakeDungeonMaster(messages=iter(()), prompts=[]), flush_interval=0.02)
+    aria = engine.open_session(make_character("Aria"), "https://ipfs.io/ipfs/bafyaria", 1)
+    brom = engine.open_session(make_character("Brom"), "https://ipfs.io/ipfs/bafybrom", 2)
+
+    def closed_flush():
+        raise RuntimeError("cannot schedule new futures after shutdown")
+
+    aria.sync.flush = closed_flush
+    aria.sync.update(adventure_log="Aria left")
+    brom.sync.update(adventure_log="Brom fought a goblin")
+    for _ in range(100):
+        if any(call[0] == "change_character" for call in calls):
+            break
+        time.sleep(0.02)
+    assert [call[1] for call in calls if call[0] == "change_character"] == [2]
+    assert engine._timer.is_alive()
+
+    del aria.sync.flush
+    engine.shutdown()
+
+
+class ToolCallOnlyDungeonMaster(FakeDungeonMaster):
+    """Replies with only a TurnOutcome tool call and no text, as OpenAI models often do."""
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages)
+        args = '{"xp_gained": 5, "hp_change": -2, "narrative": "The trap snaps shut on your leg."}'
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+            {"name": "TurnOutcome", "args": args, "id": "call_0", "index": 0}]))
+
+
+def test_tool_call_only_reply_shows_its_narrative(calls):
+    """
+    A reply that is only a tool call shows the call's narrative field, which is also
+    what goes into the history, and its deltas are applied.
+    """
+    engine = StoryEngine(llm=ToolCallOnlyDungeonMaster(messages=iter(()), prompts=[]), flush_interval=60)
+    session = engine.open_session(make_character("Aria"), "https://ipfs.io/ipfs/bafyaria", 1)
+    assert "".join(engine.stream_turn(session.session_id, "I open the chest")) == "The trap snaps shut on your leg."
+    assert session.character.hit_point == 8 and session.character.experience == 5
+    assert session.history.messages[-1].content == "The trap snaps shut on your leg."
+    engine.shutdown()
+
+
+def test_prompt_prefix_is_stable(engine, calls):
+    """
+    Each turn's prompt extends the previous one: the shared rules and the history come
+    first, and only the live character state and the new input follow them.
+    """
+    session = engine.open_session(make_character("Aria"), "https://ipfs.io/ipfs/bafyaria", 1)
+    for turn in range(3):
+        "".join(engine.stream_turn(session.session_id, f"turn {turn}"))
+
+    prompts = engine.llm.prompts
+    for previous, current in zip(prompts, prompts[1:]):
+        prefix = previous[:-2]      # without the state message and the input
+        assert current[:len(prefix)] == prefix
+    assert prompts[0][0].content == DUNGEON_MASTER_PROMPT
+    assert prompts[1][-2].content.startswith("Character state: Aria | Level 1 | XP 10 | HP 9")
+    assert prompts[2][-2].content.startswith("Character state: Aria | Level 2 | XP 0 | HP 8")
+
+    assert [usage.uncached_tokens for usage in session.turn_usage] == [176] * 3
+    assert session.usage.cached_tokens == 3 * 1024
+    assert engine.usage.turns == 3
+
+
+def test_session_is_traced_per_turn(engine, calls):
+    """
+    Each turn's model call and the writes it triggers are timed for the session, and
+    summarized when it closes.
+    """
+    session = engine.open_session(make_character("Aria"), "https://ipfs.io/ipfs/bafyaria", 1)
+    for turn in range(3):
+        "".join(engine.stream_turn(session.session_id, f"turn {turn}"))
+    engine.close_session(session.session_id)
+
+    stages = session.trace.stages
+    assert stages["llm.turn"][0] == 3
+    assert stages["tx.gain_xp"][0] == 1 and stages["tx.change_character"][0] >= 1
+    assert session.trace.counters["cached_tokens"] == 3 * 1024
@@ -0,0 +1,82 @@
+import json
+import pytest
+from moccasin.config import get_active_network
+from components import tracing
+from components.contract_interaction import CharacterClient
+from components.tracing import Tracer, current_span, turn_context
+
+
+@pytest.fixture
+def tracer(tmp_path, monkeypatch):
+    """
+    Installs a tracer exporting to a temporary file as the shared tracer.
+    """
+    tracer = Tracer(tmp_path / "trace.jsonl")
+    monkeypatch.setattr(tracing, "_tracer", tracer)
+    yield tracer
+    tracer.close()
+
+
+def exported(tracer):
+    tracer.close()
+    return [json.loads(line) for line in tracer.path.read_text().splitlines()]
+
+
+def test_spans_are_exported_and_summarized_per_session(tracer):
+    tracer.begin_session("s1")
+    with turn_context("s1", 3):
+        with tracer.span("pinata.pinJSONToIPFS") as span:
+            current_span().count("bytes_sent", 120)
+            span.count("retries")
+        with pytest.raises(RuntimeError):
+            with tracer.span("rpc.eth_call"):
+                raise RuntimeError("execution reverted")
+    with tracer.span("ipfs.get"):
+        pass
+
+    summary = tracer.end_session("s1")
+    assert summary.stages["pinata.pinJSONToIPFS"][0] == 1
+    assert summary.stages["rpc.eth_call"][2] == 1
+    assert "ipfs.get" not in summary.stages
+    assert summary.counters == {"bytes_sent": 120, "retries": 1}
+    assert str(summary).splitlines()[0].split() == ["stage", "calls", "total", "mean", "errors"]
+
+    spans = exported(tracer)
+    assert [(span["name"], span["session"], span["turn"]) for span in spans] == [
+        ("pinata.pinJSONToIPFS", "s1", 3), ("rpc.eth_call", "s1", 3), ("ipfs.get", None, None)
+    ]
+    assert spans[1]["error"] == "execution reverted"
+    assert current_span() is None
+
+
+def test_pinata_requests_count_retries_and_bytes(tracer, pinata, ipfs_standin):
+    ipfs_standin.api_failures = [503]
+    pinata.pin_json({"name": "Aria"})
+
+    (span,) = exported(tracer)
+    assert span["name"] == "pinata.pinJSONToIPFS"
+    assert span["counters"]["retries"] == 1
+    assert span["counters"]["bytes_sent"] > 0 and span["counters"]["bytes_received"] > 0
+
+
+def test_trace_path_is_read_on_first_use(tmp_path, monkeypatch):
+    """
+    TRACE_PATH set after import (e.g. from .env) turns exporting on.
+    """
+    monkeypatch.setattr(tracing, "_tracer", None)
+    monkeypatch.setenv("TRACE_PATH", str(tmp_path / "trace.jsonl"))
+    tracer = tracing.get_tracer()
+    assert tracer.path == tmp_path / "trace.jsonl"
+    tracer.close()
+
+
+def test_level_reads_are_traced(tracer, character_contract, default_account):
+    """
+    Status reads made while a turn is played show up in that turn's trace.
+    """
+    client = CharacterClient(get_active_network(), character_contract.address)
+    character_contract.create_character(default_account.address, "cid0", sender=default_account.address)
+    tracer.begin_session("s1")
+    with turn_context("s1", 1):
+        assert client.query_level(0) == (1, 0)
+    assert tracer.end_session("s1").stages["rpc.eth_call"][0] == 1
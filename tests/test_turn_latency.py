@@ -0,0 +1,213 @@
+"""
+End-to-end turn latency benchmark. Adventures are played through the game's own
+flow (script.game.play -> start_conversation) against a scripted Dungeon Master, the
+IPFS/Pinata stand-in and the Character contract on pyevm. Latency is reported per
+turn type and per subsystem. The report goes to the test's tmp_path; set
+BENCHMARK_OUT to a path to keep it (e.g. .cache/benchmarks/turn_latency.json).
+
+To guard against regressions, keep a report from a known-good commit and point
+TURN_LATENCY_BASELINE at it: the run then fails when a p95 gets much worse.
+
+    BENCHMARK_OUT=.cache/benchmarks/turn_latency.json mox test tests/test_turn_latency.py -s
+"""
+import builtins
+import json
+import os
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+import pytest
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from moccasin.config import get_active_network
+from components import create_story, pin_gc, state_sync
+from components.character_state import CharacterState
+from components.contract_interaction import CharacterClient
+from components.create_story import StoryEngine
+from components.ipfs_connection import character_metadata, upload_ipfs
+from components.pin_gc import PinCollector
+from components.roster import OwnedCharacter, Roster
+from script import game
+
+root_dir = Path(__file__).parent.parent
+# A p95 may grow by this factor over the baseline, plus an absolute slack since the
+# fastest steps move by a few milliseconds from run to run
+REGRESSION_FACTOR = 1.5
+REGRESSION_SLACK = 0.010
+
+CHARACTERS = 6
+# Each adventure plays these turns, then dies
+ADVENTURE = ["no change", "xp gain", "hp loss"] * 4
+RESPONSES = {
+    "no change": 'You look around the misty hall. { "xp_gained": 0, "hp_change": 0 }',
+    "xp gain": 'The goblin falls to your blade. { "xp_gained": 15, "hp_change": 0 }',
+    "hp loss": 'An arrow grazes your arm. { "xp_gained": 0, "hp_change": -1 }',
+    "death": 'The dragon\'s fire engulfs you. { "xp_gained": 0, "hp_change": -100 }',
+}
+
+
+class Timings:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self.lock:
+            self.samples[name].append(seconds)
+
+    # Wrap a function so each call's duration is recorded under `name`
+    def timed(self, name, fn):
+        def wrapper(*args):
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self.add(name, time.perf_counter() - start)
+        return wrapper
+
+    # Wrap a transaction submitter so the time until its handle settles is recorded
+    def timed_transaction(self, name, fn):
+        def wrapper(*args):
+            start = time.perf_counter()
+            handle = fn(*args)
+            handle.add_done_callback(lambda handle: self.add(name, time.perf_counter() - start))
+            return handle
+        return wrapper
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ScriptedDungeonMaster(GenericFakeChatModel):
+    """
+    Answers each player action with the response scripted for it, and anything else
+    (adventure summaries) with a fixed text. Tools are accepted and ignored, so the
+    deltas reach the engine through the text fallback.
+    """
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        content = RESPONSES.get(messages[-1].content, "The hero braved the dungeon.")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+
+# A freshly created character, before character_metadata turns it into token metadata
+def new_character(name: str) -> dict:
+    attributes = {"strength": 12, "dexterity": 14, "constitution": 10,
+                  "intelligence": 8, "wisdom": 11, "charisma": 13}
+    return {"name": name, "description": "A wandering sellsword", "image": "ipfs://bafyimage",
+            "attributes": attributes}
+
+
+@pytest.fixture
+def timings():
+    return Timings()
+
+
+@pytest.fixture
+def client(character_contract, pinata, tmp_path, timings, monkeypatch):
+    """
+    Character writes go to the deployed contract and the Pinata stand-in, timed.
+    """
+    client = CharacterClient(get_active_network(), character_contract.address)
+    collector = PinCollector(tmp_path / "pin_gc.sqlite", interval=60)
+    monkeypatch.setattr(state_sync, "get_pin_collector", lambda: collector)
+    monkeypatch.setattr(pin_gc, "query_token_uri", client.token_uri)
+    monkeypatch.setattr(state_sync, "update_ipfs_metadata", timings.timed("pin", state_sync.update_ipfs_metadata))
+    monkeypatch.setattr(state_sync, "gain_xp", timings.timed_transaction("gain_xp", client.gain_xp))
+    monkeypatch.setattr(state_sync, "change_character", timings.timed_transaction("change_character", client.change_character))
+    monkeypatch.setattr(state_sync, "burn_character", timings.timed_transaction("burn", client.burn_character))
+    monkeypatch.setattr(state_sync, "query_level", timings.timed("query_level", client.query_level))
+    monkeypatch.setattr(create_story.AdventureSession, "save_adventure_summary",
+                        timings.timed("summary", create_story.AdventureSession.save_adventure_summary))
+    yield client
+    collector.close()
+
+
+@pytest.fixture
+def engine(client, monkeypatch):
+    engine = StoryEngine(llm=ScriptedDungeonMaster(messages=iter(())), flush_interval=60)
+    monkeypatch.setattr(create_story, "_engine", engine)
+    yield engine
+    engine.shutdown()
+
+
+# Play one adventure through the game's menu flow, timing each turn from the player's
+# input until the game asks for the next one
+def play_adventure(owned: OwnedCharacter, timings: Timings, monkeypatch):
+    actions = iter(ADVENTURE + ["death", "exit"])
+    last = None
+
+    def scripted_input(prompt=""):
+        nonlocal last
+        now = time.perf_counter()
+        if last is not None:
+            timings.add(f"turn: {last[0]}", now - last[1])
+        action = next(actions)
+        last = (action, time.perf_counter())
+        return action
+
+    monkeypatch.setattr(builtins, "input", scripted_input)
+    monkeypatch.setattr(builtins, "print", lambda *args, **kwargs: None)
+    game.play(Roster(), owned)
+
+
+def commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root_dir,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def test_turn_latency(engine, client, timings, monkeypatch, tmp_path):
+    """
+    Benchmark: p50/p95 latency of each turn type as the player sees it, and of each
+    subsystem behind it (pinning, chain transactions and reads, the adventure summary).
+    """
+    for i in range(CHARACTERS):
+        character = new_character(f"Hero {i}")
+        token_uri = upload_ipfs(character)
+        token_id = client.mint_character(character, token_uri)
+        state = CharacterState.from_metadata(character_metadata(character))
+        with monkeypatch.context() as patch:
+            play_adventure(OwnedCharacter(token_id, token_uri, state), timings, patch)
+        assert not state.alive
+        assert client.rpc.eth_call(client.address, client._abi["balanceOf"], client._owner()) == 0
+
+    report = {
+        "commit": commit(),
+        "latency": {
+            name: {"n": len(samples), "p50": percentile(samples, 0.5), "p95": percentile(samples, 0.95)}
+            for name, samples in sorted(timings.samples.items())
+        },
+    }
+    report_path = Path(os.getenv("BENCHMARK_OUT") or tmp_path / "turn_latency.json")
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report_path.write_text(json.dumps(report, indent=2))
+
+    print(f"\nTurn latency at {report['commit']} ({report_path}):")
+    for name, stats in report["latency"].items():
+        print(f"  {name:<20} n={stats['n']:<4} p50={stats['p50'] * 1000:8.2f}ms  p95={stats['p95'] * 1000:8.2f}ms")
+
+    for turn in RESPONSES:
+        assert report["latency"][f"turn: {turn}"]["n"] > 0
+    for subsystem in ["pin", "gain_xp", "change_character", "burn", "summary"]:
+        assert report["latency"][subsystem]["n"] > 0
+
+    baseline_path = os.getenv("TURN_LATENCY_BASELINE")
+    if baseline_path:
+        baseline = json.loads(Path(baseline_path).read_text())["latency"]
+        regressions = [
+            f"{name}: p95 {stats['p95'] * 1000:.2f}ms vs {baseline[name]['p95'] * 1000:.2f}ms"
+            for name, stats in report["latency"].items()
+            if name in baseline and stats["p95"] > baseline[name]["p95"] * REGRESSION_FACTOR + REGRESSION_SLACK
+        ]
+        assert not regressions, "\n".join(regressions)
@@ -0,0 +1,128 @@
+import json
+import random
+import re
+import time
+from components.turn_output import NarrativeFilter, TurnOutcome, turn_outcome
+
+RESPONSE = (
+    "The goblin lunges {snarling} at you. You roll a 17 and your blade bites deep.\n\n"
+    "1. Press the attack\n2. Retreat to the door\n3. Search the {strange} altar\n\n"
+    '{ "xp_gained": 20, "hp_change": -4 }\n'
+)
+NARRATIVE = RESPONSE[:RESPONSE.index('{ "xp')].strip()
+
+
+def stream(text, chunks):
+    cuts = sorted(random.sample(range(1, len(text)), chunks - 1))
+    pieces = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+    narrative = NarrativeFilter()
+    shown = [narrative.feed(piece) for piece in pieces]
+    shown.append(narrative.finish())
+    return narrative, shown
+
+
+def test_state_block_is_withheld_for_any_chunking():
+    """
+    Whatever the token boundaries, the displayed text is exactly the narrative: braces
+    inside the story pass through and the trailing XP/HP block is never shown.
+    """
+    random.seed(12)
+    for chunks in range(2, 60):
+        narrative, shown = stream(RESPONSE, chunks)
+        assert "".join(shown) == NARRATIVE
+        assert narrative.state_blocks == ['{ "xp_gained": 20, "hp_change": -4 }']
+        assert narrative.narrative() == NARRATIVE
+        assert narrative.text == RESPONSE
+
+
+def test_narrative_is_not_held_back():
+    """
+    Text before a brace is released immediately, so the first tokens reach the
+    terminal without waiting for the rest of the response.
+    """
+    narrative = NarrativeFilter()
+    assert narrative.feed("  You enter") == "You enter"
+    assert narrative.feed(" the hall. ") == " the hall."
+    assert narrative.feed("{ ") == ""   # could be the state block
+    assert narrative.feed('"hp_') == ""
+    assert narrative.feed('change": 0, "xp_gained": 5 }') == ""
+    assert narrative.finish() == ""
+    assert narrative.state_blocks == ['{ "hp_change": 0, "xp_gained": 5 }']
+
+
+def test_unterminated_state_block_is_dropped():
+    narrative = NarrativeFilter()
+    assert narrative.feed('Quiet. {"xp_gained": 3') == "Quiet."
+    assert narrative.finish() == ""
+    assert narrative.state_blocks == ['{"xp_gained": 3']
+
+
+STORY = (
+    "The torchlight flickers over runes that read {VAULT OF ASH}. You roll a 14 and the "
+    "skeleton's shield splinters under your blow.\n\n1. Take the left passage\n"
+    "2. Read the runes aloud\n3. Rest and bind your wounds\n"
+)
+
+
+def tool_call(**args):
+    return [{"name": "TurnOutcome", "args": args, "id": "call_0", "type": "tool_call"}]
+
+
+# (response text, tool calls, expected (xp_gained, hp_change))
+CORPUS = [
+    (STORY + '{ "xp_gained": 20, "hp_change": -4 }', [], (20, -4)),
+    (STORY + '\n{\n  "xp_gained": 5,\n  "hp_change": 0\n}\n', [], (5, 0)),
+    (STORY + '{ "hp_change": -7, "xp_gained": 0 }', [], (0, -7)),
+    (STORY + "{'xp_gained': 12, 'hp_change': -3}", [], (12, -3)),
+    (STORY + '{ "xp_gained": 8, "hp_change": 2, }', [], (8, 2)),
+    (STORY + '{ "xp_gained": "15", "hp_change": "-1" }', [], (15, -1)),
+    (STORY, tool_call(xp_gained=30, hp_change=-6), (30, -6)),
+    (STORY, tool_call(hp_change=-2), (0, -2)),
+    (STORY + '{ "xp_gained": 1, "hp_change": 1 }', tool_call(xp_gained=4, hp_change=0), (4, 0)),
+    (STORY, tool_call(xp_gained=-50, hp_change=-1), (0, -1)),   # negative XP is clamped, the damage still applies
+    (STORY + '{ "xp_gained": -5, "hp_change": 0 }', [], (0, 0)),
+    (STORY, [], (0, 0)),
+]
+
+
+# The regex scraping this module replaced, for comparison
+def regex_parse(text):
+    match = re.search(r'\{.*?\}', text.strip().replace("\n", " "), re.DOTALL)
+    try:
+        data = json.loads(match.group(0))
+        return int(data.get("xp_gained", 0)), int(data.get("hp_change", 0))
+    except Exception:
+        return 0, 0
+
+
+def parse_streamed(text, tool_calls, token_size=4):
+    narrative = NarrativeFilter()
+    shown = [narrative.feed(text[i:i + token_size]) for i in range(0, len(text), token_size)]
+    shown.append(narrative.finish())
+    outcome = turn_outcome(tool_calls, narrative)
+    return (outcome.xp_gained, outcome.hp_change), "".join(shown)
+
+
+def test_turn_outcome_corpus_accuracy_and_throughput():
+    """
+    Every response in the corpus yields the right deltas in a single pass over its
+    stream, and the displayed narrative never contains the state block.
+    """
+    rounds = 200
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text, tool_calls, expected in CORPUS:
+            deltas, shown = parse_streamed(text, tool_calls)
+            assert deltas == expected, text
+            assert shown == STORY.strip()
+    elapsed = time.perf_counter() - start
+
+    parsed = rounds * len(CORPUS)
+    regex_correct = sum(regex_parse(text) == expected for text, tool_calls, expected in CORPUS)
+    print(f"\n{parsed / elapsed:.0f} streamed turns/s; regex scraping got {regex_correct}/{len(CORPUS)} right")
+    assert parsed / elapsed > 200
+
+
+def test_turn_outcome_schema():
+    assert TurnOutcome.model_json_schema()["properties"]["xp_gained"]["minimum"] == 0
+    assert turn_outcome(tool_call(xp_gained=3, hp_change=-1), NarrativeFilter()) == TurnOutcome(xp_gained=3, hp_change=-1)
@@ -0,0 +1,192 @@
+import threading
+import time
+import pytest
+import rlp
+from eth_account import Account
+from components.contract_interaction import ABI
+from components.rpc import RpcClient
+from components.tx_submitter import CONFIRMED, FAILED, PENDING, TX_REBROADCASTS, TransactionSubmitter
+
+CONTRACT = "0x7C4b6ad0828dAE64c1678D624f94FAc3C2912db2"
+
+
+class FakeNode:
+    """
+    Minimal JSON-RPC node: accepts raw transactions and only produces receipts
+    once a test "mines" them.
+    """
+    def __init__(self, nonce=5):
+        self.nonce = nonce
+        self.sent = []              # raw transactions in arrival order
+        self.receipts = {}          # tx hash -> receipt
+        self.dropped = set()        # indexes of sent transactions the node forgot
+        self.rebroadcasts = []      # raw transactions sent again
+        self.reject_next = False
+        self.refuse_batches = False
+        self.receipts_fail = False  # every receipt request errors
+        self.lock = threading.Lock()
+
+    def __call__(self, payload):
+        if isinstance(payload, list):
+            if self.refuse_batches:
+                return {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "batch not supported"}}
+            return [self._handle(p) for p in payload]
+        return self._handle(payload)
+
+    def _handle(self, payload):
+        method, params = payload["method"], payload["params"]
+        result = None
+        if method == "eth_getTransactionReceipt" and self.receipts_fail:
+            return {"jsonrpc": "2.0", "id": payload["id"], "error": {"code": -32603, "message": "internal error"}}
+        with self.lock:
+            if method == "eth_chainId":
+                result = hex(31337)
+            elif method == "eth_getTransactionCount":
+                result = hex(self.nonce + len(self.sent) - len(self.dropped))
+            elif method == "eth_gasPrice":
+                result = hex(10**9)
+            elif method == "eth_estimateGas":
+                result = hex(50_000)
+            elif method == "eth_sendRawTransaction":
+                if self.reject_next:
+                    self.reject_next = False
+                    return {"jsonrpc": "2.0", "id": payload["id"], "error": {"code": -32000, "message": "nonce too low"}}
+                if params[0] in self.sent:
+                    self.rebroadcasts.append(params[0])
+                    return {"jsonrpc": "2.0", "id": payload["id"], "result": "0x%064x" % (self.sent.index(params[0]) + 1)}
+                self.sent.append(params[0])
+                result = "0x%064x" % len(self.sent)
+            elif method == "eth_getTransactionReceipt":
+                result = self.receipts.get(params[0])
+        return {"jsonrpc": "2.0", "id": payload["id"], "result": result}
+
+    def mine(self, index, status=1):
+        with self.lock:
+            self.receipts["0x%064x" % (index + 1)] = {"status": hex(status), "logs": []}
+
+
+@pytest.fixture
+def node():
+    return FakeNode()
+
+
+@pytest.fixture
+def submitter(node):
+    submitter = TransactionSubmitter(RpcClient(node), Account.create(), CONTRACT, ABI, poll_interval=0.01)
+    yield submitter
+    submitter.close()
+
+
+
+def _nonce(raw):
+    # Legacy transaction: rlp([nonce, gasPrice, gas, to, value, data, v, r, s])
+    return int.from_bytes(rlp.decode(bytes.fromhex(raw[2:]))[0], "big")
+
+
+def test_pipelines_without_waiting_for_receipts(node, submitter):
+    """
+    Several transactions are broadcast back to back with consecutive local nonces
+    while none of them has a receipt yet.
+    """
+    handles = [submitter.submit("gain_experience", 1, xp) for xp in (10, 20, 30)]
+    assert [h.status for h in handles] == [PENDING] * 3
+    assert [_nonce(raw) for raw in node.sent] == [5, 6, 7]
+    assert len(submitter.in_flight()) == 3
+
+    for i in range(3):
+        node.mine(i)
+    assert submitter.wait_all(timeout=5)
+    assert [h.status for h in handles] == [CONFIRMED] * 3
+    assert submitter.status(handles[0].tx_hash) == CONFIRMED
+
+
+def test_failures_are_reported(node, submitter):
+    """
+    Reverted transactions and rejected submissions surface through the handle
+    status and callbacks instead of raising.
+    """
+    seen = []
+    reverted = submitter.submit("change_character", 1, "bafy")
+    reverted.add_done_callback(lambda h: seen.append((h.fn_name, h.status)))
+    node.mine(0, status=0)
+    assert reverted.wait(timeout=5).status == FAILED
+    assert seen == [("change_character", FAILED)]
+
+    node.reject_next = True
+    rejected = submitter.submit("kill_character", 1)
+    assert rejected.done() and rejected.status == FAILED
+    assert "nonce too low" in rejected.error
+
+    # The nonce is re-read from the node after a rejected submission
+    submitter.submit("kill_character", 1)
+    assert _nonce(node.sent[-1]) == 6
+
+
+def test_dropped_transaction_is_rebroadcast(node):
+    """
+    A transaction without a receipt past its deadline is sent again, and is confirmed
+    if it is mined after that.
+    """
+    submitter = TransactionSubmitter(RpcClient(node), Account.create(), CONTRACT, ABI,
+                                     poll_interval=0.01, tx_timeout=0.05)
+    handle = submitter.submit("gain_experience", 1, 10)
+    for _ in range(100):
+        if node.rebroadcasts:
+            break
+        time.sleep(0.01)
+    assert node.rebroadcasts == node.sent
+    node.mine(0)
+    assert handle.wait(timeout=5).status == CONFIRMED
+    submitter.close()
+
+
+def test_dropped_transaction_fails_and_frees_its_nonce(node):
+    """
+    A transaction the node never mines fails after its rebroadcasts instead of staying
+    pending, and the next one reuses its nonce.
+    """
+    submitter = TransactionSubmitter(RpcClient(node), Account.create(), CONTRACT, ABI,
+                                     poll_interval=0.01, tx_timeout=0.02)
+    node.dropped.add(0)
+    handle = submitter.submit("gain_experience", 1, 10)
+    assert handle.wait(timeout=5).status == FAILED
+    assert "dropped" in handle.error
+    assert len(node.rebroadcasts) == TX_REBROADCASTS
+
+    submitter.submit("gain_experience", 1, 20)
+    assert _nonce(node.sent[-1]) == _nonce(node.sent[0]) == 5
+    submitter.close()
+
+
+def test_receipts_are_polled_from_a_node_refusing_batches(node, submitter):
+    node.refuse_batches = True
+    handles = [submitter.submit("gain_experience", 1, xp) for xp in (10, 20)]
+    node.mine(0)
+    node.mine(1)
+    assert submitter.wait_all(timeout=5)
+    assert [h.status for h in handles] == [CONFIRMED] * 2
+
+
+def test_deadlines_run_while_receipts_fail(node):
+    """
+    A node that keeps failing receipt requests does not keep handles pending: they are
+    rebroadcast, then fail, as if no receipt had arrived.
+    """
+    submitter = TransactionSubmitter(RpcClient(node), Account.create(), CONTRACT, ABI,
+                                     poll_interval=0.01, tx_timeout=0.02)
+    node.receipts_fail = True
+    handle = submitter.submit("gain_experience", 1, 10)
+    assert handle.wait(timeout=5).status == FAILED
+    assert len(node.rebroadcasts) == TX_REBROADCASTS
+    submitter.close()
+
+
+def test_close_stops_polling(node, submitter):
+    """
+    close() stops the receipt poller and fails what is still pending, so nothing waits
+    on it forever.
+    """
+    handle = submitter.submit("gain_experience", 1, 10)
+    submitter.close()
+    assert not submitter._poller.is_alive()
+    assert handle.done() and handle.status == FAILED